@@ -27,8 +27,8 @@ APP_NAME = "scm_test_tree"
 CONFIG_DIR_PATH = os.sep.join([HOME, "." + APP_NAME + ".d"])
 PGND_CONFIG_DIR_PATH = None
 
-if not os.path.exists(CONFIG_DIR_PATH):
-    os.mkdir(CONFIG_DIR_PATH, 0o775)
+# (concurrent first runs may race to make it)
+os.makedirs(CONFIG_DIR_PATH, 0o775, exist_ok=True)
 
 ISSUES_URL = "<https://github.com/pwil3058/scm_test_tree/issues>"
 ISSUES_EMAIL = __author__
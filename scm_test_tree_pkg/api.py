@@ -0,0 +1,287 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''In process interface for test harnesses.
+
+Every operation returns an OpResult rather than printing to stderr.
+For example (in a pytest module):
+
+    from scm_test_tree_pkg import api
+
+    test_tree = api.tree_fixture(shape=api.TreeShape(depth=1))
+
+    def test_status(test_tree):
+        result = test_tree.modify(["file1"])
+        assert result.ok and result.count == 1
+
+Operations on a tree temporarily change the process's working directory
+so they should not be run concurrently from several threads.
+'''
+
+import os
+import time
+import shutil
+import builtins
+import tempfile
+import contextlib
+import collections
+
+if not hasattr(builtins, "_"):
+    from . import i18n
+
+from . import cmd_ifce
+from . import journal
+from . import tree_builder
+from . import mutate as _mutate
+from . import churn as _churn
+from . import manifest as _manifest
+from .tree_shape import TreeShape
+
+__all__ = ["TreeShape", "FileOutcome", "OpResult", "create", "modify", "mutate", "grow", "churn", "revert", "manifest", "verify", "apply_to_files", "TestTree", "test_tree", "tree_fixture"]
+
+# error is None if the operation on path succeeded
+FileOutcome = collections.namedtuple("FileOutcome", ["path", "error"])
+
+class OpResult(collections.namedtuple("OpResult", ["op", "count", "errors", "outcomes", "elapsed", "modno", "mismatches"])):
+    '''The result of an operation.
+
+    op: the name of the operation
+    count: the number of files successfully operated on
+    errors: a list of error messages
+    outcomes: a list of FileOutcome (or None if not recorded)
+    elapsed: the wall clock time taken (in seconds)
+    modno: the modification number used (or None)
+    mismatches: (verify only) a list of (kind, path)
+    '''
+    __slots__ = ()
+    @property
+    def ok(self):
+        return not self.errors and not self.mismatches
+    @property
+    def nfailed(self):
+        return len(self.errors)
+
+def _result(op, start, count=0, errors=None, outcomes=None, modno=None, mismatches=None):
+    return OpResult(op, count, errors or [], outcomes, time.perf_counter() - start, modno, mismatches or [])
+
+@contextlib.contextmanager
+def in_dir(dir_path):
+    '''Run the enclosed code with dir_path as the working directory'''
+    old_wd = os.getcwd()
+    os.chdir(dir_path)
+    try:
+        yield
+    finally:
+        os.chdir(old_wd)
+
+def create(base_dir, shape=None, jobs=1, use_processes=False):
+    '''Create a test tree of the given shape in base_dir'''
+    start = time.perf_counter()
+    emsg = cmd_ifce.init_test_tree(base_dir)
+    if emsg:
+        return _result("create", start, errors=[emsg])
+    count = 0
+    errors = []
+    for ncreated, emsgs in tree_builder.build_tree(base_dir, shape or TreeShape(), jobs=jobs, use_processes=use_processes):
+        count += ncreated
+        errors.extend(emsgs)
+    return _result("create", start, count=count, errors=errors)
+
+def _reserve_modno(base_dir, modno):
+    return cmd_ifce.reserve_modnos(base_dir_name=base_dir) if modno is None else modno
+
+def _iter_targets(filepaths):
+    return (filepaths, True) if filepaths else (cmd_ifce.iter_test_tree_files(), False)
+
+def modify(base_dir, filepaths=None, add_tws=False, no_newline=False, modno=None, record_outcomes=True):
+    '''Append a modification line to filepaths (or all files) in the test
+    tree at base_dir.  filepaths are relative to base_dir.
+    '''
+    start = time.perf_counter()
+    errors = []
+    outcomes = [] if record_outcomes else None
+    try:
+        modno = _reserve_modno(base_dir, modno)
+    except (IOError, ValueError):
+        return _result("modify", start, errors=[_('{0}: is NOT a valid test directory. Aborting.\n').format(base_dir)])
+    with in_dir(base_dir):
+        targets, check_paths = _iter_targets(filepaths)
+        report_outcome = None if outcomes is None else lambda path, emsg: outcomes.append(FileOutcome(path, emsg))
+        count = cmd_ifce.append_modification(targets, cmd_ifce.modification_template(modno, add_tws, no_newline), check_paths, errors.append, report_outcome, journal.open_journal(modno))
+    return _result("modify", start, count=count, errors=errors, outcomes=outcomes, modno=modno)
+
+def apply_to_files(op, base_dir, filepaths, function, record_outcomes=True):
+    '''Call function(filepath) for each of filepaths (or all files) in
+    the test tree at base_dir and return an OpResult for op.
+    '''
+    start = time.perf_counter()
+    errors = []
+    outcomes = [] if record_outcomes else None
+    count = 0
+    report_outcome = None if outcomes is None else lambda path, emsg: outcomes.append(FileOutcome(path, emsg))
+    with in_dir(base_dir):
+        targets, check_paths = _iter_targets(filepaths)
+        for filepath in targets:
+            if check_paths and not cmd_ifce.check_filepath(filepath, errors.append, report_outcome=report_outcome):
+                continue
+            try:
+                function(filepath)
+            except (OSError, ValueError) as edata:
+                emsg = "{0}: {1}\n".format(filepath, getattr(edata, "strerror", None) or edata)
+                errors.append(emsg)
+                if outcomes is not None:
+                    outcomes.append(FileOutcome(filepath, emsg))
+                continue
+            count += 1
+            if outcomes is not None:
+                outcomes.append(FileOutcome(filepath, None))
+    return _result(op, start, count=count, errors=errors, outcomes=outcomes)
+
+def mutate(base_dir, filepaths=None, nops=1, operations=_mutate.OPERATIONS, mode="lines", max_bytes=64, seed=0, modno=None, record_outcomes=True):
+    '''Mutate filepaths (or all files) in the test tree at base_dir in place'''
+    try:
+        modno = _reserve_modno(base_dir, modno)
+    except (IOError, ValueError):
+        return _result("mutate", time.perf_counter(), errors=[_('{0}: is NOT a valid test directory. Aborting.\n').format(base_dir)])
+    journal.mark_irreversible(modno, base_dir)
+    def function(filepath):
+        _mutate.mutate_file(filepath, modno, nops=nops, operations=operations, mode=mode, max_bytes=max_bytes, seed=seed)
+    return apply_to_files("mutate", base_dir, filepaths, function, record_outcomes)._replace(modno=modno)
+
+def grow(base_dir, size, filepaths=None, relative=False, sparse=False, record_outcomes=True):
+    '''Grow filepaths (or all files) in the test tree at base_dir to (or by) size bytes'''
+    return apply_to_files("grow", base_dir, filepaths, lambda filepath: cmd_ifce.grow_file(filepath, size, relative, sparse), record_outcomes)
+
+def churn(base_dir, op, filepaths=None, count=None, fraction=None, seed=0, tweak=False, jobs=1, dest_dir=None, modno=None, record_outcomes=True):
+    '''Rename, move or delete (op) a selection of filepaths (or all files)
+    in the test tree at base_dir.  dest_dir is relative to base_dir.
+    '''
+    start = time.perf_counter()
+    if op not in _churn.OPERATIONS:
+        return _result(op, start, errors=[_("{0}: unknown churn operation.\n").format(op)])
+    try:
+        modno = _reserve_modno(base_dir, modno)
+    except (IOError, ValueError):
+        return _result(op, start, errors=[_('{0}: is NOT a valid test directory. Aborting.\n').format(base_dir)])
+    errors = []
+    outcomes = [] if record_outcomes else None
+    report_outcome = None if outcomes is None else lambda path, emsg: outcomes.append(FileOutcome(path, emsg))
+    with in_dir(base_dir):
+        try:
+            _modno, pairs, emsgs = _churn.churn_files(op, filepaths, count, fraction, seed, tweak, jobs, dest_dir, modno, errors.append, report_outcome)
+        except OSError as edata:
+            return _result(op, start, errors=errors + ["{0}: {1}\n".format(edata.filename, edata.strerror)], outcomes=outcomes, modno=modno)
+    errors.extend(emsg for emsg in emsgs if emsg is not None)
+    if outcomes is not None:
+        outcomes.extend(FileOutcome(source, emsg) for (source, _target), emsg in zip(pairs, emsgs))
+    return _result(op, start, count=emsgs.count(None), errors=errors, outcomes=outcomes, modno=modno)
+
+def revert(base_dir, to_modno=None, jobs=1):
+    '''Undo the (append only) modification rounds after to_modno (default:
+    the last round) in the test tree at base_dir.
+    '''
+    start = time.perf_counter()
+    try:
+        modno, _nrounds, count, errors = cmd_ifce.revert_files(to_modno, jobs, base_dir)
+    except ValueError as edata:
+        return _result("revert", start, errors=["{0}\n".format(edata)])
+    except IOError:
+        return _result("revert", start, errors=[_('{0}: is NOT a valid test directory. Aborting.\n').format(base_dir)])
+    return _result("revert", start, count=count, errors=errors, modno=modno)
+
+def manifest(base_dir, manifest_path=_manifest.MANIFEST_FILE, full=False):
+    '''Write (or refresh) the manifest of the test tree at base_dir'''
+    start = time.perf_counter()
+    errors = []
+    with in_dir(base_dir):
+        written_ns, old_entries = (0, None)
+        if not full and os.path.exists(manifest_path):
+            try:
+                written_ns, old_entries = _manifest.read_manifest(manifest_path)
+            except (IOError, ValueError):
+                written_ns, old_entries = (0, None)
+        start_ns = time.time_ns()
+        entries, _nrehashed = _manifest.scan_tree(old_entries, written_ns, errors.append)
+        try:
+            _manifest.write_manifest(manifest_path, entries, start_ns)
+        except (IOError, OSError) as edata:
+            errors.append("{0}: {1}\n".format(edata.filename, edata.strerror))
+    return _result("manifest", start, count=len(entries), errors=errors)
+
+def verify(base_dir, manifest_path=_manifest.MANIFEST_FILE, jobs=1, fast=False, fail_fast=False):
+    '''Compare the test tree at base_dir with its manifest'''
+    start = time.perf_counter()
+    with in_dir(base_dir):
+        try:
+            mismatches = _manifest.verify_tree(manifest_path, jobs=jobs, fast=fast, fail_fast=fail_fast, report=lambda text: None)
+        except (IOError, OSError) as edata:
+            return _result("verify", start, errors=["{0}: {1}\n".format(edata.filename, edata.strerror)])
+        except ValueError as edata:
+            return _result("verify", start, errors=["{0}\n".format(edata)])
+    return _result("verify", start, mismatches=mismatches)
+
+class TestTree(object):
+    '''A test tree at base_dir with the operations above bound to it'''
+    __test__ = False # not a test class (for pytest's benefit)
+    def __init__(self, base_dir):
+        self.base_dir = os.path.abspath(base_dir)
+    def path(self, *parts):
+        return os.path.join(self.base_dir, *parts)
+    def files(self):
+        with in_dir(self.base_dir):
+            return list(cmd_ifce.iter_test_tree_files())
+    def modify(self, filepaths=None, **kwargs):
+        return modify(self.base_dir, filepaths, **kwargs)
+    def mutate(self, filepaths=None, **kwargs):
+        return mutate(self.base_dir, filepaths, **kwargs)
+    def grow(self, size, filepaths=None, **kwargs):
+        return grow(self.base_dir, size, filepaths, **kwargs)
+    def churn(self, op, filepaths=None, **kwargs):
+        return churn(self.base_dir, op, filepaths, **kwargs)
+    def revert(self, to_modno=None, **kwargs):
+        return revert(self.base_dir, to_modno, **kwargs)
+    def manifest(self, **kwargs):
+        return manifest(self.base_dir, **kwargs)
+    def verify(self, **kwargs):
+        return verify(self.base_dir, **kwargs)
+
+@contextlib.contextmanager
+def test_tree(shape=None, base_dir=None, jobs=1, keep=False):
+    '''Create a test tree (in a new temporary directory unless base_dir
+    is given) and yield a TestTree for it.  The tree is removed on exit
+    unless keep is True or base_dir was given.
+    '''
+    remove = base_dir is None and not keep
+    base_dir = base_dir or tempfile.mkdtemp(prefix="scmtt_")
+    result = create(base_dir, shape, jobs=jobs)
+    if result.errors:
+        if remove:
+            shutil.rmtree(base_dir, ignore_errors=True)
+        raise OSError("".join(result.errors))
+    try:
+        yield TestTree(base_dir)
+    finally:
+        if remove:
+            shutil.rmtree(base_dir, ignore_errors=True)
+test_tree.__test__ = False
+
+def tree_fixture(shape=None, scope="function", jobs=1):
+    '''Return a pytest fixture providing a fresh TestTree (requires pytest)'''
+    import pytest
+    @pytest.fixture(scope=scope)
+    def _fixture():
+        with test_tree(shape=shape, jobs=jobs) as tree:
+            yield tree
+    return _fixture
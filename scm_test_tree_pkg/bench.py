@@ -0,0 +1,184 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Measure the throughput of tree creation and modification.
+
+The runs are instrumented (see instrument) so that the latencies of
+the individual I/O operations (open, write, etc.) can be reported.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+
+from . import cmd_ifce
+from . import tree_shape
+from . import instrument
+from . import constants
+
+PERCENTILES = (50, 90, 99)
+
+def parse_sizes(text):
+    '''Convert "DEPTH:FANOUT:FILES[,...]" to a list of (depth, fanout, files)'''
+    sizes = []
+    for item in text.split(","):
+        try:
+            depth, fanout, files = (int(field) for field in item.split(":"))
+        except ValueError:
+            raise ValueError(_("{0}: is not a valid DEPTH:FANOUT:FILES size.").format(item))
+        sizes.append((depth, fanout, files))
+    return sizes
+
+def percentiles(samples, points=PERCENTILES):
+    '''Return {"pN": value} for each N in points (nearest rank method)'''
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {"p{0}".format(point): ordered[min(len(ordered) - 1, max(0, (point * len(ordered) + 99) // 100 - 1))] for point in points}
+
+def shape_totals(shape):
+    '''Return (number of files, number of bytes) in a tree of the given shape'''
+    nfiles = nbytes = 0
+    for dir_path, level in shape.walk():
+        for fname, kind in shape.iter_file_specs(dir_path, level):
+            nfiles += 1
+            nbytes += shape.file_spec(os.path.join(dir_path, fname), kind)[1]
+    return (nfiles, nbytes)
+
+def op_latencies(timings, points=PERCENTILES):
+    '''Return {operation: {"pN": microseconds}} for the operations recorded in timings'''
+    return {op: {"p{0}".format(point): stats.percentile_ns(point) / 1e3 for point in points} for op, stats in timings.ops.items() if stats.count}
+
+def _summarise(case, size, jobs, nfiles, nbytes, durations, timings):
+    total = sum(durations)
+    return {
+        "case": case,
+        "size": "{0}:{1}:{2}".format(*size),
+        "jobs": jobs,
+        "files": nfiles,
+        "bytes": nbytes,
+        "runs": len(durations),
+        "files_per_sec": nfiles * len(durations) / total if total else None,
+        "bytes_per_sec": nbytes * len(durations) / total if total else None,
+        "latency_us": op_latencies(timings),
+    }
+
+def _tree_bytes():
+    return sum(os.path.getsize(filepath) for filepath in cmd_ifce.iter_test_tree_files())
+
+def bench_create(work_dir, size, jobs, repeat):
+    '''Time repeat creations of a tree of the given size with jobs workers'''
+    depth, fanout, files = size
+    shape = tree_shape.TreeShape(depth=depth, fanout=(fanout, ), files=files)
+    nfiles, nbytes = shape_totals(shape)
+    durations = []
+    timings = instrument.Timings()
+    for _run in range(repeat):
+        base_dir_name = tempfile.mkdtemp(dir=work_dir)
+        try:
+            with instrument.instrumented(timings):
+                start = time.perf_counter()
+                cmd_ifce.create_test_tree(base_dir_name, shape=shape, jobs=jobs)
+                durations.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(base_dir_name)
+    return _summarise("create", size, jobs, nfiles, nbytes, durations, timings)
+
+def bench_modify(work_dir, size, repeat):
+    '''Time repeat rounds of modifying every file in a tree of the given size'''
+    depth, fanout, files = size
+    shape = tree_shape.TreeShape(depth=depth, fanout=(fanout, ), files=files)
+    nfiles = shape_totals(shape)[0]
+    base_dir_name = tempfile.mkdtemp(dir=work_dir)
+    old_wd = os.getcwd()
+    try:
+        cmd_ifce.create_test_tree(base_dir_name, shape=shape)
+        os.chdir(base_dir_name)
+        durations = []
+        timings = instrument.Timings()
+        start_bytes = _tree_bytes()
+        with instrument.instrumented(timings):
+            for _run in range(repeat):
+                start = time.perf_counter()
+                cmd_ifce.modify_files([])
+                durations.append(time.perf_counter() - start)
+        nbytes = (_tree_bytes() - start_bytes) // max(repeat, 1)
+    finally:
+        os.chdir(old_wd)
+        shutil.rmtree(base_dir_name)
+    return _summarise("modify", size, 1, nfiles, nbytes, durations, timings)
+
+def run_benchmarks(sizes, jobs_list, repeat=3, work_dir=None, progress=None):
+    '''Run the create and modify benchmarks and return the report (a dict)'''
+    if progress is None:
+        progress = sys.stderr.write
+    results = []
+    for size in sizes:
+        for jobs in jobs_list:
+            progress(_("create {0}:{1}:{2} with {3} job(s)...\n").format(size[0], size[1], size[2], jobs))
+            results.append(bench_create(work_dir, size, jobs, repeat))
+        progress(_("modify {0}:{1}:{2}...\n").format(*size))
+        results.append(bench_modify(work_dir, size, repeat))
+    return {
+        "version": 1,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+def _case_key(result):
+    return (result["case"], result["size"], result["jobs"])
+
+def find_regressions(report, baseline, threshold=constants.BENCH_THRESHOLD):
+    '''Return a list of (result, baseline result) pairs where the files
+    per second in report has dropped by more than threshold (a fraction)
+    from that in baseline.
+    '''
+    baseline_results = {_case_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        base = baseline_results.get(_case_key(result))
+        if not base or not base.get("files_per_sec") or not result.get("files_per_sec"):
+            continue
+        if result["files_per_sec"] < base["files_per_sec"] * (1.0 - threshold):
+            regressions.append((result, base))
+    return regressions
+
+def bench_cmd(sizes, jobs_list, repeat=3, work_dir=None, output=None, baseline=None, threshold=constants.BENCH_THRESHOLD):
+    '''Execute the "bench" sub command using the supplied args'''
+    try:
+        base_report = json.load(open(baseline)) if baseline else None
+    except (IOError, ValueError) as edata:
+        return "{0}: {1}\n".format(baseline, getattr(edata, "strerror", None) or edata)
+    report = run_benchmarks(sizes, jobs_list, repeat, work_dir)
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if output:
+        try:
+            open(output, "w").write(text)
+        except IOError as edata:
+            return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    else:
+        sys.stdout.write(text)
+    if base_report is None:
+        return 0
+    regressions = find_regressions(report, base_report, threshold)
+    for result, base in regressions:
+        sys.stderr.write(_("REGRESSION: {0} {1} jobs={2}: {3:.0f} files/sec (baseline {4:.0f})\n").format(result["case"], result["size"], result["jobs"], result["files_per_sec"], base["files_per_sec"]))
+    return 1 if regressions else 0
@@ -0,0 +1,148 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Rename, move or delete many files in one go (to exercise SCM rename
+detection and the like).
+
+Renamed files get the suffix ".r<modno>" and moved files ".m<modno>"
+so the new names never collide with existing files.  If tweak is
+requested a modification line is appended to each renamed or moved
+file so that it is a near (rather than exact) rename.
+'''
+
+import os
+import sys
+import time
+import random
+import concurrent.futures
+
+from . import cmd_ifce
+from . import journal
+from . import constants
+
+OPERATIONS = constants.CHURN_OPERATIONS
+
+# Files are handed to the worker threads in batches of this many
+CHURN_BATCH_SIZE = 256
+
+def choose_files(candidates, count=None, fraction=None, rng=None):
+    '''Return a sorted random selection of count (or fraction of) the
+    candidates (or all of them if neither is given).
+    '''
+    candidates = sorted(candidates)
+    if count is None and fraction is None:
+        return candidates
+    rng = rng or random.Random()
+    number = min(count, len(candidates)) if count is not None else int(len(candidates) * fraction)
+    return sorted(rng.sample(candidates, number))
+
+def plan_churn(filepaths, op, modno, rng, dest_dir=None):
+    '''Return a list of (source, target) path pairs for applying op to
+    filepaths (target being None for "delete").
+
+    Moved files go to dest_dir if it is given otherwise to a randomly
+    chosen directory of the test tree (one that contains files).
+    '''
+    if op == "delete":
+        return [(filepath, None) for filepath in filepaths]
+    if op == "rename":
+        return [(filepath, "{0}.r{1}".format(filepath, modno)) for filepath in filepaths]
+    if op != "move":
+        raise ValueError(_("{0}: unknown churn operation.").format(op))
+    if dest_dir is None:
+        dir_paths = sorted(set(os.path.dirname(filepath) for filepath in cmd_ifce.iter_test_tree_files()))
+    pairs = []
+    used = set()
+    for filepath in filepaths:
+        target_dir = dest_dir if dest_dir is not None else rng.choice(dir_paths)
+        target = os.path.join(target_dir, "{0}.m{1}".format(os.path.basename(filepath), modno))
+        suffix = 1
+        while target in used:
+            target = os.path.join(target_dir, "{0}.m{1}.{2}".format(os.path.basename(filepath), modno, suffix))
+            suffix += 1
+        used.add(target)
+        pairs.append((filepath, target))
+    return pairs
+
+def _churn_batch(pairs, template):
+    # return an error message (or None) for each pair
+    emsgs = []
+    for source, target in pairs:
+        try:
+            if target is None:
+                os.unlink(source)
+            else:
+                os.rename(source, target)
+                if template is not None:
+                    cmd_ifce.append_modification([target], template, check_paths=False, report_emsg=lambda emsg: None)
+        except OSError as edata:
+            emsgs.append("{0}: {1}\n".format(edata.filename, edata.strerror))
+            continue
+        emsgs.append(None)
+    return emsgs
+
+def apply_churn(pairs, template=None, jobs=1):
+    '''Carry out the (source, target) pairs (see plan_churn()) using a
+    pool of jobs threads and return an error message (or None) for each.
+    '''
+    batches = [pairs[index:index + CHURN_BATCH_SIZE] for index in range(0, len(pairs), CHURN_BATCH_SIZE)]
+    if jobs <= 1 or len(batches) <= 1:
+        return [emsg for batch in batches for emsg in _churn_batch(batch, template)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        return [emsg for emsgs in executor.map(_churn_batch, batches, [template] * len(batches)) for emsg in emsgs]
+
+def churn_files(op, filepath_list, count=None, fraction=None, seed=0, tweak=False, jobs=1, dest_dir=None, modno=None, report_emsg=None, report_outcome=None):
+    '''Apply op to a selection (repeatable for a given seed and
+    modification number) of filepath_list (or all files in the tree if
+    it is empty) and return (modno, pairs, emsgs) where emsgs has an
+    error message (or None) for each pair.  Files in filepath_list that
+    can't be churned are reported (see cmd_ifce.check_filepath()).
+    '''
+    if report_emsg is None:
+        report_emsg = sys.stderr.write
+    if modno is None:
+        modno = cmd_ifce.reserve_modnos()
+    journal.mark_irreversible(modno)
+    if filepath_list:
+        candidates = [filepath for filepath in filepath_list if cmd_ifce.check_filepath(filepath, report_emsg, report_outcome=report_outcome)]
+    else:
+        candidates = cmd_ifce.iter_test_tree_files()
+    rng = random.Random("{0}:{1}".format(seed, modno))
+    pairs = plan_churn(choose_files(candidates, count, fraction, rng), op, modno, rng, dest_dir)
+    if dest_dir is not None and pairs and not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+    template = cmd_ifce.modification_template(modno) if tweak and op != "delete" else None
+    return (modno, pairs, apply_churn(pairs, template, jobs))
+
+def churn_cmd(op, filepath_list, count=None, fraction=None, seed=0, tweak=False, jobs=1, dest_dir=None):
+    '''Execute the "churn" sub command using the supplied args'''
+    start = time.time()
+    if op not in OPERATIONS:
+        return _("{0}: unknown churn operation.\n").format(op)
+    try:
+        modno = cmd_ifce.reserve_modnos()
+    except (IOError, ValueError):
+        return _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
+    try:
+        _modno, pairs, emsgs = churn_files(op, filepath_list, count, fraction, seed, tweak, jobs, dest_dir, modno)
+    except OSError as edata:
+        return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    nerrors = 0
+    for emsg in emsgs:
+        if emsg is not None:
+            nerrors += 1
+            sys.stderr.write(emsg)
+    sys.stdout.write(_("{0}: modification #{1}: {2} file(s), {3} error(s) in {4:.3f} seconds.\n").format(op, modno, len(pairs) - nerrors, nerrors, time.time() - start))
+    return 1 if nerrors else 0
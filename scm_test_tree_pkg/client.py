@@ -0,0 +1,101 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Thin client for a "scm_test_tree serve" daemon.
+
+Deliberately imports nothing from the engine (or i18n) so that it
+starts quickly.  From the shell use "scm_test_tree request" or, to
+avoid even the cost of the script's argument parsing, (with the
+directory containing scm_test_tree_pkg on PYTHONPATH):
+
+    python3 -m scm_test_tree_pkg.client [--socket PATH] OP ['JSON args']
+
+e.g. python3 -m scm_test_tree_pkg.client modify '{"filepaths": ["file1"]}'
+'''
+
+import os
+import sys
+import json
+import socket
+
+from .constants import SERVE_SOCKET as DEFAULT_SOCKET
+
+class Client(object):
+    '''A connection to a daemon over which any number of requests may be made'''
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self._rfile = self._sock.makefile("rb")
+    def request(self, op, cwd=None, **args):
+        '''Ask the daemon to perform op (in cwd) and return its reply: a
+        dict with "status", "stdout" and "stderr" members.
+        '''
+        message = {"op": op, "cwd": cwd or os.getcwd(), "args": args}
+        self._sock.sendall(json.dumps(message).encode() + b"\n")
+        line = self._rfile.readline()
+        if not line:
+            raise ConnectionError("daemon closed the connection")
+        return json.loads(line.decode())
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+
+USAGE = "usage: client [--socket PATH] OP ['JSON args']\n"
+
+def parse_args(json_args):
+    '''Return the request arguments (a dict) given by json_args (a JSON
+    object or None) or raise ValueError.
+    '''
+    args = json.loads(json_args) if json_args else {}
+    if not isinstance(args, dict):
+        raise ValueError("the arguments must be a JSON object")
+    return args
+
+def run_request(socket_path, op, args):
+    '''Ask the daemon at socket_path to perform op with args (a dict),
+    copy its output to ours and return its status.
+    '''
+    try:
+        with Client(socket_path) as client:
+            reply = client.request(op, **args)
+    except OSError as edata:
+        sys.stderr.write("{0}: {1}\n".format(socket_path, edata.strerror or edata))
+        return 2
+    sys.stdout.write(reply.get("stdout", ""))
+    sys.stderr.write(reply.get("stderr", ""))
+    return reply.get("status", 1)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    socket_path = DEFAULT_SOCKET
+    if len(argv) > 1 and argv[0] == "--socket":
+        socket_path, argv = argv[1], argv[2:]
+    if not argv or len(argv) > 2:
+        sys.stderr.write(USAGE)
+        return 2
+    try:
+        args = parse_args(argv[1] if len(argv) > 1 else None)
+    except ValueError as edata:
+        sys.stderr.write("{0}: {1}\n".format(argv[1], edata))
+        sys.stderr.write(USAGE)
+        return 2
+    return run_request(socket_path, argv[0], args)
+
+if __name__ == "__main__":
+    sys.exit(main())
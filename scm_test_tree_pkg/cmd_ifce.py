@@ -17,122 +17,408 @@ import sys
 import collections
 import os
 import datetime
+import random
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import tree_shape
+from . import tree_builder
+from . import journal
 
 COUNT_FILE = ".scmtt_modify_count"
-IGNORES = COUNT_FILE + "\n.hgignore\n.gitignore\n.darning.dbd\n"
+MANIFEST_FILE = ".scmtt_manifest"
+# records which tree cache entry (if any) the tree was cloned from
+ORIGIN_FILE = ".scmtt_origin"
+IGNORES = COUNT_FILE + "\n" + MANIFEST_FILE + "\n" + ORIGIN_FILE + "\n" + journal.JOURNAL_DIR + "\n.hgignore\n.gitignore\n.darning.dbd\n"
 
-def create_test_tree(base_dir_name="", gui_calling=False):
-    '''Execute the "create" sub command using the supplied args'''
-    if gui_calling:
-        from .bab import CmdResult
+# SCM databases (and our journal) are pruned (without looking inside) when walking the tree
+SCM_DIRS = frozenset([".git", ".hg", ".darning.dbd", journal.JOURNAL_DIR])
+# and these (not part of the test tree proper) files are skipped
+SKIP_FILES = frozenset([COUNT_FILE, MANIFEST_FILE, ORIGIN_FILE, ".hgignore", ".gitignore"])
+
+def iter_test_tree_files(base_dir_name=""):
+    '''Generate the paths of the regular files in the test tree at base_dir_name.
+
+    Directories are read lazily (one os.scandir() at a time) and only
+    the directory entry type is consulted so no file is stat()ed.
+    '''
+    dir_stack = [base_dir_name]
+    while dir_stack:
+        dir_path = dir_stack.pop()
+        try:
+            entries = os.scandir(dir_path or os.curdir)
+        except OSError as edata:
+            sys.stderr.write("{0}: {1}\n".format(dir_path or os.curdir, edata.strerror))
+            continue
+        subdir_paths = []
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SCM_DIRS:
+                        subdir_paths.append(os.path.join(dir_path, entry.name))
+                elif entry.is_file(follow_symlinks=False):
+                    if entry.name not in SKIP_FILES:
+                        yield os.path.join(dir_path, entry.name)
+        dir_stack.extend(reversed(subdir_paths))
+
+def iter_test_tree_dirs(base_dir_name=""):
+    '''Generate the paths of the directories in the test tree at
+    base_dir_name (starting with base_dir_name itself).
+    '''
+    dir_stack = [base_dir_name]
+    while dir_stack:
+        dir_path = dir_stack.pop()
+        yield dir_path
+        try:
+            entries = os.scandir(dir_path or os.curdir)
+        except OSError:
+            continue
+        with entries:
+            subdir_paths = [os.path.join(dir_path, entry.name) for entry in entries if entry.is_dir(follow_symlinks=False) and entry.name not in SCM_DIRS]
+        dir_stack.extend(reversed(subdir_paths))
+
+def reserve_modnos(count=1, base_dir_name=""):
+    '''Reserve a block of count consecutive modification numbers and return the first.
+
+    The count file is read and updated while holding an exclusive lock
+    so concurrent modifiers never receive the same number.
+    '''
+    with open(os.path.join(base_dir_name, COUNT_FILE), 'r+') as fobj:
+        if fcntl is not None:
+            fcntl.flock(fobj.fileno(), fcntl.LOCK_EX)
+        first = int(fobj.read()) + 1
+        fobj.seek(0)
+        fobj.write("{0}".format(first + count - 1))
+        fobj.truncate()
+        fobj.flush()
+    return first
+
+def init_test_tree(base_dir_name=""):
+    '''Prepare base_dir_name (creating it if necessary) to hold a test
+    tree by writing the count and ignore files.  Return an error message
+    or None.
+    '''
     if base_dir_name:
         if not os.path.exists(base_dir_name):
             try:
                 os.makedirs(base_dir_name)
             except os.error as edata:
-                emsg = "{0}: {1}".format(edata.filename, edata.strerror)
-                return CmdResult.error(sterr=emsg) if gui_calling else emsg
+                return "{0}: {1}".format(edata.filename, edata.strerror)
         elif not os.path.isdir(base_dir_name):
-            emsg = _("{0}: is NOT a directory. Aborting.").format(base_dir_name)
-            return CmdResult.error(sterr=emsg) if gui_calling else emsg
+            return _("{0}: is NOT a directory. Aborting.").format(base_dir_name)
     # Do this here to catch base directory permission problems early
     try:
         open(os.path.join(base_dir_name, COUNT_FILE), 'w').write("0")
+        journal.start_journal(base_dir_name)
     except IOError as edata:
-        emsg = "{0}: {1}".format(edata.filename, edata.strerror)
-        return CmdResult.error(sterr=emsg) if gui_calling else emsg
+        return "{0}: {1}".format(edata.filename, edata.strerror)
     # Add some ignore files
     for ignore_file_path in [".hgignore", ".gitignore"]:
         open(os.path.join(base_dir_name, ignore_file_path), 'w').write(IGNORES)
+    return None
+
+def create_test_tree(base_dir_name="", gui_calling=False, shape=None, jobs=1, use_processes=False):
+    '''Execute the "create" sub command using the supplied args'''
+    if gui_calling:
+        from .bab import CmdResult
+    if shape is None:
+        shape = tree_shape.TreeShape()
+    emsg = init_test_tree(base_dir_name)
+    if emsg:
+        return CmdResult.error(stderr=emsg) if gui_calling else emsg
     combined_emsgs = ""
-    for dindex in range(6):
-        if dindex:
-            dname = 'dir{0}'.format(dindex)
-            try:
-                os.mkdir(os.path.join(base_dir_name, dname))
-            except OSError as edata:
-                emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
-                if gui_calling:
-                    combined_emsgs += emsg
-                else:
-                    sys.stderr.write(emsg)
+    for _ncreated, emsgs in tree_builder.build_tree(base_dir_name, shape, jobs=jobs, use_processes=use_processes):
+        if gui_calling:
+            combined_emsgs += "".join(emsgs)
         else:
-            dname = ""
-        for sdindex in range(6):
-            if sdindex:
-                if not dindex:
-                    continue
-                sdname = 'subdir{0}'.format(sdindex)
-                try:
-                    os.mkdir(os.path.join(base_dir_name, dname, sdname))
-                except OSError as edata:
-                    emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
-                    if gui_calling:
-                        combined_emsgs += emsg
-                    else:
-                        sys.stderr.write(emsg)
-            else:
-                sdname = ''
-            for findex in range(1, 6):
-                for (fn_template, c_template) in [("file{0}", _("{0}: is a text file.\n")), ("binary{0}", _("{0}:\000is a binary file.\n")), (".hidden{0}", _("{0}:is a hidden file.\n"))]:
-                    fpath = os.path.join(dname, sdname, fn_template.format(findex))
-                    try:
-                        open(os.path.join(base_dir_name, fpath), 'w').write(c_template.format(fpath))
-                    except IOError as edata:
-                        emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
-                        if gui_calling:
-                            combined_emsgs += emsg
-                        else:
-                            sys.stderr.write(emsg)
+            sys.stderr.write("".join(emsgs))
     if gui_calling:
         return CmdResult.warning(stderr=combined_emsgs) if combined_emsgs else CmdResult.ok()
     return 0
 
-def modify_files(filepath_list, add_tws=False, no_newline=False, gui_calling=False):
-    '''Execute the "modify" sub command using the supplied args'''
+_APPEND_FLAGS = os.O_WRONLY | os.O_APPEND | getattr(os, "O_CLOEXEC", 0)
+_GROW_FLAGS = os.O_WRONLY | getattr(os, "O_CLOEXEC", 0)
+
+def modification_template(modno, add_tws=False, no_newline=False, when=None):
+    '''Return the (prefix, suffix) bytes to either side of a file's path
+    in modification modno made at when (a datetime, default: now).
+    '''
+    prefix = 'tws \ntws\t\n' if add_tws else ''
+    prefix += 'Path: "'
+    suffix = '" modification #{0} at: {1}'.format(modno, (when or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M:%S.%f"))
+    suffix += '' if no_newline else '\n'
+    return (prefix.encode(), suffix.encode())
+
+def check_filepath(filepath, report_emsg, base_dir_name="", report_outcome=None):
+    '''Return True if filepath (relative to base_dir_name) names a file
+    that may be modified (else report why not: to report_outcome too
+    (see append_modification()) if it is not None).
+    '''
+    if filepath == COUNT_FILE:
+        # quietly ignored but not reported as modified
+        if report_outcome is not None:
+            report_outcome(filepath, '{0}: is the modification counter.  Ignored.\n'.format(filepath))
+        return False
+    elif not os.path.exists(os.path.join(base_dir_name, filepath)):
+        emsg = '{0}: file does not exist.  Ignored.\n'.format(filepath)
+    elif os.path.isdir(os.path.join(base_dir_name, filepath)):
+        emsg = '{0}: is a directory ignored.  Ignored.\n'.format(filepath)
+    else:
+        return True
+    report_emsg(emsg)
+    if report_outcome is not None:
+        report_outcome(filepath, emsg)
+    return False
+
+def append_modification(filepath_iter, template, check_paths=True, report_emsg=None, report_outcome=None, journal=None, base_dir_name=""):
+    '''Append the modification line (see modification_template()) to
+    each of the files (paths relative to base_dir_name) and return the
+    number modified.
+
+    If report_outcome is not None it is called with (filepath, emsg) for
+    each file given, emsg being None if the file was modified.  If
+    journal is not None each file's size before modification is
+    recorded in it.
+    '''
+    if report_emsg is None:
+        # looked up at call (not import) time so that redirect_stderr() works
+        report_emsg = sys.stderr.write
+    prefix, suffix = template
+    nmodified = 0
+    for filepath in filepath_iter:
+        if check_paths and not check_filepath(filepath, report_emsg, base_dir_name, report_outcome):
+            continue
+        try:
+            fd = tree_builder.open_unshared(os.path.join(base_dir_name, filepath), _APPEND_FLAGS)
+            try:
+                if journal is not None:
+                    journal.record(filepath, os.fstat(fd).st_size)
+                os.write(fd, prefix + os.fsencode(filepath) + suffix)
+            finally:
+                os.close(fd)
+        except OSError as edata:
+            emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
+            report_emsg(emsg)
+            if report_outcome is not None:
+                report_outcome(filepath, emsg)
+            continue
+        nmodified += 1
+        if report_outcome is not None:
+            report_outcome(filepath, None)
+    if journal is not None:
+        journal.flush()
+    return nmodified
+
+def modify_files(filepath_list, add_tws=False, no_newline=False, gui_calling=False, modno=None):
+    '''Execute the "modify" sub command using the supplied args
+
+    If modno is None a modification number is reserved from the count
+    file otherwise it is assumed to have been reserved by the caller.
+    '''
     if gui_calling:
         from .bab import CmdResult
     try:
-        modno = int(open(COUNT_FILE, 'r').read()) + 1
-        open(COUNT_FILE, 'w').write("{0}".format(modno))
-    except IOError:
+        if modno is None:
+            modno = reserve_modnos()
+    except (IOError, ValueError):
         emsg = _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
         if gui_calling:
             return CmdResult.error(sterr=emsg)
         else:
             return emsg
-    template = 'tws \ntws\t\n' if add_tws else ''
-    template += 'Path: "{{0}}" modification #{0} at: {1}'.format(modno, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
-    template += '' if no_newline else '\n'
-    if not filepath_list:
-        pass # TODO: generate list of all files in dir (except scm databases)
-    combined_emsgs = ""
+    check_paths = bool(filepath_list)
+    if not check_paths:
+        filepath_list = iter_test_tree_files()
+    emsgs = []
+    append_modification(filepath_list, modification_template(modno, add_tws, no_newline), check_paths, emsgs.append if gui_calling else sys.stderr.write, journal=journal.open_journal(modno))
+    if gui_calling:
+        return CmdResult.warning(stderr="".join(emsgs)) if emsgs else CmdResult.ok()
+    return 0
+
+# listed paths are read in chunks of this size
+LIST_CHUNK_SIZE = 64 * 1024
+
+def iter_listed_paths(fobj, delimiter=b"\n"):
+    '''Generate the (non empty) paths in the binary file fobj separated
+    by delimiter (e.g. b"\\0" for "find -print0" or "git ls-files -z"
+    output) reading it a chunk at a time.
+    '''
+    partial = b""
+    while True:
+        chunk = fobj.read(LIST_CHUNK_SIZE)
+        if not chunk:
+            break
+        items = (partial + chunk).split(delimiter)
+        partial = items.pop()
+        for item in items:
+            if item:
+                yield os.fsdecode(item)
+    if partial:
+        yield os.fsdecode(partial)
+
+def modify_listed_files(list_path, delimiter=b"\n", add_tws=False, no_newline=False):
+    '''Execute the "modify --from-file" sub command using the supplied args
+
+    The files listed in the file at list_path ("-" for standard input)
+    are modified, as they are read, under a single modification number.
+    '''
+    try:
+        fobj = sys.stdin.buffer if list_path == "-" else open(list_path, "rb")
+    except IOError as edata:
+        return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    try:
+        try:
+            modno = reserve_modnos()
+        except (IOError, ValueError):
+            return _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
+        append_modification(iter_listed_paths(fobj, delimiter), modification_template(modno, add_tws, no_newline), True, sys.stderr.write, journal=journal.open_journal(modno))
+    except IOError as edata:
+        return "{0}: {1}\n".format(list_path, edata.strerror)
+    finally:
+        if fobj is not sys.stdin.buffer:
+            fobj.close()
+    return 0
+
+def choose_round_files(filepath_list, files_per_round, seed, modno):
+    '''Return the files_per_round files (chosen repeatably for seed and
+    modno) from filepath_list to be modified in round modno.
+    filepath_list should be sorted so that the choice doesn't depend on
+    the order in which the files were found.
+    '''
+    rng = random.Random("{0}:{1}".format(seed, modno))
+    return rng.sample(filepath_list, min(files_per_round, len(filepath_list)))
+
+def modify_rounds(filepath_list, rounds, files_per_round=0, seed=0, add_tws=False, no_newline=False):
+    '''Apply rounds numbered modifications in one go and print a summary of each.
+
+    If files_per_round is non zero each round modifies that many files
+    chosen (repeatably for a given seed and modification number) from
+    filepath_list (or all files in the tree if it is empty) otherwise
+    each round modifies all of them.  The modification numbers for all
+    rounds are reserved with a single update of the count file.
+    '''
+    try:
+        first_modno = reserve_modnos(rounds)
+    except (IOError, ValueError):
+        return _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
+    check_paths = bool(filepath_list)
+    if files_per_round:
+        filepath_list = sorted(filepath_list if check_paths else iter_test_tree_files())
+    for modno in range(first_modno, first_modno + rounds):
+        start = time.time()
+        if files_per_round:
+            round_paths = choose_round_files(filepath_list, files_per_round, seed, modno)
+        else:
+            round_paths = filepath_list if check_paths else iter_test_tree_files()
+        nerrors = [0]
+        def report_emsg(emsg):
+            nerrors[0] += 1
+            sys.stderr.write(emsg)
+        nmodified = append_modification(round_paths, modification_template(modno, add_tws, no_newline), check_paths, report_emsg, journal=journal.open_journal(modno))
+        sys.stdout.write(_("Round {0}/{1}: modification #{2}: {3} file(s) modified, {4} error(s) in {5:.3f} seconds.\n").format(modno - first_modno + 1, rounds, modno, nmodified, nerrors[0], time.time() - start))
+    return 0
+
+def grow_file(filepath, size, relative=False, sparse=False):
+    '''Extend the file at filepath to size bytes (or by size bytes if
+    relative) with its kind's filler (or a hole if sparse).
+    '''
+    # not O_APPEND: the padding is preallocated and then written in place
+    fd = tree_builder.open_unshared(filepath, _GROW_FLAGS)
+    try:
+        current_size = os.lseek(fd, 0, os.SEEK_END)
+        target_size = current_size + size if relative else size
+        filler = tree_shape.filler_block(tree_shape.kind_of(os.path.basename(filepath)))
+        tree_builder.write_padding(fd, filler, current_size, target_size - current_size, sparse)
+    finally:
+        os.close(fd)
+
+def grow_files(filepath_list, size, relative=False, sparse=False, gui_calling=False):
+    '''Execute the "grow" sub command using the supplied args
+
+    Files that are already big enough are left alone.
+    '''
+    if gui_calling:
+        from .bab import CmdResult
+    check_paths = bool(filepath_list)
+    if not check_paths:
+        filepath_list = iter_test_tree_files()
+    emsgs = []
+    report_emsg = emsgs.append if gui_calling else sys.stderr.write
     for filepath in filepath_list:
-        if filepath == COUNT_FILE:
-            continue
-        elif not os.path.exists(filepath):
-            emsg = '{0}: file does not exist.  Ignored.\n'.format(filepath)
-            if gui_calling:
-                combined_emsgs += emsg
-            else:
-                sys.stderr.write(emsg)
-            continue
-        elif os.path.isdir(filepath):
-            emsg = '{0}: is a directory ignored.  Ignored.\n'.format(filepath)
-            if gui_calling:
-                combined_emsgs += emsg
-            else:
-                sys.stderr.write(emsg)
+        if check_paths and not check_filepath(filepath, report_emsg):
             continue
         try:
-            with open(filepath, 'ab') as fobj:
-                fobj.write(template.format(filepath).encode())
-        except IOError as edata:
-            emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
-            if gui_calling:
-                combined_emsgs += emsg
-            else:
-                sys.stderr.write(emsg)
+            grow_file(filepath, size, relative, sparse)
+        except OSError as edata:
+            report_emsg("{0}: {1}\n".format(filepath, edata.strerror))
     if gui_calling:
-        return CmdResult.warning(stderr=combined_emsgs) if combined_emsgs else CmdResult.ok()
+        return CmdResult.warning(stderr="".join(emsgs)) if emsgs else CmdResult.ok()
     return 0
+
+# files are truncated by the worker threads in batches of this many
+REVERT_BATCH_SIZE = 256
+
+def _truncate_batch(batch):
+    emsgs = []
+    for filepath, size in batch:
+        try:
+            os.truncate(filepath, size)
+        except OSError as edata:
+            emsgs.append("{0}: {1}\n".format(filepath, edata.strerror))
+    return emsgs
+
+def revert_files(to_modno=None, jobs=1, base_dir_name=""):
+    '''Undo the modification rounds after to_modno (default: the last
+    round) by truncating the files they modified back to their sizes
+    before the earliest of them (as recorded in the journal).  No file
+    contents are read.  Return (to_modno, number of rounds undone,
+    number of files truncated, error messages).
+
+    ValueError is raised if the rounds can't be undone.
+    '''
+    if not journal.is_journaled(base_dir_name):
+        raise ValueError(_('{0}: has no modification journal (trees created by older versions can\'t be reverted).').format(base_dir_name or os.getcwd()))
+    with open(os.path.join(base_dir_name, COUNT_FILE), 'r+') as fobj:
+        if fcntl is not None:
+            fcntl.flock(fobj.fileno(), fcntl.LOCK_EX)
+        current = int(fobj.read())
+        if to_modno is None:
+            to_modno = max(current - 1, 0)
+        if to_modno < 0 or to_modno > current:
+            raise ValueError(_('{0}: is not a modification number between 0 and {1}.').format(to_modno, current))
+        modnos = range(to_modno + 1, current + 1)
+        for modno in modnos:
+            if os.path.exists(journal.irreversible_path(modno, base_dir_name)):
+                raise ValueError(_('Modification #{0} can\'t be reverted (it didn\'t just append): regenerate (or "reset") the tree instead.').format(modno))
+        sizes = {}
+        for modno in modnos:
+            for filepath, size in journal.read_journal(modno, base_dir_name):
+                sizes.setdefault(filepath, size)
+        items = [(os.path.join(base_dir_name, filepath), size) for filepath, size in sizes.items()]
+        batches = [items[index:index + REVERT_BATCH_SIZE] for index in range(0, len(items), REVERT_BATCH_SIZE)]
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            emsgs = [emsg for batch_emsgs in executor.map(_truncate_batch, batches) for emsg in batch_emsgs]
+        fobj.seek(0)
+        fobj.write("{0}".format(to_modno))
+        fobj.truncate()
+        fobj.flush()
+        journal.remove_rounds(modnos, base_dir_name)
+    return (to_modno, len(modnos), len(items) - len(emsgs), emsgs)
+
+def revert_tree(to_modno=None, jobs=1):
+    '''Execute the "revert" sub command using the supplied args'''
+    start = time.time()
+    try:
+        to_modno, nrounds, ntruncated, emsgs = revert_files(to_modno, jobs)
+    except ValueError as edata:
+        return "{0}\n".format(edata)
+    except IOError:
+        return _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
+    sys.stderr.write("".join(emsgs))
+    sys.stdout.write(_("Reverted to modification #{0}: {1} round(s), {2} file(s) truncated, {3} error(s) in {4:.3f} seconds.\n").format(to_modno, nrounds, ntruncated, len(emsgs), time.time() - start))
+    return 1 if emsgs else 0
@@ -0,0 +1,38 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Constants shared by the scm_test_tree script and the modules that it
+only imports when the commands that use them are run.
+
+Deliberately imports nothing else from the package so that the script
+can use them (e.g. as argument choices and defaults) without paying
+for the import of the engine.
+'''
+
+import os
+
+from . import CONFIG_DIR_PATH
+
+MUTATE_OPERATIONS = ("insert", "delete", "replace")
+MUTATE_MODES = ("lines", "bytes")
+CHURN_OPERATIONS = ("rename", "move", "delete")
+PATCH_MODES = ("stacked", "overlapping", "conflicting")
+
+BENCH_SIZES = "1:5:5,2:10:10,3:10:10"
+BENCH_JOBS = "1,4"
+# the drop in files/sec (a fraction) that counts as a regression
+BENCH_THRESHOLD = 0.1
+
+SERVE_SOCKET = os.path.join(CONFIG_DIR_PATH, "serve.sock")
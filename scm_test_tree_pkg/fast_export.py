@@ -0,0 +1,108 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Generate a test repository's history as a "git fast-import" stream.
+
+The tree and its modification rounds are modelled in memory (see
+mod_model) so a history of any length is written in a single pass
+without a working tree: the first commit adds the tree as "create"
+would make it and each later commit is a round of "modify --rounds"
+(modifying the same files but with the modelled rather than the actual
+time in the appended lines).
+'''
+
+import os
+import sys
+import time
+import subprocess
+
+from . import mod_model
+
+DEFAULT_AUTHOR = "scm_test_tree <scm_test_tree@example.com>"
+DEFAULT_REF = "refs/heads/master"
+
+# the stream is written through a buffer this big
+STREAM_BUFFER_SIZE = 1 << 20
+
+def _quote_path(path):
+    data = os.fsencode(path)
+    if not (data.startswith(b'"') or b"\n" in data):
+        return data
+    return b'"' + data.replace(b"\\", b"\\\\").replace(b'"', b'\\"').replace(b"\n", b"\\n") + b'"'
+
+def _write_data(out, data):
+    out.write(b"data %d\n" % len(data))
+    out.write(data)
+    out.write(b"\n")
+
+def _write_commit(out, ref, author, when, message, files):
+    out.write(b"commit %s\n" % ref.encode())
+    ident = b"%s %d +0000\n" % (author.encode(), int(when.timestamp()))
+    out.write(b"author " + ident)
+    out.write(b"committer " + ident)
+    _write_data(out, message.encode())
+    for path, content in files:
+        out.write(b"M 100644 inline %s\n" % _quote_path(path))
+        _write_data(out, content)
+    out.write(b"\n")
+
+def write_stream(out, model, rounds, files_per_round=0, seed=0, add_tws=False, no_newline=False, ref=DEFAULT_REF, author=DEFAULT_AUTHOR, start=0, interval=1):
+    '''Write the history of model (the initial tree followed by rounds
+    modification rounds) to out (a binary file) and return the number
+    of commits written.
+    '''
+    out.write(b"feature done\n")
+    _write_commit(out, ref, author, mod_model.round_time(start, model.modno, interval), "Create test tree", model.iter_initial_files())
+    ncommits = 1
+    for modno, when, added in model.iter_rounds(rounds, files_per_round, seed, add_tws, no_newline, start, interval):
+        message = "Modification #{0}: {1} file(s)".format(modno, len(added))
+        _write_commit(out, ref, author, when, message, ((path, model.content(path)) for path in added))
+        ncommits += 1
+    out.write(b"done\n")
+    return ncommits
+
+def _start_fast_import(repo_dir, ref):
+    '''Return a "git fast-import" process importing into the repository at
+    repo_dir (which is created if necessary).
+    '''
+    if not os.path.isdir(os.path.join(repo_dir, ".git")):
+        subprocess.check_call(["git", "init", "-q", repo_dir])
+        subprocess.check_call(["git", "-C", repo_dir, "symbolic-ref", "HEAD", ref])
+    return subprocess.Popen(["git", "-C", repo_dir, "fast-import", "--quiet"], stdin=subprocess.PIPE, bufsize=STREAM_BUFFER_SIZE)
+
+def export_cmd(shape, rounds, files_per_round=0, seed=0, add_tws=False, no_newline=False, ref=DEFAULT_REF, author=DEFAULT_AUTHOR, start=None, interval=1, output=None, repo_dir=None):
+    '''Execute the "export" sub command using the supplied args'''
+    started = time.time()
+    start = int(started) - rounds * interval if start is None else start
+    model = mod_model.TreeModel(shape)
+    process = None
+    try:
+        if repo_dir:
+            process = _start_fast_import(repo_dir, ref)
+            out = process.stdin
+        elif output:
+            out = open(output, "wb", buffering=STREAM_BUFFER_SIZE)
+        else:
+            out = open(sys.stdout.fileno(), "wb", buffering=STREAM_BUFFER_SIZE, closefd=False)
+        with out:
+            ncommits = write_stream(out, model, rounds, files_per_round, seed, add_tws, no_newline, ref, author, start, interval)
+    except BrokenPipeError:
+        return _("export: the reader of the stream went away.\n") if process is None or process.wait() == 0 else _("git fast-import failed.\n")
+    except (OSError, subprocess.CalledProcessError) as edata:
+        return "{0}\n".format(edata)
+    if process is not None and process.wait() != 0:
+        return _("git fast-import failed.\n")
+    sys.stderr.write(_("export: {0} commit(s) of {1} file(s) in {2:.3f} seconds.\n").format(ncommits, len(model), time.time() - started))
+    return 0
@@ -0,0 +1,183 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Watch (some of) the directories of a test tree for changes to
+their contents (names).
+
+Only the directories passed to watch_dir() (e.g. those on show) are
+watched and read_changes() returns the set of (relative) paths of
+those that have had entries added, removed or renamed since the last
+call (or None if track has been lost and everything should be
+refreshed).  Changes to files' contents are not reported as they
+don't alter the shape of the tree.  Linux's inotify is used if
+available otherwise the directories' modification times are polled.
+An inotify watcher that can no longer keep up (e.g. it has run out of
+watches) closes itself and sets lost: it should be replaced by a
+PollingWatcher.
+'''
+
+import os
+import errno
+import struct
+import ctypes
+import ctypes.util
+
+from . import cmd_ifce
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    _inotify_rm_watch = _libc.inotify_rm_watch
+    _inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+except (OSError, AttributeError):
+    _inotify_init1 = None
+
+class InotifyWatcher(object):
+    '''Watch directories in the tree at base_dir with inotify.
+
+    fileno() becomes readable when there are changes to be read.
+    '''
+    lost = False
+    def __init__(self, base_dir):
+        if _inotify_init1 is None:
+            raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+        self.base_dir = os.path.abspath(base_dir)
+        self._fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            eno = ctypes.get_errno()
+            raise OSError(eno, os.strerror(eno))
+        self._dir_paths = {}
+        self._wds = {}
+    def watch_dir(self, dir_path):
+        '''Start watching the directory at (relative) dir_path'''
+        if self.lost or dir_path in self._wds:
+            return
+        wd = _inotify_add_watch(self._fd, os.fsencode(os.path.join(self.base_dir, dir_path)), WATCH_MASK)
+        if wd < 0:
+            if ctypes.get_errno() not in (errno.ENOENT, errno.ENOTDIR):
+                # e.g. ENOSPC (out of watches): changes would go unseen
+                self._lose_track()
+            return
+        self._dir_paths[wd] = dir_path
+        self._wds[dir_path] = wd
+    def unwatch_dir(self, dir_path):
+        '''Stop watching the directory at (relative) dir_path'''
+        wd = self._wds.pop(dir_path, None)
+        if wd is not None and self._dir_paths.pop(wd, None) is not None and self._fd >= 0:
+            _inotify_rm_watch(self._fd, wd)
+    def fileno(self):
+        return self._fd
+    def read_changes(self):
+        changes = set()
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return changes
+            except OSError:
+                return self._lose_track()
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0"))
+                offset += _EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changes = None
+                    continue
+                dir_path = self._dir_paths.get(wd)
+                if dir_path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self._dir_paths[wd]
+                    self._wds.pop(dir_path, None)
+                    continue
+                if mask & IN_MOVE_SELF:
+                    # it's no longer at dir_path (and the parent will report it)
+                    self.unwatch_dir(dir_path)
+                    continue
+                if mask & IN_DELETE_SELF:
+                    continue # the parent will report it
+                if mask & IN_ISDIR and name in cmd_ifce.SCM_DIRS:
+                    continue
+                if changes is not None:
+                    changes.add(dir_path)
+    def _lose_track(self):
+        self.close()
+        self.lost = True
+        return None
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._dir_paths = {}
+        self._wds = {}
+
+class PollingWatcher(object):
+    '''Poll the modification times of the watched directories in the tree at base_dir'''
+    lost = False
+    def __init__(self, base_dir):
+        self.base_dir = os.path.abspath(base_dir)
+        self._mtimes = {}
+    def _mtime(self, dir_path):
+        try:
+            return os.lstat(os.path.join(self.base_dir, dir_path)).st_mtime_ns
+        except OSError:
+            return None
+    def watch_dir(self, dir_path):
+        '''Start watching the directory at (relative) dir_path'''
+        if dir_path not in self._mtimes:
+            self._mtimes[dir_path] = self._mtime(dir_path)
+    def unwatch_dir(self, dir_path):
+        '''Stop watching the directory at (relative) dir_path'''
+        self._mtimes.pop(dir_path, None)
+    def fileno(self):
+        return None
+    def read_changes(self):
+        changes = set()
+        for dir_path, old_mtime in list(self._mtimes.items()):
+            mtime = self._mtime(dir_path)
+            if mtime is None:
+                del self._mtimes[dir_path] # gone (and the parent will report it)
+            elif mtime != old_mtime:
+                self._mtimes[dir_path] = mtime
+                changes.add(dir_path)
+        return changes
+    def close(self):
+        self._mtimes = {}
+
+def make_watcher(base_dir):
+    '''Return an InotifyWatcher for base_dir if possible otherwise a PollingWatcher'''
+    try:
+        return InotifyWatcher(base_dir)
+    except OSError:
+        return PollingWatcher(base_dir)
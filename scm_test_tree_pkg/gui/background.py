@@ -0,0 +1,188 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Run long operations (modify, create) on a worker thread.
+
+The worker never touches GTK: the progress dialog reads the job's
+counters on a timer and the job's result (a CmdResult) is handed to
+the main loop with GLib.idle_add() when the job has finished.
+'''
+
+import os
+import time
+import threading
+import traceback
+
+from gi.repository import Gtk
+from gi.repository import GLib
+
+from ..bab import CmdResult
+
+from .. import cmd_ifce
+from .. import journal
+from .. import tree_shape
+from .. import tree_builder
+
+# how often (in ms) the progress dialog is brought up to date
+PROGRESS_INTERVAL_MS = 200
+# files are modified in batches of this many between checks for cancellation
+MODIFY_BATCH_SIZE = 256
+
+class Job(object):
+    '''A job whose work(job) is a generator yielding the number of items
+    completed since its last yield and returning a CmdResult.  work may
+    set job.total (if it is known) for the progress bar.
+    '''
+    def __init__(self, work, total=None):
+        self._work = work
+        self.total = total
+        self.ndone = 0
+        self.elapsed = 0.0
+        self._cancelled = threading.Event()
+    def cancel(self):
+        self._cancelled.set()
+    @property
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+    def _run(self, finished_cb):
+        start = time.monotonic()
+        result = None
+        try:
+            generator = self._work(self)
+            while True:
+                if self._cancelled.is_set():
+                    generator.close()
+                    result = CmdResult.warning(stderr=_("Cancelled after {0} item(s).\n").format(self.ndone))
+                    break
+                self.ndone += next(generator)
+                self.elapsed = time.monotonic() - start
+        except StopIteration as stop:
+            result = stop.value
+        except (OSError, ValueError) as edata:
+            result = CmdResult.error(stderr="{0}\n".format(edata))
+        except Exception:
+            result = CmdResult.error(stderr=traceback.format_exc())
+        finally:
+            # whatever happens the dialog must go
+            self.elapsed = time.monotonic() - start
+            GLib.idle_add(finished_cb, result if result is not None else CmdResult.error(stderr=_("The job was aborted.\n")))
+    def start(self, finished_cb):
+        '''Start the job on a worker thread and arrange for finished_cb(result)
+        to be called in the main loop when it is done.
+        '''
+        thread = threading.Thread(target=self._run, args=(finished_cb, ), daemon=True)
+        thread.start()
+
+def _iter_file_paths(base_dir, fsi_paths):
+    prefix_len = len(os.path.join(base_dir, ""))
+    for fsi_path in fsi_paths:
+        if os.path.isdir(os.path.join(base_dir, fsi_path)):
+            for file_path in cmd_ifce.iter_test_tree_files(os.path.join(base_dir, fsi_path)):
+                yield file_path[prefix_len:]
+        else:
+            yield fsi_path
+
+def modify_job(fsi_paths):
+    '''Return a Job appending a modification line to the files in
+    fsi_paths (and those in any directories in fsi_paths).
+    '''
+    # the working directory may change while the job runs
+    base_dir = os.getcwd()
+    def work(job):
+        try:
+            modno = cmd_ifce.reserve_modnos(base_dir_name=base_dir)
+        except (IOError, ValueError):
+            return CmdResult.error(stderr=_('{0}: is NOT a valid test directory. Aborting.\n').format(base_dir))
+        template = cmd_ifce.modification_template(modno)
+        modno_journal = journal.open_journal(modno, base_dir)
+        emsgs = []
+        batch = []
+        for file_path in _iter_file_paths(base_dir, fsi_paths):
+            batch.append(file_path)
+            if len(batch) >= MODIFY_BATCH_SIZE:
+                cmd_ifce.append_modification(batch, template, True, emsgs.append, journal=modno_journal, base_dir_name=base_dir)
+                yield len(batch)
+                batch = []
+        if batch:
+            cmd_ifce.append_modification(batch, template, True, emsgs.append, journal=modno_journal, base_dir_name=base_dir)
+            yield len(batch)
+        return CmdResult.warning(stderr="".join(emsgs)) if emsgs else CmdResult.ok()
+    has_dirs = any(os.path.isdir(fsi_path) for fsi_path in fsi_paths)
+    return Job(work, total=None if has_dirs else len(fsi_paths))
+
+def create_job(base_dir_name, shape=None, jobs=None):
+    '''Return a Job creating a test tree (of the given shape) in base_dir_name'''
+    shape = shape or tree_shape.TreeShape()
+    # several workers so that progress is reported (and cancellation
+    # checked) subtree by subtree rather than once at the end
+    jobs = jobs or max(os.cpu_count() or 1, 2)
+    base_dir_name = os.path.abspath(base_dir_name)
+    def work(job):
+        job.total = sum(len(list(shape.iter_file_specs(dir_path, level))) for dir_path, level in shape.walk())
+        emsg = cmd_ifce.init_test_tree(base_dir_name)
+        if emsg:
+            return CmdResult.error(stderr=emsg)
+        emsgs = []
+        for ncreated, part_emsgs in tree_builder.build_tree(base_dir_name, shape, jobs=jobs):
+            emsgs.extend(part_emsgs)
+            yield ncreated
+        return CmdResult.warning(stderr="".join(emsgs)) if emsgs else CmdResult.ok()
+    return Job(work)
+
+class JobProgressDialog(Gtk.Dialog):
+    '''Show the progress (and rate) of job with a button to cancel it'''
+    def __init__(self, job, title, parent=None):
+        Gtk.Dialog.__init__(self, title=title, transient_for=parent)
+        self._job = job
+        self._progress_bar = Gtk.ProgressBar()
+        self._progress_bar.set_show_text(True)
+        self._rate_label = Gtk.Label()
+        vbox = self.get_content_area()
+        vbox.pack_start(self._progress_bar, expand=False, fill=True, padding=4)
+        vbox.pack_start(self._rate_label, expand=False, fill=True, padding=4)
+        self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        self.connect("response", self._response_cb)
+        self._timer = GLib.timeout_add(PROGRESS_INTERVAL_MS, self._update_cb)
+        self.show_all()
+    def _update_cb(self):
+        job = self._job
+        if job.total:
+            self._progress_bar.set_fraction(min(job.ndone / job.total, 1.0))
+            self._progress_bar.set_text(_("{0} of {1} files").format(job.ndone, job.total))
+        else:
+            self._progress_bar.pulse()
+            self._progress_bar.set_text(_("{0} files").format(job.ndone))
+        if job.elapsed:
+            self._rate_label.set_text(_("{0:.0f} files/second").format(job.ndone / job.elapsed))
+        return True
+    def _response_cb(self, _dialog, _response_id):
+        # cancel (or closing the window) just asks the job to stop: we go when it has
+        self._job.cancel()
+        self.set_response_sensitive(Gtk.ResponseType.CANCEL, False)
+        self._rate_label.set_text(_("Cancelling ..."))
+    def finish(self):
+        GLib.source_remove(self._timer)
+        self.destroy()
+
+def run_job(job, title, parent, done_cb):
+    '''Run job in the background showing its progress and then call
+    done_cb(result) in the main loop.
+    '''
+    dialog = JobProgressDialog(job, title, parent)
+    def finished_cb(result):
+        dialog.finish()
+        done_cb(result)
+        return False
+    job.start(finished_cb)
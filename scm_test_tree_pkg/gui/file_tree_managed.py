@@ -18,6 +18,7 @@ import os
 import os.path
 
 from gi.repository import Gtk
+from gi.repository import GLib
 
 from ..bab import enotify
 
@@ -25,10 +26,12 @@ from ..gtx import file_tree
 from ..gtx import dialogue
 from ..gtx import actions
 
-from .. import cmd_ifce
+from .. import fs_watch
 
 from . import ws_actions
 from . import icons
+from . import lazy_file_tree
+from . import background
 
 class ManagedFileTreeView(file_tree.FileTreeView, enotify.Listener, ws_actions.WSListenerMixin):
     DEFAULT_POPUP = "/stt_files_popup"
@@ -63,15 +66,186 @@ class ManagedFileTreeView(file_tree.FileTreeView, enotify.Listener, ws_actions.W
     DIRS_SELECTABLE = True
     ASK_BEFORE_DELETE = True
     OPEN_NEW_FILES_FOR_EDIT = False
+    # delay (ms) for coalescing bursts of changes and (when inotify is
+    # unavailable) the interval (s) between polls of the directories
+    WATCH_COALESCE_MS = 100
+    WATCH_POLL_INTERVAL = 2
     def __init__(self, **kwargs):
+        self._watcher = None
+        self._watch_source = None
+        self._flush_source = None
+        self._changed_dirs = set()
+        self._lazy_model_installed = False
         file_tree.FileTreeView.__init__(self, **kwargs)
         enotify.Listener.__init__(self)
         ws_actions.WSListenerMixin.__init__(self)
+        self._install_lazy_model()
+        self.add_notification_cb(enotify.E_CHANGE_WD, self._watch_new_wd_cb)
+        self.connect("destroy", lambda _widget: self._stop_watching())
+        self._start_watching()
+    def _install_lazy_model(self):
+        # replace the eagerly populated model with one that only holds
+        # the rows on show (see lazy_file_tree)
+        self.model = lazy_file_tree.LazyFileTreeModel()
+        for column in self.get_columns():
+            self.remove_column(column)
+        column = Gtk.TreeViewColumn(_("Name"))
+        column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        icon_cell = Gtk.CellRendererPixbuf()
+        column.pack_start(icon_cell, False)
+        column.set_cell_data_func(icon_cell, self._icon_cell_data_func)
+        name_cell = Gtk.CellRendererText()
+        column.pack_start(name_cell, True)
+        column.add_attribute(name_cell, "text", lazy_file_tree.LazyFileTreeModel.NAME)
+        self.append_column(column)
+        # rows are all the same height so only visible rows are measured
+        self.set_fixed_height_mode(True)
+        self.set_model(self.model)
+        self.connect("test-expand-row", self._lazy_expand_cb)
+        self.connect("row-collapsed", self._lazy_collapse_cb)
+        self.connect("row-activated", self._lazy_activated_cb)
+        self.model.populate(None)
+        self._lazy_model_installed = True
+    @staticmethod
+    def _icon_cell_data_func(_column, cell, model, model_iter, _data):
+        kind = model.get_value(model_iter, model.KIND)
+        if kind != lazy_file_tree.ENTRY:
+            cell.set_property("stock-id", None)
+        else:
+            cell.set_property("stock-id", Gtk.STOCK_DIRECTORY if model.get_value(model_iter, model.IS_DIR) else Gtk.STOCK_FILE)
+    def _lazy_expand_cb(self, _view, dir_iter, _tree_path):
+        if not self.model.is_populated(dir_iter):
+            self.model.populate(dir_iter)
+            self._watch_dir(self.model.get_value(dir_iter, self.model.PATH))
+        return False
+    def _lazy_collapse_cb(self, _view, dir_iter, _tree_path):
+        if self._watcher is not None:
+            for dir_path in self._populated_dir_paths(dir_iter):
+                self._watcher.unwatch_dir(dir_path)
+        self.model.drop_children(dir_iter)
+    def _populated_dir_paths(self, dir_iter=None):
+        '''Return the paths of dir_iter's directory and of those below it whose contents are on show'''
+        dir_paths = []
+        dir_iters = [dir_iter]
+        while dir_iters:
+            dir_iter = dir_iters.pop()
+            dir_paths.append("" if dir_iter is None else self.model.get_value(dir_iter, self.model.PATH))
+            child_iter = self.model.iter_children(dir_iter)
+            while child_iter is not None:
+                if self.model.is_populated(child_iter):
+                    dir_iters.append(child_iter)
+                child_iter = self.model.iter_next(child_iter)
+        return dir_paths
+    def _lazy_activated_cb(self, _view, tree_path, _column):
+        model_iter = self.model.get_iter(tree_path)
+        if self.model.get_value(model_iter, self.model.KIND) == lazy_file_tree.MORE:
+            self.model.load_more(model_iter)
+    def _update_dir(self, dir_path, dir_iter=None):
+        if not self._lazy_model_installed:
+            return # the lazy model populates itself when installed
+        if dir_iter is None or self.model.is_populated(dir_iter):
+            self.model.refresh(dir_iter)
+    def update(self, *_args, **_kwargs):
+        # re-read the directories on show (and only those)
+        if not self._lazy_model_installed:
+            return
+        dir_iters = [None]
+        while dir_iters:
+            dir_iter = dir_iters.pop()
+            self._update_dir(None, dir_iter)
+            child_iter = self.model.iter_children(dir_iter)
+            while child_iter is not None:
+                if self.model.is_populated(child_iter):
+                    dir_iters.append(child_iter)
+                child_iter = self.model.iter_next(child_iter)
+    def _iter_selected_entries(self):
+        model, tree_paths = self.get_selection().get_selected_rows()
+        for tree_path in tree_paths:
+            model_iter = model.get_iter(tree_path)
+            if model.get_value(model_iter, model.KIND) == lazy_file_tree.ENTRY:
+                yield (model.get_value(model_iter, model.PATH), model.get_value(model_iter, model.IS_DIR))
+    def get_selected_fsi_paths(self):
+        return [path for path, _is_dir in self._iter_selected_entries()]
+    def get_selected_fsi_path(self):
+        paths = self.get_selected_fsi_paths()
+        return paths[0] if paths else None
+    def get_selected_file_paths(self):
+        return [path for path, is_dir in self._iter_selected_entries() if not is_dir]
+    def _start_watching(self, watcher_class=None):
+        # only the directories on show are watched (see _lazy_expand_cb)
+        self._stop_watching()
+        self._watcher = fs_watch.make_watcher(os.curdir) if watcher_class is None else watcher_class(os.curdir)
+        for dir_path in self._populated_dir_paths():
+            self._watcher.watch_dir(dir_path)
+        if self._watcher.lost:
+            self._start_watching(fs_watch.PollingWatcher)
+        elif self._watcher.fileno() is not None:
+            self._watch_source = GLib.io_add_watch(self._watcher.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._watcher_ready_cb)
+        else:
+            self._watch_source = GLib.timeout_add_seconds(self.WATCH_POLL_INTERVAL, self._watcher_ready_cb)
+    def _watch_dir(self, dir_path):
+        if self._watcher is None:
+            return
+        self._watcher.watch_dir(dir_path)
+        if self._watcher.lost:
+            # inotify can't keep up (e.g. it's out of watches) so poll instead
+            self._start_watching(fs_watch.PollingWatcher)
+            self._note_changes(None)
+    def _stop_watching(self):
+        for source in (self._watch_source, self._flush_source):
+            if source is not None:
+                GLib.source_remove(source)
+        self._watch_source = self._flush_source = None
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+    def _watch_new_wd_cb(self, **kwargs):
+        self._start_watching()
+    def _watcher_ready_cb(self, *_args):
+        changes = self._watcher.read_changes()
+        if self._watcher.lost:
+            # inotify can't keep up (e.g. it's out of watches) so poll instead
+            self._watch_source = None # being removed by returning False
+            self._start_watching(fs_watch.PollingWatcher)
+            self._note_changes(None)
+            return False
+        self._note_changes(changes)
+        return True
+    def _note_changes(self, changes):
+        if changes is None or self._changed_dirs is None:
+            self._changed_dirs = None
+        else:
+            self._changed_dirs |= changes
+        if (self._changed_dirs is None or self._changed_dirs) and self._flush_source is None:
+            self._flush_source = GLib.timeout_add(self.WATCH_COALESCE_MS, self._flush_changes_cb)
+    def _flush_changes_cb(self):
+        self._flush_source = None
+        changed_dirs, self._changed_dirs = self._changed_dirs, set()
+        self.invalidate_dirs(changed_dirs)
+        return False
+    def auto_update_cb(self, events_so_far, args):
+        # the watcher tells us what has changed so don't poll the file database
+        if self._watcher is None:
+            return file_tree.FileTreeView.auto_update_cb(self, events_so_far, args)
+        return 0
+    def invalidate_dirs(self, dir_paths):
+        '''Re-read the contents of the directories in dir_paths (or the
+        whole tree if it is None) rather than the whole tree.
+        '''
+        if dir_paths is None:
+            self.update()
+            return
+        # parents first so that new subdirectories' rows exist when we get to them
+        for dir_path in sorted(dir_paths, key=lambda dir_path: dir_path.count(os.sep) if dir_path else -1):
+            found, dir_iter = self.model.find_dir(dir_path)
+            if found:
+                self._update_dir(dir_path, dir_iter)
+            # else it's in a collapsed (or gone) directory and will be read when shown
     def populate_action_groups(self):
         self.action_groups[ws_actions.AC_IN_TGND|actions.AC_SELN_MADE].add_actions(
             [
                 ("stt_modify_selected_files", Gtk.STOCK_EDIT, _('_Modify'), None,
-                 _('Modify the selected file(s)'),
+                 _('Modify the selected file(s) (and those in the selected directories)'),
                  self.modify_selected_files_acb
                 ),
                 ("stt_copy_fs_items", Gtk.STOCK_COPY, _("Copy"), None,
@@ -102,7 +276,10 @@ class ManagedFileTreeView(file_tree.FileTreeView, enotify.Listener, ws_actions.W
                 ),
             ])
     def modify_selected_files_acb(self, _menu_item):
-        self.report_any_problems(cmd_ifce.modify_files(self.get_selected_file_paths(), gui_calling=True))
+        fsi_paths = self.get_selected_fsi_paths()
+        if not fsi_paths:
+            return
+        background.run_job(background.modify_job(fsi_paths), _("Modify"), self.get_toplevel(), self.report_any_problems)
 
 class ManagedFileTreeWidget(file_tree.FileTreeWidget):
     MENUBAR = "/files_menubar"
@@ -16,13 +16,12 @@ from ..gtx import recollect
 
 from .. import APP_NAME
 
-from .. import cmd_ifce
-
 from . import ifce
 from . import config
 from . import ws_actions
 from . import icons
 from . import file_tree_managed
+from . import background
 
 recollect.define("main_window", "last_geometry", recollect.Defn(str, ""))
 recollect.define("main_window", "vpaned_position", recollect.Defn(int, -1))
@@ -110,10 +109,12 @@ class MainWindow(dialogue.MainWindow, actions.CAGandUIManager, enotify.Listener,
     def _new_tgnd_acb(self, _action):
         dirname = self.ask_dir_path(_("{0}: Browse for Directory").format(APP_NAME), existing=True)
         if dirname:
-            result = cmd_ifce.create_test_tree(dirname, gui_calling=True)
-            if result.is_less_than_error:
-                ifce.chdir(dirname)
-            self.report_any_problems(result)
+            dirname = os.path.abspath(dirname)
+            def done_cb(result):
+                if result.is_less_than_error:
+                    ifce.chdir(dirname)
+                self.report_any_problems(result)
+            background.run_job(background.create_job(dirname), _("Create"), self, done_cb)
     def _configure_event_cb(self, widget, event):
         recollect.set("main_window", "last_geometry", "{0.width}x{0.height}+{0.x}+{0.y}".format(event))
     def _paned_notify_cb(self, widget, parameter, oname=None):
@@ -108,7 +108,8 @@ def check_interfaces(event_args):
     from .. import utils
     global CURDIR
     curdir = os.getcwd()
-    if not os.path.samefile(CURDIR, curdir):
+    # string comparison is enough in the usual (unchanged) case
+    if curdir != CURDIR and not os.path.samefile(CURDIR, curdir):
         event_args["new_wd"] = curdir
         CURDIR = curdir
         return enotify.E_CHANGE_WD # don't send ifce changes and wd change at the same time
@@ -0,0 +1,153 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''A file tree model that only holds what is on show.
+
+A directory's contents are read when it is expanded (until then it
+has a single placeholder child so that it can be expanded) and are
+dropped again when it is collapsed.  Big directories are shown a page
+at a time with a "more" row at the end which loads the next page when
+activated.
+'''
+
+import os
+
+from gi.repository import Gtk
+
+from .. import cmd_ifce
+
+PAGE_SIZE = 1000
+
+# row kinds
+ENTRY, PLACEHOLDER, MORE = range(3)
+
+def read_dir(dir_path):
+    '''Return the sorted (directories first) list of (name, is_dir) for
+    the test tree entries in dir_path.  Only directory entry types are
+    consulted so nothing is stat()ed.
+    '''
+    entries = []
+    try:
+        with os.scandir(dir_path or os.curdir) as dir_entries:
+            for entry in dir_entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in cmd_ifce.SCM_DIRS:
+                        entries.append((False, entry.name))
+                elif entry.name not in cmd_ifce.SKIP_FILES:
+                    entries.append((True, entry.name))
+    except OSError:
+        return []
+    entries.sort()
+    return [(name, not is_file) for is_file, name in entries]
+
+class LazyFileTreeModel(Gtk.TreeStore):
+    NAME, PATH, IS_DIR, KIND = range(4)
+    _COLUMNS = {"name": NAME, "path": PATH, "is_dir": IS_DIR, "kind": KIND}
+    def __init__(self, page_size=PAGE_SIZE):
+        Gtk.TreeStore.__init__(self, str, str, bool, int)
+        self.page_size = page_size
+        # the full (sorted) listings of directories with more rows to show
+        self._pending = {}
+    def get_value_named(self, model_iter, label):
+        return self.get_value(model_iter, self._COLUMNS[label])
+    def _append_entries(self, dir_iter, dir_path, entries):
+        for name, is_dir in entries:
+            child_iter = self.append(dir_iter, [name, os.path.join(dir_path, name), is_dir, ENTRY])
+            if is_dir:
+                self.append(child_iter, ["", "", False, PLACEHOLDER])
+    def _set_more_row(self, dir_iter, dir_path, nshown):
+        entries = self._pending.get(dir_path)
+        if entries is None or nshown >= len(entries):
+            self._pending.pop(dir_path, None)
+            return
+        self.append(dir_iter, [_("... {0} more").format(len(entries) - nshown), dir_path, False, MORE])
+    def _dir_path(self, dir_iter):
+        return "" if dir_iter is None else self.get_value(dir_iter, self.PATH)
+    def _drop_pending(self, dir_path):
+        prefix = dir_path + os.sep
+        for pending_path in [path for path in self._pending if path == dir_path or not dir_path or path.startswith(prefix)]:
+            del self._pending[pending_path]
+    def populate(self, dir_iter=None):
+        '''(Re)read the first page of dir_iter's (None for the top) directory'''
+        dir_path = self._dir_path(dir_iter)
+        self.drop_children(dir_iter, placeholder=False)
+        entries = read_dir(dir_path)
+        if len(entries) > self.page_size:
+            self._pending[dir_path] = entries
+        self._append_entries(dir_iter, dir_path, entries[:self.page_size])
+        self._set_more_row(dir_iter, dir_path, self.page_size)
+    def load_more(self, more_iter):
+        '''Replace the "more" row more_iter with the next page'''
+        dir_iter = self.iter_parent(more_iter)
+        dir_path = self._dir_path(dir_iter)
+        nshown = self.iter_n_children(dir_iter) - 1
+        self.remove(more_iter)
+        entries = self._pending.get(dir_path, [])
+        self._append_entries(dir_iter, dir_path, entries[nshown:nshown + self.page_size])
+        self._set_more_row(dir_iter, dir_path, nshown + self.page_size)
+    def drop_children(self, dir_iter, placeholder=True):
+        '''Forget dir_iter's contents (leaving a placeholder so that it can be expanded again)'''
+        self._drop_pending(self._dir_path(dir_iter))
+        child_iter = self.iter_children(dir_iter)
+        while child_iter is not None and self.remove(child_iter):
+            pass
+        if placeholder and dir_iter is not None:
+            self.append(dir_iter, ["", "", False, PLACEHOLDER])
+    def is_populated(self, dir_iter):
+        child_iter = self.iter_children(dir_iter)
+        return child_iter is not None and self.get_value(child_iter, self.KIND) != PLACEHOLDER
+    def refresh(self, dir_iter=None):
+        '''Bring an expanded directory's (shown) rows up to date keeping
+        the rows (and hence expansion) of those entries still present.
+        '''
+        dir_path = self._dir_path(dir_iter)
+        entries = read_dir(dir_path)
+        rows = {}
+        child_iter = self.iter_children(dir_iter)
+        while child_iter is not None:
+            if self.get_value(child_iter, self.KIND) == ENTRY:
+                rows[(self.get_value(child_iter, self.NAME), self.get_value(child_iter, self.IS_DIR))] = child_iter
+                child_iter = self.iter_next(child_iter)
+            elif not self.remove(child_iter):
+                break
+        nshown = max(len(rows), self.page_size)
+        wanted = entries[:nshown]
+        wanted_set = set(wanted)
+        for key, row_iter in list(rows.items()):
+            if key not in wanted_set:
+                self._drop_pending(self.get_value(row_iter, self.PATH))
+                self.remove(row_iter)
+                del rows[key]
+        for index, (name, is_dir) in enumerate(wanted):
+            if (name, is_dir) not in rows:
+                child_iter = self.insert(dir_iter, index, [name, os.path.join(dir_path, name), is_dir, ENTRY])
+                if is_dir:
+                    self.append(child_iter, ["", "", False, PLACEHOLDER])
+        if len(entries) > nshown:
+            self._pending[dir_path] = entries
+        else:
+            self._pending.pop(dir_path, None)
+        self._set_more_row(dir_iter, dir_path, nshown)
+    def find_dir(self, dir_path):
+        '''Return (found, iter) for dir_path's row (iter is None for the top)'''
+        dir_iter = None
+        for name in dir_path.split(os.sep) if dir_path else []:
+            child_iter = self.iter_children(dir_iter)
+            while child_iter is not None and not (self.get_value(child_iter, self.KIND) == ENTRY and self.get_value(child_iter, self.NAME) == name):
+                child_iter = self.iter_next(child_iter)
+            if child_iter is None:
+                return (False, None)
+            dir_iter = child_iter
+        return (True, dir_iter)
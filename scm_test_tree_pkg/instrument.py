@@ -0,0 +1,250 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Count and time the I/O done by a command (--timings) and/or run it
+under cProfile (--profile).
+
+While instrumented, the modules that do the test tree's I/O see (as
+their "os") a copy of the os module whose I/O functions (and those of
+os.path that stat) are wrapped to record the number of calls, bytes
+transferred and a (log scale) histogram of latencies for each kind of
+operation.  Their open() is likewise replaced by one whose file
+objects' reads, writes and closes are recorded.  Nothing is
+touched (or even imported) unless instrumentation is asked for.  Only
+the I/O of this process is seen (not that of --processes workers)
+and scandir() is timed up to the opening of the directory only.
+'''
+
+import os
+import sys
+import json
+import math
+import time
+import types
+import threading
+import importlib
+import contextlib
+
+# the modules whose I/O is instrumented
+MODULES = ("cmd_ifce", "tree_builder", "journal", "mutate", "churn", "tree_cache", "manifest")
+
+# the os functions wrapped for each kind of operation
+OPERATIONS = {
+    "open": ("open", ),
+    "close": ("close", ),
+    "read": ("read", "pread"),
+    "write": ("write", "pwrite"),
+    "stat": ("stat", "lstat", "fstat"),
+    "mkdir": ("mkdir", "makedirs"),
+    "scandir": ("scandir", "listdir"),
+    "truncate": ("truncate", "ftruncate"),
+    "fallocate": ("posix_fallocate", ),
+    "unlink": ("unlink", "remove"),
+    "rename": ("rename", "replace"),
+    "link": ("link", ),
+}
+
+# the os.path functions wrapped for each kind of operation
+PATH_OPERATIONS = {
+    "stat": ("exists", "isdir", "isfile", "getsize"),
+}
+
+# phases of a command (module, function) timed as a whole
+PHASES = {
+    "init": ("cmd_ifce", "init_test_tree"),
+    "counter": ("cmd_ifce", "reserve_modnos"),
+}
+
+PERCENTILES = (50, 90, 99)
+# latency histogram buckets per doubling
+_BUCKETS_PER_OCTAVE = 4
+
+class OpStats(object):
+    '''The calls of one kind of operation'''
+    def __init__(self):
+        self.count = 0
+        self.nerrors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.nbytes = 0
+        self.buckets = {}
+        self._lock = threading.Lock()
+    def add(self, elapsed_ns, nbytes=0, failed=False):
+        bucket = int(math.log2(elapsed_ns) * _BUCKETS_PER_OCTAVE) if elapsed_ns > 0 else 0
+        with self._lock:
+            self.count += 1
+            self.nerrors += failed
+            self.total_ns += elapsed_ns
+            self.nbytes += nbytes
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+    def percentile_ns(self, percentile):
+        '''Return (the upper bound of the bucket holding) the percentile latency'''
+        wanted = self.count * percentile / 100.0
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= wanted:
+                return min(int(2 ** ((bucket + 1) / _BUCKETS_PER_OCTAVE)), self.max_ns)
+        return self.max_ns
+    def as_dict(self):
+        result = {"count": self.count, "errors": self.nerrors, "total_s": self.total_ns / 1e9, "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0, "max_us": self.max_ns / 1e3}
+        result.update(("p{0}_us".format(percentile), self.percentile_ns(percentile) / 1e3) for percentile in PERCENTILES)
+        if self.nbytes:
+            result["bytes"] = self.nbytes
+            result["mb_per_s"] = self.nbytes / (1 << 20) / (self.total_ns / 1e9) if self.total_ns else 0.0
+        return result
+
+def _byte_count(name, result):
+    if name in ("write", "pwrite", "readinto"):
+        return result
+    if name in ("read", "pread"):
+        return len(result)
+    return 0
+
+def _wrap(function, stats, name=None):
+    perf_counter_ns = time.perf_counter_ns
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            stats.add(perf_counter_ns() - start, failed=True)
+            raise
+        stats.add(perf_counter_ns() - start, _byte_count(name, result) if name else 0)
+        return result
+    wrapper.__wrapped__ = function
+    return wrapper
+
+class _TimedFile(object):
+    '''A file object (from open()) whose reads, writes and close are recorded in timings'''
+    def __init__(self, fobj, timings):
+        self._fobj = fobj
+        for name in ("read", "readinto", "write"):
+            if hasattr(fobj, name):
+                setattr(self, name, _wrap(getattr(fobj, name), timings.ops["write" if name == "write" else "read"], name))
+        self.close = _wrap(fobj.close, timings.ops["close"])
+    def __getattr__(self, name):
+        return getattr(self._fobj, name)
+    def __iter__(self):
+        return iter(self._fobj)
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.close()
+        return False
+
+class Timings(object):
+    '''The statistics (by operation or phase) of an instrumented run'''
+    def __init__(self):
+        self.ops = {op: OpStats() for op in OPERATIONS}
+        self.phases = {phase: OpStats() for phase in PHASES}
+        self.elapsed = 0.0
+    def make_os(self):
+        '''Return a stand in for the os module with its I/O functions wrapped'''
+        proxy = types.SimpleNamespace(**vars(os))
+        for op, names in OPERATIONS.items():
+            for name in names:
+                if hasattr(os, name):
+                    setattr(proxy, name, _wrap(getattr(os, name), self.ops[op], name))
+        proxy.path = types.SimpleNamespace(**vars(os.path))
+        for op, names in PATH_OPERATIONS.items():
+            for name in names:
+                setattr(proxy.path, name, _wrap(getattr(os.path, name), self.ops[op]))
+        return proxy
+    def make_open(self):
+        '''Return a stand in for open() whose file objects are instrumented'''
+        timed_open = _wrap(open, self.ops["open"])
+        def instrumented_open(*args, **kwargs):
+            return _TimedFile(timed_open(*args, **kwargs), self)
+        return instrumented_open
+    def as_dict(self):
+        return {
+            "elapsed_s": self.elapsed,
+            "operations": {op: stats.as_dict() for op, stats in self.ops.items() if stats.count},
+            "phases": {phase: stats.as_dict() for phase, stats in self.phases.items() if stats.count},
+        }
+    def format(self):
+        '''Return the timings as a human readable table'''
+        lines = [_("Elapsed: {0:.3f} seconds").format(self.elapsed)]
+        lines.append("{0:<10} {1:>9} {2:>6} {3:>10} {4:>10} {5:>10} {6:>10} {7:>10} {8:>11}".format(_("operation"), _("count"), _("errors"), _("total(s)"), _("mean(us)"), _("p50(us)"), _("p99(us)"), _("max(us)"), _("MB/s")))
+        for name, stats in list(self.ops.items()) + list(self.phases.items()):
+            if not stats.count:
+                continue
+            data = stats.as_dict()
+            rate = "{0:11.1f}".format(data["mb_per_s"]) if "mb_per_s" in data else "{0:>11}".format("-")
+            lines.append("{0:<10} {1:>9} {2:>6} {3:>10.3f} {4:>10.1f} {5:>10.1f} {6:>10.1f} {7:>10.1f} {8}".format(name, data["count"], data["errors"], data["total_s"], data["mean_us"], data["p50_us"], data["p99_us"], data["max_us"], rate))
+        return "\n".join(lines) + "\n"
+
+@contextlib.contextmanager
+def instrumented(timings):
+    '''Record the I/O (and phases) of the enclosed code in timings'''
+    modules = [importlib.import_module("." + name, __package__) for name in MODULES]
+    proxy = timings.make_os()
+    proxy_open = timings.make_open()
+    saved_os = [(module, module.os) for module in modules]
+    saved_phases = []
+    for phase, (module_name, function_name) in PHASES.items():
+        module = importlib.import_module("." + module_name, __package__)
+        function = getattr(module, function_name)
+        saved_phases.append((module, function_name, function))
+        setattr(module, function_name, _wrap(function, timings.phases[phase]))
+    for module in modules:
+        module.os = proxy
+        # shadows the builtin open() (and nothing else as none of them has its own)
+        module.open = proxy_open
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.elapsed = time.perf_counter() - start
+        for module, real_os in saved_os:
+            module.os = real_os
+            del module.open
+        for module, function_name, function in saved_phases:
+            setattr(module, function_name, function)
+
+def _write_report(text, output):
+    if output:
+        with open(output, "w") as fobj:
+            fobj.write(text)
+    else:
+        sys.stderr.write(text)
+
+def run_instrumented(function, args, timings=None, profile=None, output=None):
+    '''Return function(args) run with the requested instrumentation:
+    timings ("human" or "json") written to output (default: stderr) and
+    cProfile statistics dumped to the file profile ("-" for a summary
+    on stderr).
+    '''
+    with contextlib.ExitStack() as stack:
+        if timings:
+            stats = stack.enter_context(instrumented(Timings()))
+        if profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            result = profiler.runcall(function, args)
+        else:
+            result = function(args)
+    if profile == "-":
+        import pstats
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+    elif profile:
+        profiler.dump_stats(profile)
+    if timings:
+        text = json.dumps(stats.as_dict(), indent=2, sort_keys=True) + "\n" if timings == "json" else stats.format()
+        _write_report(text, output)
+    return result
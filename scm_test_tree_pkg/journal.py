@@ -0,0 +1,114 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''A journal of modification rounds from which they can be undone.
+
+Modifications only ever append to files so each round is recorded as
+the size of each file it modified before it did so: truncating the
+files back to those sizes undoes it.  Each round has its own file in
+JOURNAL_DIR (named for its modification number) holding NUL terminated
+"size<TAB>path" records.  Rounds that change files in other ways (mutate,
+churn) are marked as irreversible instead.
+
+Only trees that have a JOURNAL_DIR (made by init_test_tree()) are
+journaled.
+'''
+
+import os
+
+JOURNAL_DIR = ".scmtt_journal"
+
+# records are written to the journal file when this many bytes have accumulated
+FLUSH_SIZE = 64 * 1024
+
+_JOURNAL_FLAGS = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_CLOEXEC", 0)
+
+def journal_path(modno, base_dir_name=""):
+    return os.path.join(base_dir_name, JOURNAL_DIR, str(modno))
+
+def irreversible_path(modno, base_dir_name=""):
+    return journal_path(modno, base_dir_name) + ".irreversible"
+
+def is_journaled(base_dir_name=""):
+    return os.path.isdir(os.path.join(base_dir_name, JOURNAL_DIR))
+
+class Journal(object):
+    '''Record the pre-modification sizes of the files modified in
+    modification round modno (paths relative to the tree's base).
+    '''
+    def __init__(self, modno, base_dir_name=""):
+        self.modno = modno
+        self.path = journal_path(modno, base_dir_name)
+        self._records = []
+        self._nbytes = 0
+    def record(self, filepath, size):
+        record = b"%d\t%s\0" % (size, os.fsencode(filepath))
+        self._records.append(record)
+        self._nbytes += len(record)
+        if self._nbytes >= FLUSH_SIZE:
+            self.flush()
+    def flush(self):
+        if not self._records:
+            return
+        data = b"".join(self._records)
+        self._records = []
+        self._nbytes = 0
+        fd = os.open(self.path, _JOURNAL_FLAGS, 0o666)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+    def __enter__(self):
+        return self
+    def __exit__(self, *_exc_info):
+        self.flush()
+
+def open_journal(modno, base_dir_name=""):
+    '''Return a Journal for round modno (or None if the tree isn't journaled)'''
+    return Journal(modno, base_dir_name) if is_journaled(base_dir_name) else None
+
+def mark_irreversible(modno, base_dir_name=""):
+    '''Record that round modno can't be undone by revert'''
+    if is_journaled(base_dir_name):
+        open(irreversible_path(modno, base_dir_name), "w").close()
+
+def read_journal(modno, base_dir_name=""):
+    '''Generate (path, size) for each file recorded in round modno's journal'''
+    try:
+        with open(journal_path(modno, base_dir_name), "rb") as fobj:
+            data = fobj.read()
+    except FileNotFoundError:
+        return # nothing was modified in this round
+    for record in data.split(b"\0")[:-1]:
+        size, path = record.split(b"\t", 1)
+        yield (os.fsdecode(path), int(size))
+
+def remove_rounds(modnos, base_dir_name=""):
+    '''Forget the journals of the rounds in modnos'''
+    for modno in modnos:
+        for path in (journal_path(modno, base_dir_name), irreversible_path(modno, base_dir_name)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+def start_journal(base_dir_name=""):
+    '''Start an empty journal for a newly (re)created tree at base_dir_name'''
+    dir_path = os.path.join(base_dir_name, JOURNAL_DIR)
+    if os.path.isdir(dir_path):
+        for name in os.listdir(dir_path):
+            os.unlink(os.path.join(dir_path, name))
+    else:
+        os.mkdir(dir_path)
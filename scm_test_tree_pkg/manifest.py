@@ -0,0 +1,230 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Record (and incrementally refresh) the expected content of a test tree'''
+
+import os
+import sys
+import time
+import hashlib
+import collections
+import concurrent.futures
+
+from . import cmd_ifce
+
+MANIFEST_FILE = cmd_ifce.MANIFEST_FILE
+_HEADER = "# scm_test_tree manifest 1 {0}\n"
+
+HASH_CHUNK_SIZE = 1 << 20
+
+Entry = collections.namedtuple("Entry", ["digest", "size", "mtime_ns", "mode"])
+
+def hash_file(filepath):
+    '''Return the hex digest of the content of the file at filepath'''
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as fobj:
+        for chunk in iter(lambda: fobj.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _escape(path):
+    return path.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _unescape(text):
+    return text.replace("\\n", "\n").replace("\\\\", "\\") if "\\" in text else text
+
+def read_manifest(manifest_path):
+    '''Return (written_ns, {path: Entry}) for the manifest at manifest_path'''
+    entries = {}
+    with open(manifest_path, "r", encoding="utf-8", errors="surrogateescape") as fobj:
+        header = fobj.readline()
+        if not header.startswith(_HEADER[:_HEADER.index("{")]):
+            raise ValueError(_("{0}: is not a valid manifest.").format(manifest_path))
+        try:
+            written_ns = int(header.split()[-1])
+        except ValueError:
+            raise ValueError(_("{0}: is not a valid manifest.").format(manifest_path))
+        try:
+            for line in fobj:
+                digest, size, mtime_ns, mode, path = line.rstrip("\n").split(" ", 4)
+                entries[_unescape(path)] = Entry(digest, int(size), int(mtime_ns), int(mode, 8))
+        except ValueError:
+            raise ValueError(_("{0}: is not a valid manifest.").format(manifest_path))
+    return (written_ns, entries)
+
+def write_manifest(manifest_path, entries, written_ns):
+    '''Write entries ({path: Entry}) to manifest_path (atomically)'''
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", errors="surrogateescape") as fobj:
+        fobj.write(_HEADER.format(written_ns))
+        for path in sorted(entries):
+            entry = entries[path]
+            fobj.write("{0} {1} {2} {3:o} {4}\n".format(entry.digest, entry.size, entry.mtime_ns, entry.mode, _escape(path)))
+    os.replace(tmp_path, manifest_path)
+
+def stat_matches(entry, stat_data):
+    return entry.size == stat_data.st_size and entry.mtime_ns == stat_data.st_mtime_ns and entry.mode == stat_data.st_mode
+
+def scan_tree(old_entries=None, written_ns=0, report_emsg=None):
+    '''Return ({path: Entry}, number rehashed) for the test tree in the
+    current directory.
+
+    Files whose size, mtime and mode match their entry in old_entries
+    keep their recorded digest unless they were modified too close to
+    written_ns (when the manifest was written) for mtime to be trusted.
+    '''
+    if report_emsg is None:
+        report_emsg = sys.stderr.write
+    old_entries = old_entries or {}
+    entries = {}
+    nrehashed = 0
+    for filepath in cmd_ifce.iter_test_tree_files():
+        try:
+            stat_data = os.lstat(filepath)
+            old_entry = old_entries.get(filepath)
+            if old_entry is not None and stat_matches(old_entry, stat_data) and stat_data.st_mtime_ns < written_ns:
+                digest = old_entry.digest
+            else:
+                digest = hash_file(filepath)
+                nrehashed += 1
+        except OSError as edata:
+            report_emsg("{0}: {1}\n".format(filepath, edata.strerror))
+            continue
+        entries[filepath] = Entry(digest, stat_data.st_size, stat_data.st_mtime_ns, stat_data.st_mode)
+    return (entries, nrehashed)
+
+def update_manifest(manifest_path=MANIFEST_FILE, full=False, gui_calling=False):
+    '''Execute the "manifest" sub command using the supplied args'''
+    if gui_calling:
+        from .bab import CmdResult
+    if not os.path.isfile(cmd_ifce.COUNT_FILE):
+        emsg = _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
+        return CmdResult.error(stderr=emsg) if gui_calling else emsg
+    old_entries, written_ns = (None, 0)
+    if not full and os.path.exists(manifest_path):
+        try:
+            written_ns, old_entries = read_manifest(manifest_path)
+        except (IOError, ValueError):
+            old_entries, written_ns = (None, 0)
+    emsgs = []
+    start_ns = time.time_ns()
+    entries, nrehashed = scan_tree(old_entries, written_ns, emsgs.append if gui_calling else sys.stderr.write)
+    try:
+        write_manifest(manifest_path, entries, start_ns)
+    except (IOError, OSError) as edata:
+        emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
+        return CmdResult.error(stderr="".join(emsgs) + emsg) if gui_calling else emsg
+    if gui_calling:
+        return CmdResult.warning(stderr="".join(emsgs)) if emsgs else CmdResult.ok()
+    sys.stdout.write(_("{0}: {1} file(s), {2} (re)hashed.\n").format(manifest_path, len(entries), nrehashed))
+    return 0
+
+# Files are handed to the hashing workers in batches of this many
+VERIFY_BATCH_SIZE = 256
+
+class _Mismatch(Exception):
+    pass
+
+def _hash_files(filepaths):
+    digests = []
+    for filepath in filepaths:
+        try:
+            digests.append(hash_file(filepath))
+        except (IOError, OSError):
+            digests.append(None)
+    return (filepaths, digests)
+
+def verify_tree(manifest_path=MANIFEST_FILE, jobs=1, fast=False, fail_fast=False, report=None):
+    '''Compare the test tree in the current directory with the manifest
+    at manifest_path and return a list of (kind, path) mismatches where
+    kind is one of "missing", "extra" or "changed".
+
+    Files whose size and mode match are hashed (in batches spread over
+    a pool of jobs processes) unless fast in which case they are assumed
+    to be unchanged.  If fail_fast, stop at the first mismatch.
+    '''
+    if report is None:
+        report = sys.stdout.write
+    written_ns, remaining = read_manifest(manifest_path)
+    mismatches = []
+    def note(kind, filepath):
+        mismatches.append((kind, filepath))
+        report("{0}: {1}\n".format(kind, filepath))
+        if fail_fast:
+            raise _Mismatch
+    def check_digests(result):
+        filepaths, digests = result
+        for filepath, digest in zip(filepaths, digests):
+            if digest != expected_digests.pop(filepath):
+                note("changed", filepath)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    pending = collections.deque()
+    expected_digests = {}
+    batch = []
+    def dispatch():
+        if executor is None:
+            check_digests(_hash_files(batch))
+        else:
+            pending.append(executor.submit(_hash_files, list(batch)))
+        del batch[:]
+        while pending and pending[0].done():
+            check_digests(pending.popleft().result())
+    try:
+        for filepath in cmd_ifce.iter_test_tree_files():
+            entry = remaining.pop(filepath, None)
+            if entry is None:
+                note("extra", filepath)
+                continue
+            try:
+                stat_data = os.lstat(filepath)
+            except OSError:
+                note("missing", filepath)
+                continue
+            if stat_data.st_size != entry.size or stat_data.st_mode != entry.mode:
+                note("changed", filepath)
+            elif not fast:
+                expected_digests[filepath] = entry.digest
+                batch.append(filepath)
+                if len(batch) >= VERIFY_BATCH_SIZE:
+                    dispatch()
+        if batch:
+            dispatch()
+        for filepath in sorted(remaining):
+            note("missing", filepath)
+        while pending:
+            check_digests(pending.popleft().result())
+    except _Mismatch:
+        pass
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return mismatches
+
+def verify_cmd(manifest_path=MANIFEST_FILE, jobs=1, fast=False, fail_fast=False, gui_calling=False):
+    '''Execute the "verify" sub command using the supplied args'''
+    if gui_calling:
+        from .bab import CmdResult
+    output = []
+    try:
+        mismatches = verify_tree(manifest_path, jobs=jobs, fast=fast, fail_fast=fail_fast, report=output.append if gui_calling else sys.stdout.write)
+    except (IOError, OSError) as edata:
+        emsg = "{0}: {1}\n".format(edata.filename, edata.strerror)
+        return CmdResult.error(stderr=emsg) if gui_calling else emsg
+    except ValueError as edata:
+        emsg = "{0}\n".format(edata)
+        return CmdResult.error(stderr=emsg) if gui_calling else emsg
+    if gui_calling:
+        return CmdResult.error(stdout="".join(output)) if mismatches else CmdResult.ok()
+    return 1 if mismatches else 0
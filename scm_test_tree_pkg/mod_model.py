@@ -0,0 +1,101 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''An in memory model of a test tree (as made by create_test_tree())
+and the modification rounds (as made by modify_files()) applied to it.
+
+Nothing is written to disk.  Files' original contents are generated
+from the tree's shape when they are wanted and only the lines appended
+by modifications are held in memory.
+'''
+
+import os
+import datetime
+
+from . import cmd_ifce
+
+def round_time(start, modno, interval=1):
+    '''Return the (UTC) datetime at which round modno is deemed to have
+    been made (start being the epoch time of round 0).
+    '''
+    return datetime.datetime.fromtimestamp(start + modno * interval, datetime.timezone.utc)
+
+class TreeModel(object):
+    '''The files of a tree of the given shape and their modifications'''
+    def __init__(self, shape):
+        self.shape = shape
+        self.paths = []
+        self._kinds = []
+        for dir_path, level in shape.walk():
+            for fname, kind in shape.iter_file_specs(dir_path, level):
+                self.paths.append(os.path.join(dir_path, fname))
+                self._kinds.append(kind)
+        self._indices = {path: index for index, path in enumerate(self.paths)}
+        # modify_rounds() chooses from the sorted paths (not walk() order)
+        self._sorted_paths = sorted(self.paths)
+        # the lines appended to each modified file (by index)
+        self._tails = {}
+        self.modno = 0
+    def __len__(self):
+        return len(self.paths)
+    def kind(self, path):
+        return self._kinds[self._indices[path]]
+    def initial_content(self, path):
+        return self.shape.file_content(path, self._kinds[self._indices[path]])
+    def appended(self, path):
+        '''Return the bytes appended to the file at path by modifications'''
+        return bytes(self._tails.get(self._indices[path], b""))
+    def content(self, path):
+        '''Return the current content of the file at path'''
+        return self.initial_content(path) + self.appended(path)
+    def iter_initial_files(self):
+        '''Generate (path, content) for each file in the new tree (the
+        tree's own files, being ignored, aren't included).
+        '''
+        for path in self.paths:
+            yield (path, self.initial_content(path))
+    def round_files(self, modno, files_per_round=0, seed=0):
+        '''Return the paths of the files modify_rounds() would choose for
+        round modno (of a tree of this shape with the same seed).
+        '''
+        if not files_per_round:
+            return self.paths
+        return cmd_ifce.choose_round_files(self._sorted_paths, files_per_round, seed, modno)
+    def modification_lines(self, paths, modno, add_tws=False, no_newline=False, when=None):
+        '''Return {path: bytes to be appended} for modification modno of
+        the files at paths (without applying it).
+        '''
+        prefix, suffix = cmd_ifce.modification_template(modno, add_tws, no_newline, when)
+        return {path: prefix + os.fsencode(path) + suffix for path in paths}
+    def modify(self, paths, modno=None, add_tws=False, no_newline=False, when=None):
+        '''Apply modification round modno (default: the next) to the
+        files at paths and return (modno, {path: bytes appended}).
+        '''
+        modno = self.modno + 1 if modno is None else modno
+        added = self.modification_lines(paths, modno, add_tws, no_newline, when)
+        for path, line in added.items():
+            self._tails.setdefault(self._indices[path], bytearray()).extend(line)
+        self.modno = max(self.modno, modno)
+        return (modno, added)
+    def iter_rounds(self, rounds, files_per_round=0, seed=0, add_tws=False, no_newline=False, start=0, interval=1):
+        '''Apply rounds modification rounds (to the files modify_rounds()
+        would choose but with the times given by round_time() rather than
+        the time of day) generating (modno, when, {path: bytes appended})
+        for each.
+        '''
+        for modno in range(self.modno + 1, self.modno + rounds + 1):
+            when = round_time(start, modno, interval)
+            _modno, added = self.modify(self.round_files(modno, files_per_round, seed), modno, add_tws, no_newline, when)
+            yield (modno, when, added)
@@ -0,0 +1,195 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Repeatable in place mutation (insert/delete/replace) of test files'''
+
+import os
+import sys
+import mmap
+import random
+
+from . import cmd_ifce
+from . import tree_builder
+from . import journal
+from . import constants
+
+OPERATIONS = constants.MUTATE_OPERATIONS
+MODES = constants.MUTATE_MODES
+
+# Files at least this big are edited through mmap() rather than in memory
+MMAP_THRESHOLD = 1 << 20
+
+class _BufferEditor(object):
+    '''Edit a (small) file's content in memory and write it back when closed'''
+    def __init__(self, fd, size):
+        self._fd = fd
+        self._buf = bytearray()
+        while len(self._buf) < size:
+            chunk = os.read(fd, size - len(self._buf))
+            if not chunk:
+                break
+            self._buf += chunk
+        self._dirty = False
+    @property
+    def size(self):
+        return len(self._buf)
+    def find(self, sub, start):
+        return self._buf.find(sub, start)
+    def rfind(self, sub, start, end):
+        return self._buf.rfind(sub, start, end)
+    def insert(self, offset, data):
+        self._buf[offset:offset] = data
+        self._dirty = True
+    def delete(self, offset, length):
+        del self._buf[offset:offset + length]
+        self._dirty = True
+    def replace(self, offset, length, data):
+        self._buf[offset:offset + length] = data
+        self._dirty = True
+    def close(self):
+        if self._dirty:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            view = memoryview(self._buf)
+            while view:
+                view = view[os.write(self._fd, view):]
+            os.ftruncate(self._fd, len(self._buf))
+
+class _MappedEditor(object):
+    '''Edit a (large) file in place through a shared memory map.
+
+    Insertions and deletions shift the tail of the file within the map
+    so the file is never read into (or written from) process memory.
+    An emptied file has no map (a zero length map is not allowed).
+    '''
+    def __init__(self, fd, size):
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+    @property
+    def size(self):
+        return 0 if self._map is None else len(self._map)
+    def find(self, sub, start):
+        return -1 if self._map is None else self._map.find(sub, start)
+    def rfind(self, sub, start, end):
+        return -1 if self._map is None else self._map.rfind(sub, start, end)
+    def _resize(self, new_size):
+        # this also resizes the underlying file
+        if new_size == 0:
+            self._map.close()
+            self._map = None
+            os.ftruncate(self._fd, 0)
+        elif self._map is None:
+            os.ftruncate(self._fd, new_size)
+            self._map = mmap.mmap(self._fd, new_size)
+        else:
+            self._map.resize(new_size)
+    def insert(self, offset, data):
+        old_size = self.size
+        self._resize(old_size + len(data))
+        self._map.move(offset + len(data), offset, old_size - offset)
+        self._map[offset:offset + len(data)] = data
+    def delete(self, offset, length):
+        length = min(length, self.size - offset)
+        if length <= 0:
+            return
+        if length < self.size:
+            self._map.move(offset, offset + length, self.size - offset - length)
+        self._resize(self.size - length)
+    def replace(self, offset, length, data):
+        length = min(length, self.size - offset)
+        if length == len(data):
+            self._map[offset:offset + length] = data
+        elif length > len(data):
+            self._map[offset:offset + len(data)] = data
+            self.delete(offset + len(data), length - len(data))
+        else:
+            self._map[offset:offset + length] = data[:length]
+            self.insert(offset + length, data[length:])
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+
+def _open_editor(fd):
+    size = os.fstat(fd).st_size
+    return _MappedEditor(fd, size) if size >= MMAP_THRESHOLD else _BufferEditor(fd, size)
+
+def _random_bytes(rng, length):
+    return rng.getrandbits(8 * length).to_bytes(length, "little") if length else b""
+
+def _line_span(editor, offset):
+    '''Return (start, length) of the line containing offset'''
+    start = editor.rfind(b"\n", 0, offset) + 1
+    end = editor.find(b"\n", offset)
+    end = editor.size if end == -1 else end + 1
+    return (start, end - start)
+
+def mutate_file(filepath, modno, nops=1, operations=OPERATIONS, mode="lines", max_bytes=64, seed=0):
+    '''Apply nops operations (chosen repeatably from seed, modno and
+    filepath) to the file at filepath.
+    '''
+    rng = random.Random("{0}:{1}:{2}".format(seed, modno, filepath))
+    fd = tree_builder.open_unshared(filepath, os.O_RDWR)
+    try:
+        editor = _open_editor(fd)
+        try:
+            for opno in range(1, nops + 1):
+                operation = rng.choice(operations)
+                offset = rng.randint(0, editor.size)
+                if mode == "lines":
+                    data = 'Path: "{0}" mutation #{1}.{2}\n'.format(filepath, modno, opno).encode()
+                    if offset == editor.size and (editor.size == 0 or editor.rfind(b"\n", 0, offset) == offset - 1):
+                        start, length = (offset, 0)
+                    else:
+                        start, length = _line_span(editor, offset)
+                else:
+                    data = _random_bytes(rng, rng.randint(1, max_bytes))
+                    start, length = (offset, min(rng.randint(1, max_bytes), editor.size - offset))
+                if operation == "insert" or length == 0:
+                    editor.insert(start, data)
+                elif operation == "delete":
+                    editor.delete(start, length)
+                else:
+                    editor.replace(start, length, data)
+        finally:
+            editor.close()
+    finally:
+        os.close(fd)
+
+def mutate_files(filepath_list, nops=1, operations=OPERATIONS, mode="lines", max_bytes=64, seed=0, gui_calling=False, modno=None):
+    '''Execute the "mutate" sub command using the supplied args'''
+    if gui_calling:
+        from .bab import CmdResult
+    try:
+        if modno is None:
+            modno = cmd_ifce.reserve_modnos()
+    except (IOError, ValueError):
+        emsg = _('{0}: is NOT a valid test directory. Aborting.\n').format(os.getcwd())
+        return CmdResult.error(stderr=emsg) if gui_calling else emsg
+    journal.mark_irreversible(modno)
+    check_paths = bool(filepath_list)
+    if not check_paths:
+        filepath_list = cmd_ifce.iter_test_tree_files()
+    emsgs = []
+    report_emsg = emsgs.append if gui_calling else sys.stderr.write
+    for filepath in filepath_list:
+        if check_paths and not cmd_ifce.check_filepath(filepath, report_emsg):
+            continue
+        try:
+            mutate_file(filepath, modno, nops=nops, operations=operations, mode=mode, max_bytes=max_bytes, seed=seed)
+        except (OSError, ValueError) as edata:
+            report_emsg("{0}: {1}\n".format(filepath, getattr(edata, "strerror", None) or edata))
+    if gui_calling:
+        return CmdResult.warning(stderr="".join(emsgs)) if emsgs else CmdResult.ok()
+    return 0
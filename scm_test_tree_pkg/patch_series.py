@@ -0,0 +1,156 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Generate series of (unified diff) patches to a test tree for testing
+patch managers without making (or diffing) a working tree.
+
+Each patch is a modification round (see mod_model) of a selection of
+the tree's (non binary) files.  The series is one of:
+
+    stacked:     each patch applies on top of those before it
+    overlapping: as stacked but each patch also modifies (a fraction
+                 of) the files modified by the patch before it
+    conflicting: as overlapping but every patch is made against the
+                 original tree so that, applied in order, each one
+                 conflicts with the one before it
+
+Patches are written one at a time as they are generated either as an
+mbox (as "git format-patch --stdout" would, for "git am") or as a quilt
+style directory of patch files and a series file.
+'''
+
+import os
+import sys
+import time
+import random
+import email.utils
+
+from . import mod_model
+from . import constants
+
+MODES = constants.PATCH_MODES
+CONTEXT_LINES = 3
+DEFAULT_AUTHOR = "scm_test_tree <scm_test_tree@example.com>"
+
+_NO_NEWLINE = b"\\ No newline at end of file\n"
+_MBOX_FROM = b"From 0000000000000000000000000000000000000000 Mon Sep 17 00:00:00 2001\n"
+
+def _split_lines(data):
+    lines = [line + b"\n" for line in data.split(b"\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+def _diff_lines(tag, lines):
+    for line in lines:
+        yield tag + line
+        if not line.endswith(b"\n"):
+            yield b"\n" + _NO_NEWLINE
+
+def append_diff(path, old, added, context=CONTEXT_LINES):
+    '''Return the (git style) unified diff of appending added to the
+    file at path whose content is old.
+    '''
+    lines = _split_lines(old)
+    if lines and not lines[-1].endswith(b"\n"):
+        # the last line is incomplete so the append changes it
+        removed = [lines.pop()]
+        inserted = _split_lines(removed[0] + added)
+    else:
+        removed = []
+        inserted = _split_lines(added)
+    before = lines[len(lines) - context:] if context else []
+    start = len(lines) - len(before) + 1
+    old_count = len(before) + len(removed)
+    new_count = len(before) + len(inserted)
+    bpath = os.fsencode(path)
+    header = b"diff --git a/%s b/%s\n--- a/%s\n+++ b/%s\n" % (bpath, bpath, bpath, bpath)
+    hunk = b"@@ -%d,%d +%d,%d @@\n" % (start if old_count else start - 1, old_count, start if new_count else start - 1, new_count)
+    return b"".join([header, hunk] + list(_diff_lines(b" ", before)) + list(_diff_lines(b"-", removed)) + list(_diff_lines(b"+", inserted)))
+
+def _choose_files(candidates, previous, files_per_patch, overlap, seed, modno):
+    rng = random.Random("{0}:{1}".format(seed, modno))
+    nwanted = min(files_per_patch, len(candidates))
+    chosen = rng.sample(previous, min(int(round(nwanted * overlap)), len(previous))) if previous else []
+    chosen_set = set(chosen)
+    while len(chosen) < nwanted:
+        path = candidates[rng.randrange(len(candidates))]
+        if path not in chosen_set:
+            chosen.append(path)
+            chosen_set.add(path)
+    return sorted(chosen)
+
+def iter_patches(model, npatches, files_per_patch=1, mode="stacked", overlap=0.5, seed=0, add_tws=False, no_newline=False, start=0, interval=1):
+    '''Generate (modno, when, paths, diff) for each patch of the series'''
+    candidates = sorted(path for path in model.paths if model.kind(path) != "binary")
+    previous = []
+    for modno in range(model.modno + 1, model.modno + npatches + 1):
+        when = mod_model.round_time(start, modno, interval)
+        paths = _choose_files(candidates, previous if mode != "stacked" else [], files_per_patch, overlap, seed, modno) if candidates else []
+        added = model.modification_lines(paths, modno, add_tws, no_newline, when)
+        diff = b"".join(append_diff(path, model.content(path), added[path]) for path in paths)
+        if mode != "conflicting":
+            model.modify(paths, modno, add_tws, no_newline, when)
+        previous = paths
+        yield (modno, when, paths, diff)
+
+def _subject(modno, paths):
+    return "Modification #{0}: {1} file(s)".format(modno, len(paths))
+
+def write_mbox(out, patches, npatches, author=DEFAULT_AUTHOR):
+    '''Write patches (see iter_patches()) to out (a binary file) as an
+    mbox and return the number written.
+    '''
+    count = 0
+    for count, (modno, when, paths, diff) in enumerate(patches, 1):
+        out.write(_MBOX_FROM)
+        out.write("From: {0}\nDate: {1}\nSubject: [PATCH {2}/{3}] {4}\n\n---\n".format(author, email.utils.format_datetime(when), count, npatches, _subject(modno, paths)).encode())
+        out.write(diff)
+        out.write(b"-- \nscm_test_tree\n\n")
+    return count
+
+def write_quilt(patch_dir, patches, author=DEFAULT_AUTHOR):
+    '''Write patches (see iter_patches()) into patch_dir (created if
+    necessary) as a quilt series and return the number written.
+    '''
+    os.makedirs(patch_dir, exist_ok=True)
+    count = 0
+    with open(os.path.join(patch_dir, "series"), "w") as series:
+        for count, (modno, when, paths, diff) in enumerate(patches, 1):
+            name = "{0:04}-modification-{1}.patch".format(count, modno)
+            with open(os.path.join(patch_dir, name), "wb") as fobj:
+                fobj.write("{0}\n\nAuthor: {1}\nDate: {2}\n\n".format(_subject(modno, paths), author, email.utils.format_datetime(when)).encode())
+                fobj.write(diff)
+            series.write(name + "\n")
+    return count
+
+def patches_cmd(shape, npatches, files_per_patch=1, mode="stacked", overlap=0.5, seed=0, add_tws=False, no_newline=False, author=DEFAULT_AUTHOR, start=None, interval=1, output=None, patch_dir=None):
+    '''Execute the "patches" sub command using the supplied args'''
+    started = time.time()
+    start = int(started) - npatches * interval if start is None else start
+    patches = iter_patches(mod_model.TreeModel(shape), npatches, files_per_patch, mode, overlap, seed, add_tws, no_newline, start, interval)
+    try:
+        if patch_dir:
+            count = write_quilt(patch_dir, patches, author)
+        else:
+            with (open(output, "wb") if output else open(sys.stdout.fileno(), "wb", closefd=False)) as out:
+                count = write_mbox(out, patches, npatches, author)
+    except BrokenPipeError:
+        return _("patches: the reader of the patches went away.\n")
+    except OSError as edata:
+        return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    sys.stderr.write(_("patches: {0} {1} patch(es) in {2:.3f} seconds.\n").format(count, mode, time.time() - started))
+    return 0
@@ -0,0 +1,210 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Replay a declarative workload (a JSON file) against a test tree.
+
+A workload looks like:
+
+    {
+        "seed": 1,
+        "steps": [
+            {"op": "create", "shape": {"depth": 2, "fanout": [10]}, "jobs": 4},
+            {"op": "modify", "repeat": 10, "select": {"count": 20}},
+            {"op": "mutate", "select": {"pattern": "*/file*", "fraction": 0.1}, "nops": 3},
+            {"op": "rename", "select": {"count": 5}, "tweak": true},
+            {"op": "move", "select": {"count": 5}, "jobs": 2},
+            {"op": "delete", "select": {"count": 5}},
+            {"op": "grow", "size": "+4K", "select": {"pattern": "*binary*"}},
+            {"op": "manifest"},
+            {"op": "verify"}
+        ]
+    }
+
+Every step may have a "repeat" count, a "select" (of files: "pattern"
+is an fnmatch pattern for paths, "count" or "fraction" pick randomly
+from those matching) and a "seed" (default: derived from the workload
+seed and the step number) from which each repetition's selection and
+(for mutate, rename, move and delete) operation seed are derived.
+Other members are passed to the operation.
+'''
+
+import sys
+import json
+import time
+import random
+import fnmatch
+import inspect
+
+from . import api
+from . import cmd_ifce
+from . import tree_shape
+from . import constants
+
+_PROC_IO = "/proc/self/io"
+
+def read_io_counters():
+    '''Return a dict of the process's I/O counters (empty if unavailable)'''
+    try:
+        with open(_PROC_IO) as fobj:
+            return {key: int(value) for key, value in (line.split(":") for line in fobj)}
+    except (IOError, ValueError):
+        return {}
+
+def _io_delta(before, after):
+    return {key: after[key] - before.get(key, 0) for key in after}
+
+def select_files(select, rng):
+    '''Return the list of files in the test tree (in the current directory) chosen by select'''
+    pattern = select.get("pattern")
+    candidates = [filepath for filepath in cmd_ifce.iter_test_tree_files() if pattern is None or fnmatch.fnmatch(filepath, pattern)]
+    candidates.sort()
+    if "count" in select:
+        return rng.sample(candidates, min(int(select["count"]), len(candidates)))
+    elif "fraction" in select:
+        return rng.sample(candidates, int(len(candidates) * float(select["fraction"])))
+    return candidates
+
+def _run_step(step, filepaths, base_dir, seed):
+    op = step["op"]
+    args = {key: value for key, value in step.items() if key not in ("op", "repeat", "select", "seed")}
+    if op == "create":
+        if "shape" in args:
+            args["shape"] = tree_shape.TreeShape(**args["shape"])
+        return api.create(base_dir, **args)
+    elif op == "modify":
+        return api.modify(base_dir, filepaths, record_outcomes=False, **args)
+    elif op == "mutate":
+        if "operations" in args:
+            args["operations"] = tuple(args["operations"])
+        return api.mutate(base_dir, filepaths, seed=seed, record_outcomes=False, **args)
+    elif op == "grow":
+        size = str(args.pop("size"))
+        args.setdefault("relative", size.startswith("+"))
+        return api.grow(base_dir, tree_shape.parse_size(size.lstrip("+")), filepaths, record_outcomes=False, **args)
+    elif op in constants.CHURN_OPERATIONS:
+        return api.churn(base_dir, op, filepaths, seed=seed, record_outcomes=False, **args)
+    elif op == "manifest":
+        return api.manifest(base_dir, **args)
+    elif op == "verify":
+        return api.verify(base_dir, **args)
+    raise ValueError(_("{0}: unknown workload operation.").format(op))
+
+# the API function run by each operation and the arguments it is given by _run_step()
+_STEP_FUNCTIONS = dict([("create", api.create), ("modify", api.modify), ("mutate", api.mutate), ("grow", api.grow), ("manifest", api.manifest), ("verify", api.verify)] + [(op, api.churn) for op in constants.CHURN_OPERATIONS])
+_SUPPLIED_ARGS = ("base_dir", "op", "filepaths", "seed", "record_outcomes")
+
+def check_workload(workload):
+    '''Raise ValueError if workload (a dict) has a step that can't be run
+    (so that nothing is run rather than the workload failing part way).
+    '''
+    if not isinstance(workload, dict) or not isinstance(workload.get("steps", []), list):
+        raise ValueError(_("a workload is an object with a list of steps."))
+    for stepno, step in enumerate(workload["steps"], 1):
+        if not isinstance(step, dict):
+            raise ValueError(_("step {0}: is not an object.").format(stepno))
+        op = step.get("op")
+        if op not in _STEP_FUNCTIONS:
+            raise ValueError(_("step {0}: {1}: unknown workload operation.").format(stepno, op))
+        parameters = inspect.signature(_STEP_FUNCTIONS[op]).parameters
+        for key in step:
+            if key not in ("op", "repeat", "select", "seed") and (key not in parameters or key in _SUPPLIED_ARGS):
+                raise ValueError(_("step {0}: {1}: unknown argument \"{2}\".").format(stepno, op, key))
+        try:
+            int(step.get("repeat", 1))
+            select = step.get("select", {})
+            if not isinstance(select, dict):
+                raise ValueError(_("select is not an object."))
+            int(select.get("count", 0))
+            float(select.get("fraction", 0))
+            if not isinstance(select.get("pattern", ""), str):
+                raise ValueError(_("select pattern is not a string."))
+            if op == "mutate":
+                for operation in step.get("operations", ()):
+                    if operation not in constants.MUTATE_OPERATIONS:
+                        raise ValueError(_("{0}: unknown mutate operation.").format(operation))
+                if step.get("mode", constants.MUTATE_MODES[0]) not in constants.MUTATE_MODES:
+                    raise ValueError(_("{0}: unknown mutate mode.").format(step["mode"]))
+            elif op == "grow":
+                tree_shape.parse_size(str(step["size"]).lstrip("+"))
+            elif op == "create" and "shape" in step:
+                tree_shape.TreeShape(**step["shape"])
+        except (ValueError, TypeError, KeyError) as edata:
+            raise ValueError(_("step {0}: {1}: {2}").format(stepno, op, edata))
+
+def replay(workload, base_dir=".", report=None, records=None):
+    '''Run the workload (a dict) against the test tree at base_dir and
+    return a list of per step (and repetition) timing records.  If
+    records (a list) is given the records are appended to it (so that
+    those made before any failure are kept).
+    '''
+    if report is None:
+        report = sys.stdout.write
+    check_workload(workload)
+    seed = workload.get("seed", 0)
+    records = [] if records is None else records
+    for stepno, step in enumerate(workload.get("steps", []), 1):
+        for repno in range(1, int(step.get("repeat", 1)) + 1):
+            rng = random.Random("{0}:{1}:{2}".format(step.get("seed", seed), stepno, repno))
+            filepaths = None
+            if "select" in step:
+                with api.in_dir(base_dir):
+                    filepaths = select_files(step["select"], rng)
+                if not filepaths:
+                    report(_("step {0}.{1}: {2}: nothing selected.\n").format(stepno, repno, step["op"]))
+                    continue
+            op_seed = rng.getrandbits(32)
+            io_before = read_io_counters()
+            start = time.perf_counter()
+            result = _run_step(step, filepaths, base_dir, op_seed)
+            elapsed = time.perf_counter() - start
+            record = {
+                "step": stepno,
+                "repetition": repno,
+                "op": step["op"],
+                "elapsed": elapsed,
+                "files": result.count,
+                "errors": len(result.errors),
+                "mismatches": len(result.mismatches),
+                "io": _io_delta(io_before, read_io_counters()),
+            }
+            records.append(record)
+            report(_("step {0}.{1}: {2}: {3} file(s), {4} error(s) in {5:.3f} seconds ({6} write syscalls, {7} bytes written).\n").format(stepno, repno, step["op"], record["files"], record["errors"], elapsed, record["io"].get("syscw", "?"), record["io"].get("wchar", "?")))
+            if record["mismatches"]:
+                report(_("step {0}.{1}: {2}: {3} mismatch(es).\n").format(stepno, repno, step["op"], record["mismatches"]))
+    return records
+
+def replay_cmd(workload_path, base_dir=".", output=None):
+    '''Execute the "replay" sub command using the supplied args'''
+    try:
+        workload = json.load(open(workload_path))
+    except IOError as edata:
+        return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    except ValueError as edata:
+        return "{0}: {1}\n".format(workload_path, edata)
+    records = []
+    emsg = None
+    try:
+        replay(workload, base_dir, records=records)
+    except (ValueError, TypeError, KeyError) as edata:
+        emsg = "{0}: {1}\n".format(workload_path, edata)
+    if output:
+        # (the records of the steps run before any failure)
+        try:
+            open(output, "w").write(json.dumps({"workload": workload_path, "steps": records}, indent=2) + "\n")
+        except IOError as edata:
+            return (emsg or "") + "{0}: {1}\n".format(edata.filename, edata.strerror)
+    if emsg:
+        return emsg
+    return 1 if any(record["errors"] or record["mismatches"] for record in records) else 0
@@ -0,0 +1,131 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Time SCM commands (status, diff, ...) after each round of modifications'''
+
+import sys
+import json
+import time
+import shlex
+import random
+import shutil
+import tempfile
+import subprocess
+import collections
+
+from . import api
+from . import bench
+from . import cmd_ifce
+
+ScmPreset = collections.namedtuple("ScmPreset", ["setup", "commands"])
+
+PRESETS = collections.OrderedDict([
+    ("git", ScmPreset(
+        setup=["git init -q", "git add -A", "git -c user.name=scmtt -c user.email=scmtt@localhost commit -q -m initial"],
+        commands=["git status --porcelain", "git diff --stat"],
+    )),
+    ("hg", ScmPreset(
+        setup=["hg init", "hg addremove -q", "hg commit -q -u scmtt -m initial"],
+        commands=["hg status", "hg diff --stat"],
+    )),
+])
+
+def run_command(command, cwd):
+    '''Run command (a string) in cwd and return (seconds, output bytes, return code)'''
+    start = time.perf_counter()
+    process = subprocess.run(shlex.split(command), cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return (time.perf_counter() - start, len(process.stdout), process.returncode)
+
+def measure(base_dir, size, scm, setup, commands, churn, rounds, seed=0, report=None):
+    '''Build a tree of the given size in base_dir, put it under the SCM's
+    control (with setup) and then, after each of rounds rounds of
+    modifying churn files, time each of commands.  Return a list of
+    per (command) result dicts.
+    '''
+    if report is None:
+        report = sys.stderr.write
+    depth, fanout, files = size
+    result = api.create(base_dir, api.TreeShape(depth=depth, fanout=(fanout, ), files=files))
+    if result.errors:
+        raise OSError("".join(result.errors))
+    for command in setup:
+        _seconds, _nbytes, returncode = run_command(command, base_dir)
+        if returncode:
+            raise OSError(_("{0}: failed with status {1}.").format(command, returncode))
+    with api.in_dir(base_dir):
+        filepaths = sorted(cmd_ifce.iter_test_tree_files())
+    samples = {command: ([], [], []) for command in commands}
+    for roundno in range(1, rounds + 1):
+        rng = random.Random("{0}:{1}".format(seed, roundno))
+        api.modify(base_dir, rng.sample(filepaths, min(churn, len(filepaths))), record_outcomes=False)
+        for command in commands:
+            seconds, nbytes, returncode = run_command(command, base_dir)
+            latencies, output_sizes, failures = samples[command]
+            latencies.append(seconds)
+            output_sizes.append(nbytes)
+            if returncode:
+                failures.append(roundno)
+    results = []
+    for command in commands:
+        latencies, output_sizes, failures = samples[command]
+        results.append({
+            "scm": scm,
+            "size": "{0}:{1}:{2}".format(*size),
+            "files": len(filepaths),
+            "churn": churn,
+            "rounds": rounds,
+            "command": command,
+            "latency_sec": dict(bench.percentiles(latencies), max=max(latencies), mean=sum(latencies) / len(latencies)),
+            "latencies": latencies,
+            "output_bytes": output_sizes,
+            "failed_rounds": failures,
+        })
+        report(_("{0} {1} ({2} files, churn {3}): p50 {4:.4f}s max {5:.4f}s, {6} bytes output (last round)\n").format(command, results[-1]["size"], len(filepaths), churn, results[-1]["latency_sec"]["p50"], results[-1]["latency_sec"]["max"], output_sizes[-1]))
+    return results
+
+def scm_bench(scms, sizes, churns, rounds=5, commands=None, setup=None, seed=0, work_dir=None):
+    '''Run measure() for each combination of scm, size and churn and return the report'''
+    results = []
+    for scm in scms:
+        preset = PRESETS.get(scm, ScmPreset([], []))
+        scm_setup = preset.setup if setup is None else setup
+        scm_commands = preset.commands if not commands else commands
+        for size in sizes:
+            for churn in churns:
+                base_dir = tempfile.mkdtemp(prefix="scmtt_", dir=work_dir)
+                try:
+                    results.extend(measure(base_dir, size, scm, scm_setup, scm_commands, churn, rounds, seed))
+                finally:
+                    shutil.rmtree(base_dir, ignore_errors=True)
+    return {"version": 1, "rounds": rounds, "seed": seed, "results": results}
+
+def scm_bench_cmd(scms, sizes, churns, rounds=5, commands=None, setup=None, seed=0, work_dir=None, output=None):
+    '''Execute the "scm-bench" sub command using the supplied args'''
+    for scm in scms:
+        if scm in PRESETS and setup is None and shutil.which(scm) is None:
+            return _("{0}: command not found.\n").format(scm)
+    try:
+        report = scm_bench(scms, sizes, churns, rounds, commands, setup, seed, work_dir)
+    except OSError as edata:
+        return "{0}\n".format(edata)
+    text = json.dumps(report, indent=2) + "\n"
+    if output:
+        try:
+            open(output, "w").write(text)
+        except IOError as edata:
+            return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    else:
+        sys.stdout.write(text)
+    return 0
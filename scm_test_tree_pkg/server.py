@@ -0,0 +1,155 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Serve create/modify/verify requests over a local (Unix domain) socket.
+
+Requests and replies are single lines of JSON.  A request is
+{"op": OP, "cwd": DIRECTORY, "args": {...}} and the reply is
+{"status": N, "stdout": TEXT, "stderr": TEXT}.  Connections (and the
+requests on them) are handled one at a time, each request in its own
+working directory, by the same engine functions as the command line.
+'''
+
+import io
+import os
+import sys
+import json
+import socket
+import contextlib
+import socketserver
+
+from . import cmd_ifce
+from . import tree_shape
+from . import mutate
+from . import churn
+from . import manifest
+from .client import DEFAULT_SOCKET
+
+def _create(args):
+    shape = tree_shape.TreeShape(**args.get("shape", {}))
+    return cmd_ifce.create_test_tree(args.get("basedir", ""), shape=shape, jobs=args.get("jobs", 1), use_processes=args.get("use_processes", False))
+
+def _modify(args):
+    filepaths = args.get("filepaths", [])
+    if args.get("rounds", 0) > 0:
+        return cmd_ifce.modify_rounds(filepaths, args["rounds"], files_per_round=args.get("files_per_round", 0), seed=args.get("seed", 0), add_tws=args.get("add_tws", False), no_newline=args.get("no_newline", False))
+    return cmd_ifce.modify_files(filepaths, add_tws=args.get("add_tws", False), no_newline=args.get("no_newline", False))
+
+def _mutate(args):
+    return mutate.mutate_files(args.get("filepaths", []), nops=args.get("ops", 1), operations=tuple(args.get("operations", mutate.OPERATIONS)), mode=args.get("mode", "lines"), max_bytes=args.get("max_bytes", 64), seed=args.get("seed", 0))
+
+def _grow(args):
+    return cmd_ifce.grow_files(args.get("filepaths", []), tree_shape.parse_size(str(args["size"])), relative=args.get("relative", False), sparse=args.get("sparse", False))
+
+def _churn(args):
+    return churn.churn_cmd(args["operation"], args.get("filepaths", []), count=args.get("count"), fraction=args.get("fraction"), seed=args.get("seed", 0), tweak=args.get("tweak", False), jobs=args.get("jobs", 1), dest_dir=args.get("to"))
+
+def _revert(args):
+    return cmd_ifce.revert_tree(args.get("to"), jobs=args.get("jobs", 1))
+
+def _manifest(args):
+    return manifest.update_manifest(args.get("manifest", manifest.MANIFEST_FILE), full=args.get("full", False))
+
+def _verify(args):
+    return manifest.verify_cmd(args.get("manifest", manifest.MANIFEST_FILE), jobs=args.get("jobs", 1), fast=args.get("fast", False), fail_fast=args.get("fail_fast", False))
+
+OPERATIONS = {
+    "create": _create,
+    "modify": _modify,
+    "mutate": _mutate,
+    "grow": _grow,
+    "churn": _churn,
+    "revert": _revert,
+    "manifest": _manifest,
+    "verify": _verify,
+}
+
+def handle_request(request):
+    '''Perform the request (a dict) and return the reply (a dict)'''
+    stdout, stderr = io.StringIO(), io.StringIO()
+    op = request.get("op")
+    if op == "ping":
+        return {"status": 0, "stdout": "", "stderr": ""}
+    if op not in OPERATIONS:
+        return {"status": 2, "stdout": "", "stderr": _("{0}: unknown operation.\n").format(op)}
+    old_wd = os.getcwd()
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            os.chdir(request.get("cwd") or old_wd)
+            result = OPERATIONS[op](request.get("args", {}))
+    except (OSError, ValueError, TypeError, KeyError) as edata:
+        result = "{0}\n".format(edata)
+    finally:
+        os.chdir(old_wd)
+    if isinstance(result, str):
+        stderr.write(result)
+        result = 1
+    return {"status": result, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+            except ValueError as edata:
+                reply = {"status": 2, "stdout": "", "stderr": "{0}\n".format(edata)}
+            else:
+                if request.get("op") == "shutdown":
+                    self.server.stopping = True
+                    reply = {"status": 0, "stdout": "", "stderr": ""}
+                else:
+                    reply = handle_request(request)
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+            if self.server.stopping:
+                break
+
+class _Server(socketserver.UnixStreamServer):
+    stopping = False
+
+def serve(socket_path=DEFAULT_SOCKET):
+    '''Execute the "serve" sub command using the supplied args'''
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            pass
+        else:
+            return _("{0}: is in use by another daemon.\n").format(socket_path)
+        finally:
+            probe.close()
+        try:
+            os.unlink(socket_path)
+        except OSError as edata:
+            return "{0}: {1}\n".format(socket_path, edata.strerror)
+    old_umask = os.umask(0o077)
+    try:
+        server = _Server(socket_path, _RequestHandler)
+    except OSError as edata:
+        return "{0}: {1}\n".format(socket_path, edata.strerror)
+    finally:
+        os.umask(old_umask)
+    sys.stdout.write(_("Serving on: {0}\n").format(socket_path))
+    sys.stdout.flush()
+    try:
+        while not server.stopping:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+    return 0
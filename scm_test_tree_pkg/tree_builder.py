@@ -0,0 +1,205 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Create the directories and files of a test tree (optionally in parallel)'''
+
+import os
+import errno
+
+from . import tree_shape
+
+# not O_TRUNC: a file hard linked (e.g. to the tree cache) must be replaced rather than truncated
+_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | getattr(os, "O_CLOEXEC", 0)
+_DIR_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_CLOEXEC", 0)
+
+# Aim for this many subtrees per worker so that uneven subtrees balance out
+_TASKS_PER_JOB = 4
+
+def _emsg(base_dir_name, path, edata):
+    return "{0}: {1}\n".format(os.path.join(base_dir_name, path), edata.strerror)
+
+# Padding is written in chunks of about this size whatever the file size
+CHUNK_SIZE = 1 << 20
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def preallocate(fd, offset, length):
+    '''Reserve space for length bytes at offset (if the file system supports it)'''
+    if length <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except OSError as edata:
+        if edata.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise
+
+def write_padding(fd, filler, offset, length, sparse=False):
+    '''Extend the file open on fd (currently offset bytes long and
+    positioned at its end but not in O_APPEND mode) by length bytes of
+    repeated filler (or a hole if sparse) using constant memory.
+    '''
+    if length <= 0:
+        return
+    if sparse:
+        os.ftruncate(fd, offset + length)
+        return
+    preallocate(fd, offset, length)
+    chunk = filler * max(1, CHUNK_SIZE // len(filler))
+    while length >= len(chunk):
+        _write_all(fd, chunk)
+        length -= len(chunk)
+    _write_all(fd, chunk[:length])
+
+def _unshare(filepath):
+    import shutil
+    temp_path = filepath + ".scmtt_unshare"
+    shutil.copyfile(filepath, temp_path)
+    shutil.copymode(filepath, temp_path)
+    os.replace(temp_path, filepath)
+
+def open_unshared(filepath, flags):
+    '''os.open() filepath (for writing) first giving it its own copy of
+    its content if it is hard linked (e.g. to the tree cache) so that
+    changes to it can't show up anywhere else.
+    '''
+    fd = os.open(filepath, flags)
+    if os.fstat(fd).st_nlink > 1:
+        os.close(fd)
+        _unshare(filepath)
+        fd = os.open(filepath, flags)
+    return fd
+
+def _write_file(fname, head, size, filler, sparse, dir_fd):
+    fd = os.open(fname, _FILE_FLAGS, 0o666, dir_fd=dir_fd)
+    stat_data = os.fstat(fd)
+    if stat_data.st_nlink > 1:
+        os.close(fd)
+        os.unlink(fname, dir_fd=dir_fd)
+        fd = os.open(fname, _FILE_FLAGS, 0o666, dir_fd=dir_fd)
+    elif stat_data.st_size:
+        os.ftruncate(fd, 0)
+    try:
+        if size > CHUNK_SIZE and not sparse:
+            preallocate(fd, 0, size)
+        _write_all(fd, head)
+        write_padding(fd, filler, len(head), size - len(head), sparse)
+    finally:
+        os.close(fd)
+
+def _build_dir(base_dir_name, shape, dir_path, level, dir_fd, emsgs, deferred=None, split_level=None):
+    '''Populate the directory open on dir_fd and return the number of files created'''
+    ncreated = 0
+    for fname, kind in shape.iter_file_specs(dir_path, level):
+        fpath = os.path.join(dir_path, fname)
+        try:
+            head, size = shape.file_spec(fpath, kind)
+            _write_file(fname, head, size, tree_shape.filler_block(kind), shape.sparse, dir_fd)
+        except OSError as edata:
+            emsgs.append(_emsg(base_dir_name, fpath, edata))
+            continue
+        ncreated += 1
+    for dname in shape.subdir_names(dir_path, level):
+        sub_path = os.path.join(dir_path, dname)
+        try:
+            os.mkdir(dname, dir_fd=dir_fd)
+        except OSError as edata:
+            emsgs.append(_emsg(base_dir_name, sub_path, edata))
+        if deferred is not None and level + 1 == split_level:
+            deferred.append((sub_path, level + 1))
+            continue
+        try:
+            sub_fd = os.open(dname, _DIR_FLAGS, dir_fd=dir_fd)
+        except OSError as edata:
+            emsgs.append(_emsg(base_dir_name, sub_path, edata))
+            continue
+        try:
+            ncreated += _build_dir(base_dir_name, shape, sub_path, level + 1, sub_fd, emsgs, deferred, split_level)
+        finally:
+            os.close(sub_fd)
+    return ncreated
+
+def _build_subtree(base_dir_name, shape, dir_path, level):
+    '''Build the subtree rooted at (existing) dir_path and return
+    (number of files created, error messages).
+    '''
+    emsgs = []
+    try:
+        dir_fd = os.open(os.path.join(base_dir_name, dir_path) or os.curdir, _DIR_FLAGS)
+    except OSError as edata:
+        return (0, [_emsg(base_dir_name, dir_path, edata)])
+    try:
+        ncreated = _build_dir(base_dir_name, shape, dir_path, level, dir_fd, emsgs)
+    finally:
+        os.close(dir_fd)
+    return (ncreated, emsgs)
+
+def _choose_split_level(shape, jobs):
+    '''Return the shallowest level with enough directories to keep jobs workers busy'''
+    ndirs = 1
+    for level in range(shape.depth):
+        ndirs *= shape.get_fanout(level)
+        if ndirs == 0:
+            return None
+        if ndirs >= jobs * _TASKS_PER_JOB:
+            return level + 1
+    return shape.depth if shape.depth else None
+
+def _init_worker():
+    # spawned (rather than forked) workers need "_" for the files' templates
+    import builtins
+    if not hasattr(builtins, "_"):
+        from . import i18n
+
+def build_tree(base_dir_name, shape, jobs=1, use_processes=False):
+    '''Create the directories and files described by shape in base_dir_name.
+
+    The tree above the split level is built in the calling thread and
+    the subtrees below it are farmed out to a pool of jobs workers
+    (threads or, if use_processes, processes).  Generate (number of
+    files created, list of error messages) for each part of the tree in
+    a fixed order so that the outcome is the same whatever the number
+    of jobs.
+    '''
+    split_level = _choose_split_level(shape, jobs) if jobs > 1 else None
+    if split_level is None:
+        yield _build_subtree(base_dir_name, shape, "", 0)
+        return
+    emsgs = []
+    deferred = []
+    try:
+        dir_fd = os.open(base_dir_name or os.curdir, _DIR_FLAGS)
+    except OSError as edata:
+        yield (0, [_emsg(base_dir_name, "", edata)])
+        return
+    try:
+        ncreated = _build_dir(base_dir_name, shape, "", 0, dir_fd, emsgs, deferred, split_level)
+    finally:
+        os.close(dir_fd)
+    yield (ncreated, emsgs)
+    if not deferred:
+        return
+    import concurrent.futures
+    chunksize = max(1, len(deferred) // (jobs * _TASKS_PER_JOB)) if use_processes else 1
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) if use_processes else concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    try:
+        nsubtrees = len(deferred)
+        for result in executor.map(_build_subtree, [base_dir_name] * nsubtrees, [shape] * nsubtrees, *zip(*deferred), chunksize=chunksize):
+            yield result
+    finally:
+        # if our consumer has given up (closed us) don't start any more subtrees
+        executor.shutdown(wait=True, cancel_futures=True)
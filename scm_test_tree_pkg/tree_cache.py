@@ -0,0 +1,243 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''A cache of pristine test trees keyed by the parameters of their shape.
+
+Trees are cloned from the cache by (in order of preference) reflink
+copies (the file system shares the data until either copy changes),
+hard links or ordinary copies.  Hard linked trees rely on
+scm_test_tree's own writers giving a file its own copy of its data
+(see tree_builder.open_unshared()) before changing it: other tools
+should replace files rather than rewrite them in place.
+'''
+
+import os
+import sys
+import json
+import time
+import errno
+import shutil
+import hashlib
+import concurrent.futures
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import CONFIG_DIR_PATH
+from . import cmd_ifce
+from . import tree_shape
+from . import tree_builder
+from . import journal
+
+CACHE_DIR = os.path.join(CONFIG_DIR_PATH, "tree_cache")
+CACHE_VERSION = 1
+
+METHODS = ("auto", "reflink", "hardlink", "copy")
+
+# ioctl request to make a file share (copy on write) another's data (linux/fs.h)
+FICLONE = 0x40049409
+
+# files are handed to the worker threads in batches of this many
+CLONE_BATCH_SIZE = 256
+
+# errors meaning that a clone method isn't supported (between these places)
+_UNSUPPORTED = frozenset([errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS, errno.EPERM, errno.EMLINK])
+
+# the tree's own (top level) files are rewritten in place so they're always copied
+_COPIED_FILES = frozenset([cmd_ifce.COUNT_FILE, ".hgignore", ".gitignore"])
+
+def describe_shape(shape):
+    '''Return a (JSON compatible) description of shape from which it can be recreated'''
+    return {"class": type(shape).__name__, "args": shape.as_dict()}
+
+def shape_from_description(description):
+    '''Return the shape described by description (see describe_shape())'''
+    if description["class"] == "ProfileShape":
+        from . import tree_profile
+        return tree_profile.ProfileShape(**description["args"])
+    return tree_shape.TreeShape(**description["args"])
+
+def cache_key(shape):
+    '''Return the key of the cache entry for trees of the given shape'''
+    text = json.dumps({"version": CACHE_VERSION, "shape": describe_shape(shape)}, sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def entry_path(key):
+    return os.path.join(CACHE_DIR, key)
+
+def ensure_cached(shape, jobs=1, use_processes=False):
+    '''Return (key, path of the pristine tree) for shape creating the
+    cache entry if necessary.
+    '''
+    key = cache_key(shape)
+    tree_path = os.path.join(entry_path(key), "tree")
+    if os.path.isdir(tree_path):
+        return (key, tree_path)
+    # build it beside its final place and rename it in so that no one sees a partial entry
+    temp_path = "{0}.tmp{1}".format(entry_path(key), os.getpid())
+    shutil.rmtree(temp_path, ignore_errors=True)
+    temp_tree_path = os.path.join(temp_path, "tree")
+    emsg = cmd_ifce.init_test_tree(temp_tree_path)
+    if emsg:
+        raise OSError(emsg)
+    emsgs = []
+    for _ncreated, part_emsgs in tree_builder.build_tree(temp_tree_path, shape, jobs=jobs, use_processes=use_processes):
+        emsgs.extend(part_emsgs)
+    if emsgs:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise OSError("".join(emsgs))
+    with open(os.path.join(temp_path, "shape.json"), "w") as fobj:
+        json.dump(describe_shape(shape), fobj, sort_keys=True)
+    try:
+        os.rename(temp_path, entry_path(key))
+    except OSError:
+        # someone else got there first
+        shutil.rmtree(temp_path, ignore_errors=True)
+    return (key, tree_path)
+
+def _list_tree(top):
+    '''Return lists of the (relative) paths of the directories and the files in top'''
+    dir_paths = []
+    file_paths = []
+    dir_stack = [""]
+    while dir_stack:
+        dir_path = dir_stack.pop()
+        with os.scandir(os.path.join(top, dir_path)) as entries:
+            for entry in entries:
+                path = os.path.join(dir_path, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    dir_paths.append(path)
+                    dir_stack.append(path)
+                else:
+                    file_paths.append(path)
+    return (dir_paths, file_paths)
+
+def reflink_file(src_path, dst_path):
+    '''Make dst_path a copy of src_path sharing its data (if the file system can)'''
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS), dst_path)
+    src_fd = os.open(src_path, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        except OSError as edata:
+            os.unlink(dst_path)
+            raise OSError(edata.errno, edata.strerror, dst_path)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+def _clone_file(method, src_path, dst_path):
+    if method == "hardlink":
+        os.link(src_path, dst_path)
+    elif method == "reflink":
+        reflink_file(src_path, dst_path)
+    else:
+        shutil.copyfile(src_path, dst_path)
+
+def _clone_batch(method, cache_tree, base_dir, file_paths):
+    emsgs = []
+    for file_path in file_paths:
+        try:
+            _clone_file(method, os.path.join(cache_tree, file_path), os.path.join(base_dir, file_path))
+        except OSError as edata:
+            emsgs.append("{0}: {1}\n".format(os.path.join(base_dir, file_path), edata.strerror))
+    return emsgs
+
+def _choose_method(method, cache_tree, base_dir, file_paths):
+    '''Clone the first file (to find out which methods work) and return the method used'''
+    candidates = ("reflink", "hardlink", "copy") if method == "auto" else (method, )
+    for candidate in candidates:
+        try:
+            _clone_file(candidate, os.path.join(cache_tree, file_paths[0]), os.path.join(base_dir, file_paths[0]))
+        except OSError as edata:
+            if candidate == candidates[-1] or edata.errno not in _UNSUPPORTED:
+                raise
+            continue
+        return candidate
+
+def clear_tree(base_dir):
+    '''Remove everything in base_dir except SCM databases'''
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in cmd_ifce.SCM_DIRS or entry.name == journal.JOURNAL_DIR:
+                    shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+def clone_tree(key, cache_tree, base_dir, method="auto", jobs=1):
+    '''Clone the cached tree at cache_tree into the (empty apart from SCM
+    databases) directory base_dir and return (method used, number of
+    files, error messages).
+    '''
+    dir_paths, file_paths = _list_tree(cache_tree)
+    os.makedirs(base_dir, exist_ok=True)
+    for dir_path in dir_paths:
+        os.mkdir(os.path.join(base_dir, dir_path))
+    emsgs = _clone_batch("copy", cache_tree, base_dir, [path for path in file_paths if path in _COPIED_FILES])
+    file_paths = [path for path in file_paths if path not in _COPIED_FILES]
+    if file_paths:
+        method = _choose_method(method, cache_tree, base_dir, file_paths)
+        batches = [file_paths[index:index + CLONE_BATCH_SIZE] for index in range(1, len(file_paths), CLONE_BATCH_SIZE)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            for batch_emsgs in executor.map(_clone_batch, [method] * len(batches), [cache_tree] * len(batches), [base_dir] * len(batches), batches):
+                emsgs.extend(batch_emsgs)
+    with open(os.path.join(base_dir, cmd_ifce.ORIGIN_FILE), "w") as fobj:
+        json.dump({"key": key, "method": method}, fobj)
+    journal.start_journal(base_dir)
+    return (method, len(file_paths), emsgs)
+
+def _report(action, base_dir, method, nfiles, emsgs, start):
+    sys.stderr.write("".join(emsgs))
+    sys.stdout.write(_("{0}: {1}: {2} file(s) by {3} in {4:.3f} seconds.\n").format(action, base_dir or os.curdir, nfiles, method, time.time() - start))
+    return 1 if emsgs else 0
+
+def create_cached(base_dir, shape, method="auto", jobs=1, use_processes=False):
+    '''Execute the "create --cached" sub command using the supplied args'''
+    start = time.time()
+    base_dir = base_dir or os.curdir
+    try:
+        key, cache_tree = ensure_cached(shape, jobs, use_processes)
+        if os.path.isdir(base_dir) and any(name not in cmd_ifce.SCM_DIRS for name in os.listdir(base_dir)):
+            return _("{0}: is not empty: use \"reset\" to restore an existing test tree.\n").format(base_dir)
+        method, nfiles, emsgs = clone_tree(key, cache_tree, base_dir, method, jobs)
+    except OSError as edata:
+        return "{0}\n".format(edata) if edata.filename is None else "{0}: {1}\n".format(edata.filename, edata.strerror)
+    return _report(_("create"), base_dir, method, nfiles, emsgs, start)
+
+def reset_cmd(base_dir="", method="auto", jobs=1):
+    '''Execute the "reset" sub command using the supplied args'''
+    start = time.time()
+    base_dir = base_dir or os.curdir
+    origin_path = os.path.join(base_dir, cmd_ifce.ORIGIN_FILE)
+    try:
+        with open(origin_path) as fobj:
+            key = json.load(fobj)["key"]
+    except (IOError, ValueError, KeyError, TypeError):
+        return _("{0}: was not created from the tree cache (see \"create --cached\").\n").format(base_dir)
+    cache_tree = os.path.join(entry_path(key), "tree")
+    if not os.path.isdir(cache_tree):
+        return _("{0}: its tree cache entry ({1}) has gone: recreate it with \"create --cached\".\n").format(base_dir, key)
+    try:
+        clear_tree(base_dir)
+        method, nfiles, emsgs = clone_tree(key, cache_tree, base_dir, method, jobs)
+    except OSError as edata:
+        return "{0}: {1}\n".format(edata.filename, edata.strerror)
+    return _report(_("reset"), base_dir, method, nfiles, emsgs, start)
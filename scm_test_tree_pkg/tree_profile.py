@@ -0,0 +1,265 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Summarise the shape of an existing directory tree (a profile) and
+synthesise test trees with the same statistical shape.
+
+A profile (JSON) records, for each directory level, histograms of the
+number of sub directories and of files per directory, log2 bucketed
+histograms of file sizes (for text and binary files separately), the
+fraction of hidden files and the mix of file name extensions (with
+the fraction of binary files for each).  No names (other than
+extensions) or content are recorded.
+'''
+
+import os
+import sys
+import json
+import math
+import random
+import collections
+
+from . import cmd_ifce
+from . import tree_shape
+
+PROFILE_VERSION = 1
+
+# a file is deemed binary if this much of its start contains a NUL (as git does)
+BINARY_PROBE_SIZE = 8000
+# only the most common extensions are kept
+MAX_EXTENSIONS = 64
+
+# files that are part of a test tree's machinery rather than its content
+_SKIP_FILES = frozenset([cmd_ifce.COUNT_FILE, cmd_ifce.MANIFEST_FILE, cmd_ifce.ORIGIN_FILE])
+
+def _is_binary(file_path):
+    with open(file_path, "rb") as fobj:
+        return b"\0" in fobj.read(BINARY_PROBE_SIZE)
+
+def size_bucket(size):
+    '''Return the log2 bucket for size: k for sizes in [2**k, 2**(k+1)) and -1 for 0'''
+    return size.bit_length() - 1
+
+def _histogram(counter):
+    return {str(key): count for key, count in sorted(counter.items())}
+
+def scan_profile(base_dir, report_emsg=None):
+    '''Return the profile (a dict) of the directory tree at base_dir'''
+    if report_emsg is None:
+        report_emsg = sys.stderr.write
+    fanouts = collections.defaultdict(collections.Counter)
+    files_per_dir = collections.defaultdict(collections.Counter)
+    sizes = {"text": collections.Counter(), "binary": collections.Counter()}
+    extensions = collections.Counter()
+    binary_extensions = collections.Counter()
+    ndirs = nfiles = nbytes = nhidden = nbinary = 0
+    dir_stack = [("", 0)]
+    while dir_stack:
+        dir_path, level = dir_stack.pop()
+        nsubdirs = ndirfiles = 0
+        try:
+            entries = os.scandir(os.path.join(base_dir, dir_path))
+        except OSError as edata:
+            report_emsg("{0}: {1}\n".format(os.path.join(base_dir, dir_path), edata.strerror))
+            continue
+        ndirs += 1
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in cmd_ifce.SCM_DIRS:
+                        nsubdirs += 1
+                        dir_stack.append((os.path.join(dir_path, entry.name), level + 1))
+                    continue
+                if not entry.is_file(follow_symlinks=False) or entry.name in _SKIP_FILES:
+                    continue
+                try:
+                    size = entry.stat(follow_symlinks=False).st_size
+                    is_binary = _is_binary(entry.path)
+                except OSError as edata:
+                    report_emsg("{0}: {1}\n".format(entry.path, edata.strerror))
+                    continue
+                ndirfiles += 1
+                nbytes += size
+                hidden = entry.name.startswith(".")
+                nhidden += hidden
+                extension = os.path.splitext(entry.name[1:] if hidden else entry.name)[1]
+                extensions[extension] += 1
+                if is_binary:
+                    nbinary += 1
+                    binary_extensions[extension] += 1
+                sizes["binary" if is_binary else "text"][size_bucket(size)] += 1
+        fanouts[level][nsubdirs] += 1
+        files_per_dir[level][ndirfiles] += 1
+        nfiles += ndirfiles
+    kept_extensions = extensions.most_common(MAX_EXTENSIONS)
+    return {
+        "version": PROFILE_VERSION,
+        "dirs": ndirs,
+        "files": nfiles,
+        "bytes": nbytes,
+        "dirs_per_level": {str(level): sum(counter.values()) for level, counter in sorted(fanouts.items())},
+        "fanout": {str(level): _histogram(counter) for level, counter in sorted(fanouts.items())},
+        "files_per_dir": {str(level): _histogram(counter) for level, counter in sorted(files_per_dir.items())},
+        "sizes": {kind: _histogram(counter) for kind, counter in sizes.items()},
+        "binary_fraction": nbinary / nfiles if nfiles else 0.0,
+        "hidden_fraction": nhidden / nfiles if nfiles else 0.0,
+        "extensions": {extension: [count, binary_extensions[extension]] for extension, count in kept_extensions},
+        "other_extensions": nfiles - sum(count for _extension, count in kept_extensions),
+    }
+
+def read_profile(profile_path):
+    '''Read the profile at profile_path (raising ValueError if it isn't one)'''
+    with open(profile_path) as fobj:
+        try:
+            profile = json.load(fobj)
+        except ValueError:
+            profile = None
+    if not isinstance(profile, dict) or profile.get("version") != PROFILE_VERSION:
+        raise ValueError(_("{0}: is not a valid profile.").format(profile_path))
+    return profile
+
+class _Histogram(object):
+    def __init__(self, histogram):
+        items = sorted((int(value), count) for value, count in histogram.items() if count > 0)
+        self.values = [value for value, _count in items]
+        self.cum_weights = []
+        total = 0
+        for _value, count in items:
+            total += count
+            self.cum_weights.append(total)
+    @property
+    def mean(self):
+        if not self.values:
+            return 0.0
+        weights = [self.cum_weights[0]] + [b - a for a, b in zip(self.cum_weights, self.cum_weights[1:])]
+        return sum(value * weight for value, weight in zip(self.values, weights)) / self.cum_weights[-1]
+    def sample(self, rng, default=0):
+        if not self.values:
+            return default
+        return rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+def _scaled(count, factor, rng):
+    # randomised rounding keeps the expected value exact
+    value = count * factor
+    whole = int(value)
+    return whole + (1 if rng.random() < value - whole else 0)
+
+class ProfileShape(object):
+    '''A tree shape (usable wherever a TreeShape is) whose directories
+    and files are drawn from a profile's histograms.
+
+    scale multiplies the (expected) number of files: the number of sub
+    directories per directory is multiplied by a factor chosen to
+    achieve that so that the number of files per directory (and the
+    depth) is unchanged.  Trees that are a single directory have their
+    number of files scaled instead.  Everything is drawn repeatably from
+    seed and the paths involved so the tree is the same whatever the
+    order (or parallelism) of its creation.
+    '''
+    def __init__(self, profile, scale=1.0, seed=0, sparse=False):
+        if scale <= 0:
+            raise ValueError(_("{0}: scale factor must be positive.").format(scale))
+        self.profile = profile
+        self.scale = scale
+        self.seed = seed
+        self.sparse = sparse
+        nlevels = len(profile.get("fanout", {}))
+        self._fanouts = [_Histogram(profile["fanout"].get(str(level), {})) for level in range(nlevels)]
+        self._files = [_Histogram(profile.get("files_per_dir", {}).get(str(level), {})) for level in range(nlevels)]
+        self._sizes = {kind: _Histogram(histogram) for kind, histogram in profile.get("sizes", {}).items()}
+        self.depth = max([level + 1 for level, fanout in enumerate(self._fanouts) if fanout.mean > 0] or [0])
+        self._hidden_fraction = profile.get("hidden_fraction", 0.0)
+        extensions = sorted(profile.get("extensions", {}).items())
+        self._extensions = [extension for extension, _counts in extensions]
+        self._extension_binary = [(nbinary / count if count else 0.0) for _extension, (count, nbinary) in extensions]
+        self._extension_weights = [count for _extension, (count, _nbinary) in extensions]
+        self._dir_factor, self._file_factor = self._choose_factors()
+    def _expected_files(self, dir_factor):
+        total = 0.0
+        ndirs = 1.0
+        for level in range(len(self._fanouts)):
+            total += ndirs * self._files[level].mean
+            ndirs *= self._fanouts[level].mean * dir_factor
+        return total
+    def _choose_factors(self):
+        if self.scale == 1.0:
+            return (1.0, 1.0)
+        target = self._expected_files(1.0) * self.scale
+        if self.depth == 0 or self._expected_files(0.0) >= target or self._expected_files(1e6) <= target:
+            return (1.0, self.scale)
+        low, high = (0.0, 1e6)
+        for _iteration in range(100):
+            middle = (low + high) / 2
+            if self._expected_files(middle) < target:
+                low = middle
+            else:
+                high = middle
+        return (high, 1.0)
+    def as_dict(self):
+        return dict(profile=self.profile, scale=self.scale, seed=self.seed, sparse=self.sparse)
+    def get_fanout(self, level):
+        '''Return the (rounded up) mean number of sub directories at level'''
+        if level >= len(self._fanouts):
+            return 0
+        return int(math.ceil(self._fanouts[level].mean * self._dir_factor))
+    def subdir_names(self, dir_path, level):
+        '''Return the names of the sub directories of the directory at dir_path'''
+        if level >= len(self._fanouts):
+            return []
+        rng = random.Random("{0}:dirs:{1}".format(self.seed, dir_path))
+        count = _scaled(self._fanouts[level].sample(rng), self._dir_factor, rng)
+        dn_template = "dir{0}" if level == 0 else "subdir{0}"
+        return [dn_template.format(index) for index in range(1, count + 1)]
+    def iter_file_specs(self, dir_path, level):
+        '''Generate (file name, kind) for each file in the directory at dir_path'''
+        if level >= len(self._files):
+            return
+        rng = random.Random("{0}:files:{1}".format(self.seed, dir_path))
+        count = _scaled(self._files[level].sample(rng), self._file_factor, rng)
+        for findex in range(1, count + 1):
+            extension, binary_fraction = ("", 0.0)
+            if self._extensions:
+                index = rng.choices(range(len(self._extensions)), weights=self._extension_weights)[0]
+                extension, binary_fraction = (self._extensions[index], self._extension_binary[index])
+            if rng.random() < self._hidden_fraction:
+                kind = "hidden"
+            else:
+                kind = "binary" if rng.random() < binary_fraction else "text"
+            yield (tree_shape.KINDS[kind].fn_template.format(findex) + extension, kind)
+    walk = tree_shape.TreeShape.walk
+    def file_spec(self, fpath, kind):
+        '''Return (head, size) for the file at fpath (see TreeShape.file_spec())'''
+        head = _(tree_shape.KINDS[kind].c_template).format(fpath).encode()
+        rng = random.Random("{0}:{1}".format(self.seed, fpath))
+        bucket = self._sizes.get("binary" if kind == "binary" else "text", _Histogram({})).sample(rng, default=-1)
+        size = 0 if bucket < 0 else min(int(2 ** rng.uniform(bucket, bucket + 1)), (1 << (bucket + 1)) - 1)
+        return (head, max(size, len(head)))
+    file_content = tree_shape.TreeShape.file_content
+
+def profile_cmd(base_dir=".", output=None):
+    '''Execute the "profile" sub command using the supplied args'''
+    if not os.path.isdir(base_dir):
+        return _("{0}: is NOT a directory.\n").format(base_dir)
+    profile = scan_profile(base_dir)
+    text = json.dumps(profile, indent=2, sort_keys=True) + "\n"
+    if output:
+        try:
+            open(output, "w").write(text)
+        except IOError as edata:
+            return "{0}: {1}\n".format(edata.filename, edata.strerror)
+        sys.stdout.write(_("{0}: {1} directories, {2} files, {3} bytes ({4:.1%} binary).\n").format(base_dir, profile["dirs"], profile["files"], profile["bytes"], profile["binary_fraction"]))
+    else:
+        sys.stdout.write(text)
+    return 0
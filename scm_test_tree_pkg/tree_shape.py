@@ -0,0 +1,172 @@
+### Copyright (C) 2015 Peter Williams <pwil3058@gmail.com>
+###
+### This program is free software; you can redistribute it and/or modify
+### it under the terms of the GNU General Public License as published by
+### the Free Software Foundation; version 2 of the License only.
+###
+### This program is distributed in the hope that it will be useful,
+### but WITHOUT ANY WARRANTY; without even the implied warranty of
+### MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+### GNU General Public License for more details.
+###
+### You should have received a copy of the GNU General Public License
+### along with this program; if not, write to the Free Software
+### Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Describe the shape (layout and file contents) of a test file tree'''
+
+import os
+import math
+import random
+import collections
+
+# (file name template, content template) for each kind of file.
+# Content templates are translated at the time of use.
+FileKind = collections.namedtuple("FileKind", ["name", "fn_template", "c_template"])
+
+KINDS = collections.OrderedDict([
+    ("text", FileKind("text", "file{0}", "{0}: is a text file.\n")),
+    ("binary", FileKind("binary", "binary{0}", "{0}:\000is a binary file.\n")),
+    ("hidden", FileKind("hidden", ".hidden{0}", "{0}:is a hidden file.\n")),
+])
+
+DEFAULT_KINDS = tuple(KINDS.keys())
+
+_SIZE_SUFFIXES = {"": 1, "B": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+def parse_size(text):
+    '''Convert a size such as "512", "4K", "10M" or "2G" to a number of bytes'''
+    text = text.strip().upper()
+    if text.endswith("IB"):
+        text = text[:-2]
+    suffix = text[-1:] if text[-1:].isalpha() else ""
+    try:
+        value = float(text[:len(text) - len(suffix)])
+        multiplier = _SIZE_SUFFIXES[suffix]
+    except (ValueError, KeyError):
+        raise ValueError(_("{0}: is not a valid size.").format(text))
+    if value < 0:
+        raise ValueError(_("{0}: is not a valid size.").format(text))
+    return int(value * multiplier)
+
+class SizeDistribution(object):
+    '''The distribution from which (padded) file sizes are drawn.
+
+    The spec is one of:
+        ""                          (no padding: just the identifying line)
+        "fixed:SIZE"
+        "uniform:MIN:MAX"
+        "lognormal:MEDIAN:SIGMA"
+    '''
+    def __init__(self, spec=""):
+        self.spec = spec
+        fields = spec.split(":") if spec else ["none"]
+        self.kind = fields[0]
+        try:
+            if self.kind == "none" and len(fields) == 1:
+                self._params = ()
+            elif self.kind == "fixed" and len(fields) == 2:
+                self._params = (parse_size(fields[1]), )
+            elif self.kind == "uniform" and len(fields) == 3:
+                self._params = (parse_size(fields[1]), parse_size(fields[2]))
+                if self._params[0] > self._params[1]:
+                    raise ValueError
+            elif self.kind == "lognormal" and len(fields) == 3:
+                self._params = (math.log(max(parse_size(fields[1]), 1)), float(fields[2]))
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(_("{0}: is not a valid size distribution.").format(spec))
+    def sample(self, rng):
+        '''Return a size drawn from this distribution (None means no padding)'''
+        if self.kind == "none":
+            return None
+        elif self.kind == "fixed":
+            return self._params[0]
+        elif self.kind == "uniform":
+            return rng.randint(*self._params)
+        return int(rng.lognormvariate(*self._params))
+
+_TEXT_FILLER = "".join("{0:04} Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n".format(i) for i in range(64)).encode()
+_BINARY_FILLER = bytes(range(256)) * 16
+
+def filler_block(kind):
+    '''Return the block repeated to pad out files of the given kind'''
+    return _BINARY_FILLER if kind == "binary" else _TEXT_FILLER
+
+def kind_of(fname):
+    '''Return the kind of the file named fname (guessed from its name)'''
+    if fname.startswith("binary"):
+        return "binary"
+    return "hidden" if fname.startswith(".") else "text"
+
+class TreeShape(object):
+    '''Parameters describing a test tree's layout and file contents.
+
+    depth: the number of levels of directories below the base directory
+    fanout: the number of sub directories per directory for each level
+        (the last value is used for any levels beyond those specified)
+    files: the number of files of each kind in each directory
+    kinds: the kinds of file (see KINDS) in each directory
+    sizes: the spec of the SizeDistribution for file sizes
+    seed: the seed used to make size selection repeatable
+    sparse: whether padding should be left as a hole rather than written
+    '''
+    def __init__(self, depth=2, fanout=(5, ), files=5, kinds=DEFAULT_KINDS, sizes="", seed=0, sparse=False):
+        if depth < 0 or files < 0 or not fanout or min(fanout) < 0:
+            raise ValueError(_("Tree shape parameters must not be negative."))
+        for kind in kinds:
+            if kind not in KINDS:
+                raise ValueError(_("{0}: unknown file kind.").format(kind))
+        self.depth = depth
+        self.fanout = tuple(fanout)
+        self.files = files
+        self.kinds = tuple(kinds)
+        self.sizes = SizeDistribution(sizes)
+        self.seed = seed
+        self.sparse = sparse
+    def __getstate__(self):
+        return self.as_dict()
+    def __setstate__(self, state):
+        self.__init__(**state)
+    def as_dict(self):
+        return dict(depth=self.depth, fanout=self.fanout, files=self.files, kinds=self.kinds, sizes=self.sizes.spec, seed=self.seed, sparse=self.sparse)
+    def get_fanout(self, level):
+        if level >= self.depth:
+            return 0
+        return self.fanout[min(level, len(self.fanout) - 1)]
+    def subdir_names(self, dir_path, level):
+        '''Return the names of the sub directories of the directory at dir_path'''
+        dn_template = "dir{0}" if level == 0 else "subdir{0}"
+        return [dn_template.format(index) for index in range(1, self.get_fanout(level) + 1)]
+    def iter_file_specs(self, dir_path, level):
+        '''Generate (file name, kind) for each file in the directory at dir_path'''
+        for findex in range(1, self.files + 1):
+            for kind in self.kinds:
+                yield (KINDS[kind].fn_template.format(findex), kind)
+    def walk(self, dir_path="", level=0):
+        '''Generate (dir_path, level) for every directory in pre-order.
+
+        The base directory is represented by "".  Only the chain of
+        directories leading to the current one is held in memory.
+        '''
+        yield (dir_path, level)
+        for dname in self.subdir_names(dir_path, level):
+            for item in self.walk(os.path.join(dir_path, dname), level + 1):
+                yield item
+    def file_spec(self, fpath, kind):
+        '''Return (head, size) for the file at fpath where head is the
+        identifying line (as bytes) and size is the total size of the
+        file (never less than the length of head).
+        '''
+        head = _(KINDS[kind].c_template).format(fpath).encode()
+        size = self.sizes.sample(random.Random("{0}:{1}".format(self.seed, fpath))) if self.sizes.kind != "none" else None
+        return (head, len(head) if size is None else max(size, len(head)))
+    def file_content(self, fpath, kind):
+        '''Return the content (as bytes) of the file at fpath'''
+        head, size = self.file_spec(fpath, kind)
+        body_size = size - len(head)
+        if self.sparse:
+            return head + bytes(body_size)
+        filler = filler_block(kind)
+        return head + filler * (body_size // len(filler)) + filler[:body_size % len(filler)]
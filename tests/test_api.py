@@ -0,0 +1,36 @@
+'''Tests of the in process API (see scm_test_tree_pkg.api)'''
+
+from scm_test_tree_pkg import api
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=3)
+
+def test_outcomes_cover_every_file_given():
+    with api.test_tree(SHAPE) as tree:
+        result = tree.modify(["file1", "no_such_file", "dir1"])
+        assert result.count == 1
+        assert [(outcome.path, outcome.error is None) for outcome in result.outcomes] == [("file1", True), ("no_such_file", False), ("dir1", False)]
+
+def test_verify_without_manifest_fails_cleanly():
+    with api.test_tree(SHAPE) as tree:
+        result = tree.verify()
+        assert not result.ok and result.errors and result.mismatches == []
+        with open(tree.path("bad_manifest"), "w") as fobj:
+            fobj.write("not a manifest\n")
+        assert tree.verify(manifest_path="bad_manifest").errors
+
+def test_unknown_churn_operation_fails_cleanly():
+    with api.test_tree(SHAPE) as tree:
+        result = tree.churn("frobnicate")
+        assert not result.ok and result.errors and result.modno is None
+        # no modification number was used up
+        assert tree.modify(["file1"]).modno == 1
+
+def test_operations_do_not_print(capsys):
+    with api.test_tree(SHAPE) as tree:
+        assert not tree.modify(["file1", "no_such_file"]).ok
+        assert tree.mutate(["dir1/file2"]).ok
+        assert tree.grow(4096, ["file3"]).ok
+        assert tree.churn("rename", ["dir2/file1", "no_such_file"]).errors
+        assert tree.manifest().ok
+        assert tree.verify().ok
+    assert capsys.readouterr() == ("", "")
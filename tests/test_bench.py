@@ -0,0 +1,43 @@
+'''Tests of the benchmark suite (see scm_test_tree_pkg.bench)'''
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from scm_test_tree_pkg import api # (for its installation of "_")
+from scm_test_tree_pkg import bench
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scm_test_tree")
+
+def test_run_benchmarks(tmp_path):
+    report = bench.run_benchmarks([(1, 2, 2)], [1, 2], repeat=1, work_dir=str(tmp_path), progress=lambda text: None)
+    assert [(result["case"], result["jobs"]) for result in report["results"]] == [("create", 1), ("create", 2), ("modify", 1)]
+    for result in report["results"]:
+        assert result["files"] == 3 * 2 * 3 and result["files_per_sec"] > 0
+    assert list(tmp_path.iterdir()) == []
+
+def test_find_regressions():
+    def report(*rates):
+        return {"results": [{"case": "create", "size": "1:2:2", "jobs": jobs, "files_per_sec": rate} for jobs, rate in enumerate(rates, 1)]}
+    baseline = report(1000.0, 2000.0, 3000.0)
+    regressions = bench.find_regressions(report(950.0, 1700.0, 3500.0), baseline, threshold=0.1)
+    assert [(result["jobs"], base["files_per_sec"]) for result, base in regressions] == [(2, 2000.0)]
+    assert bench.find_regressions(report(950.0, 1700.0, 3500.0), baseline, threshold=0.0) != regressions
+    assert bench.find_regressions(report(1.0, 1.0, 1.0), {"results": []}) == []
+
+def test_percentiles():
+    assert bench.percentiles(list(range(1, 101))) == {"p50": 50, "p90": 90, "p99": 99}
+    assert bench.percentiles([]) == {}
+
+def test_parse_sizes():
+    assert bench.parse_sizes("1:5:5,2:10:10") == [(1, 5, 5), (2, 10, 10)]
+    with pytest.raises(ValueError):
+        bench.parse_sizes("1:5")
+
+@pytest.mark.parametrize("threshold", ["1", "1.5", "-0.1", "x", "nan"])
+def test_bad_thresholds_are_rejected(threshold, tmp_path):
+    result = subprocess.run([sys.executable, SCRIPT, "bench", "--threshold", threshold], env=dict(os.environ, HOME=str(tmp_path)), capture_output=True, text=True)
+    assert result.returncode == 2 and "--threshold" in result.stderr
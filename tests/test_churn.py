@@ -0,0 +1,46 @@
+'''Tests of bulk rename/move/delete (see scm_test_tree_pkg.churn)'''
+
+import os
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import churn
+
+SHAPE = api.TreeShape(depth=2, fanout=(3, ), files=3)
+
+def _churned(op, jobs=1, **kwargs):
+    with api.test_tree(SHAPE) as tree:
+        before = sorted(tree.files())
+        result = tree.churn(op, count=10, seed=6, jobs=jobs, **kwargs)
+        assert result.ok and result.count == 10 and result.modno == 1
+        return before, sorted(tree.files())
+
+def test_delete():
+    before, after = _churned("delete")
+    assert len(after) == len(before) - 10 and set(after) < set(before)
+
+def test_rename():
+    before, after = _churned("rename")
+    renamed = sorted(set(after) - set(before))
+    assert len(renamed) == 10 and len(after) == len(before)
+    assert all(filepath.endswith(".r1") for filepath in renamed)
+    assert sorted(set(before) - set(after)) == sorted(filepath[:-3] for filepath in renamed)
+
+def test_move_to_dest_dir():
+    _before, after = _churned("move", dest_dir="moved")
+    assert len([filepath for filepath in after if filepath.startswith("moved" + os.sep)]) == 10
+
+def test_churn_is_repeatable_and_independent_of_jobs():
+    results = [_churned("move"), _churned("move"), _churned("move", jobs=4)]
+    assert results[0] == results[1] == results[2]
+
+def test_tweak_modifies_the_churned_files():
+    with api.test_tree(SHAPE) as tree:
+        assert tree.churn("rename", ["file1"], tweak=True).ok
+        with open(tree.path("file1.r1")) as fobj:
+            assert 'Path: "file1.r1" modification #1' in fobj.read()
+
+def test_choose_files():
+    candidates = ["c", "a", "b", "d"]
+    assert churn.choose_files(candidates) == ["a", "b", "c", "d"]
+    assert len(churn.choose_files(candidates, fraction=0.5)) == 2
+    assert len(churn.choose_files(candidates, count=10)) == 4
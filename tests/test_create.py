@@ -0,0 +1,55 @@
+'''Tests of (serial and parallel) tree creation'''
+
+import os
+
+from scm_test_tree_pkg import api
+
+SHAPE = api.TreeShape(depth=3, fanout=(4, 3), files=2, sizes="uniform:100:20K", seed=2)
+
+def _tree_image(base_dir):
+    image = {}
+    for dir_path, dir_names, file_names in os.walk(base_dir):
+        rel_dir = os.path.relpath(dir_path, base_dir)
+        image[rel_dir] = sorted(dir_names)
+        for file_name in file_names:
+            with open(os.path.join(dir_path, file_name), "rb") as fobj:
+                image[os.path.join(rel_dir, file_name)] = fobj.read()
+    return image
+
+def _created_image(**kwargs):
+    with api.test_tree(SHAPE, **kwargs) as tree:
+        return _tree_image(tree.base_dir)
+
+def test_parallel_create_matches_serial():
+    serial = _created_image(jobs=1)
+    assert _created_image(jobs=4) == serial
+    assert _created_image(jobs=7) == serial
+
+def test_create_with_processes_matches_serial(tmp_path):
+    serial = _created_image(jobs=1)
+    result = api.create(str(tmp_path), SHAPE, jobs=3, use_processes=True)
+    # (1 + 4 + 4 x 3 + 4 x 3 x 3 directories) x (2 files of 3 kinds)
+    assert result.ok and result.count == 53 * 2 * 3
+    assert _tree_image(str(tmp_path)) == serial
+
+def test_big_and_sparse_files(tmp_path):
+    shape = api.TreeShape(depth=0, files=2, kinds=("text", "binary"), sizes="fixed:3M", sparse=True)
+    result = api.create(str(tmp_path), shape)
+    assert result.ok and result.count == 4
+    for file_name, kind in (("file1", "text"), ("binary2", "binary")):
+        file_path = os.path.join(str(tmp_path), file_name)
+        stat_data = os.stat(file_path)
+        assert stat_data.st_size == 3 << 20
+        # (the padding is a hole)
+        assert stat_data.st_blocks * 512 < 1 << 20
+        with open(file_path, "rb") as fobj:
+            assert fobj.read() == shape.file_content(file_name, kind)
+
+def test_big_files_are_filled(tmp_path):
+    shape = api.TreeShape(depth=0, files=1, sizes="fixed:5M")
+    assert api.create(str(tmp_path), shape).ok
+    for file_name, kind in (("file1", "text"), ("binary1", "binary"), (".hidden1", "hidden")):
+        with open(os.path.join(str(tmp_path), file_name), "rb") as fobj:
+            data = fobj.read()
+        assert len(data) == 5 << 20 and data == shape.file_content(file_name, kind)
+        assert b"\0" * 64 not in data
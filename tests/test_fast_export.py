@@ -0,0 +1,61 @@
+'''Tests of exporting history as a "git fast-import" stream (see scm_test_tree_pkg.fast_export)'''
+
+import shutil
+import subprocess
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import cmd_ifce
+from scm_test_tree_pkg import fast_export
+from scm_test_tree_pkg import journal
+from scm_test_tree_pkg import mod_model
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+SHAPE = api.TreeShape(depth=2, fanout=(3, ), files=2, sizes="uniform:10:3K", seed=5)
+
+def _git(repo_dir, *args):
+    return subprocess.run(["git", "-C", str(repo_dir)] + list(args), check=True, capture_output=True).stdout
+
+def _final_model(rounds, files_per_round, seed):
+    model = mod_model.TreeModel(SHAPE)
+    for _round in model.iter_rounds(rounds, files_per_round, seed, start=1000000000):
+        pass
+    return model
+
+def test_export_into_a_repository(tmp_path, capsys):
+    repo_dir = tmp_path / "repo"
+    assert fast_export.export_cmd(SHAPE, 6, files_per_round=4, seed=2, start=1000000000, repo_dir=str(repo_dir)) == 0
+    _git(repo_dir, "fsck", "--strict", "--no-progress")
+    assert _git(repo_dir, "rev-list", "--count", "HEAD").strip() == b"7"
+    log = _git(repo_dir, "log", "--format=%s %at").decode().splitlines()
+    assert log[-1] == "Create test tree 1000000000"
+    assert log[0] == "Modification #6: 4 file(s) 1000000006"
+    model = _final_model(6, 4, 2)
+    tree_paths = _git(repo_dir, "ls-tree", "-r", "--name-only", "HEAD").decode().splitlines()
+    assert sorted(tree_paths) == sorted(model.paths)
+    for path in model.paths:
+        assert _git(repo_dir, "show", "HEAD:" + path) == model.content(path)
+
+def test_export_stream_loads_with_fast_import(tmp_path, capsys):
+    stream_path = tmp_path / "stream"
+    assert fast_export.export_cmd(SHAPE, 3, start=1000000000, output=str(stream_path)) == 0
+    repo_dir = tmp_path / "repo"
+    _git(tmp_path, "init", "-q", str(repo_dir))
+    with open(stream_path, "rb") as fobj:
+        subprocess.run(["git", "-C", str(repo_dir), "fast-import", "--quiet"], stdin=fobj, check=True)
+    _git(repo_dir, "fsck", "--strict", "--no-progress")
+    # every file is modified in every round when files_per_round isn't given
+    changed = _git(repo_dir, "diff", "--name-only", "HEAD~1", "HEAD").decode().splitlines()
+    assert len(changed) == len(mod_model.TreeModel(SHAPE))
+
+def test_exported_rounds_match_modify_rounds(tmp_path, capsys):
+    repo_dir = tmp_path / "repo"
+    assert fast_export.export_cmd(SHAPE, 3, files_per_round=5, seed=8, start=1000000000, repo_dir=str(repo_dir)) == 0
+    with api.test_tree(SHAPE) as tree:
+        with api.in_dir(tree.base_dir):
+            assert cmd_ifce.modify_rounds([], 3, files_per_round=5, seed=8) == 0
+        for modno in range(1, 4):
+            exported = _git(repo_dir, "diff", "--name-only", "HEAD~{0}".format(4 - modno), "HEAD~{0}".format(3 - modno)).decode().split()
+            assert sorted(exported) == sorted(path for path, _size in journal.read_journal(modno, tree.base_dir))
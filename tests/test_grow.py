@@ -0,0 +1,41 @@
+'''Tests of growing files (grow)'''
+
+import os
+
+from scm_test_tree_pkg import api
+
+SHAPE = api.TreeShape(depth=0, files=3)
+
+def test_grow_to_size():
+    with api.test_tree(SHAPE) as tree:
+        result = tree.grow(1 << 20, ["file1"])
+        assert result.ok and result.count == 1
+        assert os.path.getsize(tree.path("file1")) == 1 << 20
+
+def test_grow_by_size():
+    with api.test_tree(SHAPE) as tree:
+        old_size = os.path.getsize(tree.path("file1"))
+        assert tree.grow(100 * 1024, ["file1"], relative=True).ok
+        assert os.path.getsize(tree.path("file1")) == old_size + 100 * 1024
+
+def test_grow_keeps_content_and_fills():
+    with api.test_tree(SHAPE) as tree:
+        with open(tree.path("file2"), "rb") as fobj:
+            head = fobj.read()
+        assert tree.grow(len(head) + 4096, ["file2"]).ok
+        with open(tree.path("file2"), "rb") as fobj:
+            data = fobj.read()
+        assert len(data) == len(head) + 4096
+        assert data.startswith(head)
+        assert b"\0" not in data[len(head):]
+
+def test_grow_sparse():
+    with api.test_tree(SHAPE) as tree:
+        assert tree.grow(1 << 20, ["file3"], sparse=True).ok
+        assert os.path.getsize(tree.path("file3")) == 1 << 20
+
+def test_grow_leaves_big_files_alone():
+    with api.test_tree(SHAPE) as tree:
+        old_size = os.path.getsize(tree.path("file1"))
+        assert tree.grow(1, ["file1"]).ok
+        assert os.path.getsize(tree.path("file1")) == old_size
@@ -0,0 +1,58 @@
+'''Tests of I/O instrumentation (see scm_test_tree_pkg.instrument)'''
+
+import os
+import sys
+import json
+import subprocess
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import cmd_ifce
+from scm_test_tree_pkg import instrument
+
+SHAPE = api.TreeShape(depth=1, fanout=(3, ), files=2, sizes="fixed:8K")
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scm_test_tree")
+
+def test_create_is_counted(tmp_path):
+    with instrument.instrumented(instrument.Timings()) as timings:
+        result = api.create(str(tmp_path), SHAPE)
+    assert result.ok
+    report = timings.as_dict()
+    writes = report["operations"]["write"]
+    assert writes["errors"] == 0 and writes["bytes"] >= result.count * 8 * 1024
+    assert report["operations"]["open"]["count"] >= result.count
+    assert report["phases"]["init"]["count"] == 1
+    assert report["elapsed_s"] > 0
+
+def test_instrumentation_is_removed(tmp_path):
+    with instrument.instrumented(instrument.Timings()) as timings:
+        pass
+    assert cmd_ifce.os is os and not hasattr(cmd_ifce, "open")
+    assert cmd_ifce.init_test_tree.__name__ == "init_test_tree" and not hasattr(cmd_ifce.init_test_tree, "__wrapped__")
+    api.create(str(tmp_path), SHAPE)
+    assert timings.as_dict()["operations"] == {}
+
+def test_failures_are_counted():
+    timings = instrument.Timings()
+    with instrument.instrumented(timings):
+        assert not cmd_ifce.os.path.exists("/no/such/path")
+        try:
+            cmd_ifce.os.stat("/no/such/path")
+        except OSError:
+            pass
+    stats = timings.as_dict()["operations"]["stat"]
+    assert stats["count"] == 2 and stats["errors"] == 1
+
+def test_percentiles():
+    stats = instrument.OpStats()
+    for elapsed_ns in [1000] * 98 + [1000000] * 2:
+        stats.add(elapsed_ns)
+    assert stats.percentile_ns(50) < 2000
+    assert stats.percentile_ns(99) == 1000000
+
+def test_timings_option(tmp_path):
+    output = tmp_path / "timings.json"
+    tree_dir = tmp_path / "tree"
+    command = [sys.executable, SCRIPT, "--timings", "--timings-format", "json", "--timings-output", str(output), "create", "--depth", "1", "--fanout", "2", "--files", "2", str(tree_dir)]
+    subprocess.run(command, env=dict(os.environ, HOME=str(tmp_path)), check=True, capture_output=True)
+    report = json.loads(output.read_text())
+    assert report["operations"]["write"]["count"] > 0
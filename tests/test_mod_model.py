@@ -0,0 +1,24 @@
+'''Tests of the in memory tree model (see scm_test_tree_pkg.mod_model)'''
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import cmd_ifce
+from scm_test_tree_pkg import journal
+from scm_test_tree_pkg import mod_model
+
+SHAPE = api.TreeShape(depth=2, fanout=(3, 2), files=2)
+
+def test_model_matches_created_tree():
+    model = mod_model.TreeModel(SHAPE)
+    with api.test_tree(SHAPE) as tree:
+        assert sorted(model.paths) == sorted(tree.files())
+        for path in model.paths:
+            with open(tree.path(path), "rb") as fobj:
+                assert fobj.read() == model.initial_content(path)
+
+def test_model_rounds_match_modify_rounds(capsys):
+    model = mod_model.TreeModel(SHAPE)
+    with api.test_tree(SHAPE) as tree:
+        with api.in_dir(tree.base_dir):
+            assert cmd_ifce.modify_rounds([], 4, files_per_round=3, seed=9) == 0
+        for modno, _when, added in model.iter_rounds(4, files_per_round=3, seed=9):
+            assert sorted(added) == sorted(path for path, _size in journal.read_journal(modno, tree.base_dir))
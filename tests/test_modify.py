@@ -0,0 +1,105 @@
+'''Tests of modify (including --rounds)'''
+
+import io
+import os
+import subprocess
+import sys
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import cmd_ifce
+from scm_test_tree_pkg import journal
+
+SHAPE = api.TreeShape(depth=2, fanout=(3, ), files=4)
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scm_test_tree")
+
+def _modify_rounds(tree, *args, **kwargs):
+    with api.in_dir(tree.base_dir):
+        return cmd_ifce.modify_rounds(*args, **kwargs)
+
+def _round_paths(tree, modno):
+    return sorted(path for path, _size in journal.read_journal(modno, tree.base_dir))
+
+def test_rounds_choose_from_sorted_files(capsys):
+    with api.test_tree(SHAPE) as tree:
+        assert _modify_rounds(tree, [], 3, files_per_round=2, seed=7) == 0
+        all_files = sorted(tree.files())
+        for modno in range(1, 4):
+            assert _round_paths(tree, modno) == sorted(cmd_ifce.choose_round_files(all_files, 2, 7, modno))
+    assert capsys.readouterr().out.count("file(s) modified, 0 error(s)") == 3
+
+def test_rounds_are_repeatable(capsys):
+    chosen = []
+    for _tree_no in range(2):
+        with api.test_tree(SHAPE) as tree:
+            _modify_rounds(tree, [], 2, files_per_round=3, seed=11)
+            chosen.append([_round_paths(tree, modno) for modno in (1, 2)])
+    assert chosen[0] == chosen[1]
+    assert all(len(paths) == 3 for paths in chosen[0])
+
+def test_rounds_choice_ignores_argument_order(capsys):
+    with api.test_tree(SHAPE) as tree:
+        files = sorted(tree.files())
+        _modify_rounds(tree, files, 1, files_per_round=3, seed=5)
+        _modify_rounds(tree, list(reversed(files)), 1, files_per_round=3, seed=5, add_tws=True)
+        # different rounds (so different choices) but each chosen as if the list were sorted
+        assert _round_paths(tree, 1) == sorted(cmd_ifce.choose_round_files(files, 3, 5, 1))
+        assert _round_paths(tree, 2) == sorted(cmd_ifce.choose_round_files(files, 3, 5, 2))
+
+def _run_script(cwd, home, *args):
+    return subprocess.run([sys.executable, SCRIPT] + list(args), cwd=cwd, env=dict(os.environ, HOME=str(home)), capture_output=True, text=True)
+
+def test_files_per_round_without_rounds_is_one_round(tmp_path):
+    tree_dir = tmp_path / "tree"
+    tree_dir.mkdir()
+    assert _run_script(tree_dir, tmp_path, "create", "--depth", "0", "--files", "9").returncode == 0
+    result = _run_script(tree_dir, tmp_path, "modify", "--files-per-round", "1", "--seed", "3")
+    assert result.returncode == 0
+    assert "Round 1/1: modification #1: 1 file(s) modified" in result.stdout
+    assert len(list(journal.read_journal(1, str(tree_dir)))) == 1
+
+def test_seed_needs_files_per_round(tmp_path):
+    result = _run_script(tmp_path, tmp_path, "modify", "--seed", "3")
+    assert result.returncode != 0 and "--seed" in result.stderr
+
+def test_modify_all_skips_scm_metadata():
+    with api.test_tree(SHAPE) as tree:
+        for scm_dir in (".git", os.path.join("dir1", ".hg")):
+            os.makedirs(tree.path(scm_dir, "objects"))
+            with open(tree.path(scm_dir, "objects", "file1"), "w") as fobj:
+                fobj.write("metadata\n")
+        os.symlink("file1", tree.path("link1"))
+        os.symlink("dir1", tree.path("dirlink1"))
+        files = tree.files()
+        assert not any(".git" in filepath or ".hg" in filepath or "link1" in filepath for filepath in files)
+        assert cmd_ifce.COUNT_FILE not in files and ".gitignore" not in files
+        result = tree.modify()
+        assert result.ok and result.count == len(files)
+        for scm_dir in (".git", os.path.join("dir1", ".hg")):
+            with open(tree.path(scm_dir, "objects", "file1")) as fobj:
+                assert fobj.read() == "metadata\n"
+
+def _modified_in(tree, modno):
+    return sorted(path for path, _size in journal.read_journal(modno, tree.base_dir))
+
+def test_from_file_null_delimited(tmp_path):
+    with api.test_tree(SHAPE) as tree:
+        with open(tree.path("dir1", "odd\nname"), "w") as fobj:
+            fobj.write("odd\n")
+        wanted = ["dir1/odd\nname", "file1", "dir2/subdir1/file3"]
+        listing = "\0".join(wanted).encode() + b"\0"
+        result = subprocess.run([sys.executable, SCRIPT, "modify", "--from-file", "-", "-z"], cwd=tree.base_dir, env=dict(os.environ, HOME=str(tmp_path)), input=listing, capture_output=True)
+        assert result.returncode == 0, result.stderr
+        assert _modified_in(tree, 1) == sorted(wanted)
+
+def test_from_file_newline_delimited(tmp_path):
+    with api.test_tree(SHAPE) as tree:
+        list_path = tmp_path / "list"
+        list_path.write_text("file1\n\ndir1/file2\nno_such_file\n")
+        result = _run_script(tree.base_dir, tmp_path, "modify", "--from-file", str(list_path))
+        assert "no_such_file" in result.stderr
+        assert _modified_in(tree, 1) == ["dir1/file2", "file1"]
+
+def test_listed_paths_span_chunks(monkeypatch):
+    monkeypatch.setattr(cmd_ifce, "LIST_CHUNK_SIZE", 3)
+    data = b"\0".join([b"a" * 7, b"bb", b"", b"c" * 4])
+    assert list(cmd_ifce.iter_listed_paths(io.BytesIO(data), b"\0")) == ["a" * 7, "bb", "c" * 4]
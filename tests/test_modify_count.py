@@ -0,0 +1,46 @@
+'''Tests of the (lock protected) modification counter'''
+
+import os
+import re
+import sys
+import threading
+import subprocess
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import cmd_ifce
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=3)
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scm_test_tree")
+
+def test_reserve_modnos_blocks():
+    with api.test_tree(SHAPE) as tree:
+        assert cmd_ifce.reserve_modnos(base_dir_name=tree.base_dir) == 1
+        assert cmd_ifce.reserve_modnos(count=10, base_dir_name=tree.base_dir) == 2
+        assert cmd_ifce.reserve_modnos(base_dir_name=tree.base_dir) == 12
+        assert tree.modify(["file1"]).modno == 13
+
+def test_reserve_modnos_concurrently():
+    with api.test_tree(SHAPE) as tree:
+        firsts = []
+        lock = threading.Lock()
+        def reserve():
+            for _count in range(20):
+                first = cmd_ifce.reserve_modnos(count=3, base_dir_name=tree.base_dir)
+                with lock:
+                    firsts.append(first)
+        threads = [threading.Thread(target=reserve) for _index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reserved = sorted(modno for first in firsts for modno in range(first, first + 3))
+        assert reserved == list(range(1, 4 * 20 * 3 + 1))
+
+def test_concurrent_modify_processes_get_distinct_numbers(tmp_path):
+    with api.test_tree(SHAPE) as tree:
+        env = dict(os.environ, HOME=str(tmp_path))
+        processes = [subprocess.Popen([sys.executable, SCRIPT, "modify", "file1"], cwd=tree.base_dir, env=env) for _index in range(6)]
+        assert all(process.wait() == 0 for process in processes)
+        with open(tree.path("file1")) as fobj:
+            modnos = sorted(int(modno) for modno in re.findall(r"modification #(\d+)", fobj.read()))
+        assert modnos == list(range(1, 7))
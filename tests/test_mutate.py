@@ -0,0 +1,49 @@
+'''Tests of in place mutation (see scm_test_tree_pkg.mutate)'''
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import mutate
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=2, sizes="uniform:1K:40K", seed=8)
+
+def _snapshot(tree):
+    snapshot = {}
+    for filepath in tree.files():
+        with open(tree.path(filepath), "rb") as fobj:
+            snapshot[filepath] = fobj.read()
+    return snapshot
+
+def _mutated(mode, **kwargs):
+    with api.test_tree(SHAPE) as tree:
+        before = _snapshot(tree)
+        result = tree.mutate(mode=mode, seed=3, **kwargs)
+        assert result.ok and result.count == len(before)
+        return before, _snapshot(tree)
+
+@pytest.mark.parametrize("mode", mutate.MODES)
+def test_mutation_is_repeatable(mode):
+    before, after = _mutated(mode, nops=5)
+    assert after != before
+    assert _mutated(mode, nops=5)[1] == after
+
+@pytest.mark.parametrize("mode", mutate.MODES)
+def test_mmap_and_buffer_edits_agree(mode, monkeypatch):
+    monkeypatch.setattr(mutate, "MMAP_THRESHOLD", 1 << 62)
+    _before, in_memory = _mutated(mode, nops=20, max_bytes=300)
+    monkeypatch.setattr(mutate, "MMAP_THRESHOLD", 0)
+    _before, mapped = _mutated(mode, nops=20, max_bytes=300)
+    assert mapped == in_memory
+
+@pytest.mark.parametrize("operation", mutate.OPERATIONS)
+def test_single_operations(operation):
+    before, after = _mutated("bytes", nops=1, operations=(operation, ), max_bytes=16)
+    for filepath in before:
+        change = len(after[filepath]) - len(before[filepath])
+        if operation == "insert":
+            assert 0 < change <= 16
+        elif operation == "delete":
+            assert -16 <= change < 0
+        else:
+            # (up to 16 bytes replaced by up to 16 others)
+            assert -16 < change < 16 and after[filepath] != before[filepath]
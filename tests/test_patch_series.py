@@ -0,0 +1,80 @@
+'''Tests of patch series generation (see scm_test_tree_pkg.patch_series)'''
+
+import os
+import subprocess
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import mod_model
+from scm_test_tree_pkg import patch_series
+
+SHAPE = api.TreeShape(depth=1, fanout=(3, ), files=3)
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com", GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com", GIT_CONFIG_NOSYSTEM="1", HOME=os.devnull)
+
+def _patches(mode, npatches=6, files_per_patch=4):
+    return patch_series.iter_patches(mod_model.TreeModel(SHAPE), npatches, files_per_patch, mode, overlap=0.5, seed=3, start=1000000000)
+
+def _git(tree, *args, **kwargs):
+    return subprocess.run(["git", "-C", tree.base_dir] + list(args), env=GIT_ENV, capture_output=True, **kwargs)
+
+def _commit_tree(tree):
+    _git(tree, "init", "-q", check=True)
+    _git(tree, "add", "--", *tree.files(), check=True)
+    _git(tree, "commit", "-q", "-m", "Create test tree", check=True)
+
+def _final_contents(mode):
+    model = mod_model.TreeModel(SHAPE)
+    for _patch in patch_series.iter_patches(model, 6, 4, mode, overlap=0.5, seed=3, start=1000000000):
+        pass
+    return {path: model.content(path) for path in model.paths}
+
+def _contents(tree):
+    contents = {}
+    for path in tree.files():
+        with open(tree.path(path), "rb") as fobj:
+            contents[path] = fobj.read()
+    return contents
+
+@pytest.mark.parametrize("mode", ["stacked", "overlapping"])
+def test_mbox_applies_with_git_am(mode, tmp_path):
+    mbox = tmp_path / "series.mbox"
+    with open(mbox, "wb") as fobj:
+        assert patch_series.write_mbox(fobj, _patches(mode), 6) == 6
+    with api.test_tree(SHAPE) as tree:
+        _commit_tree(tree)
+        result = _git(tree, "am", "-q", str(mbox))
+        assert result.returncode == 0, result.stderr
+        assert _git(tree, "rev-list", "--count", "HEAD", check=True).stdout.strip() == b"7"
+        assert _contents(tree) == _final_contents(mode)
+
+@pytest.mark.parametrize("mode", ["stacked", "overlapping"])
+def test_quilt_series_applies_with_patch(mode, tmp_path):
+    patch_dir = tmp_path / "patches"
+    assert patch_series.write_quilt(str(patch_dir), _patches(mode)) == 6
+    with open(patch_dir / "series") as fobj:
+        names = fobj.read().split()
+    assert len(names) == 6
+    with api.test_tree(SHAPE) as tree:
+        for name in names:
+            result = subprocess.run(["patch", "-p1", "--batch", "--quiet", "-i", str(patch_dir / name)], cwd=tree.base_dir, capture_output=True)
+            assert result.returncode == 0, result.stdout + result.stderr
+        assert _contents(tree) == _final_contents(mode)
+
+def test_overlapping_patches_share_files():
+    previous = None
+    for _modno, _when, paths, _diff in _patches("overlapping"):
+        if previous is not None:
+            assert len(set(paths) & set(previous)) >= 2
+        previous = paths
+
+def test_conflicting_patches_conflict(tmp_path):
+    mbox = tmp_path / "series.mbox"
+    with open(mbox, "wb") as fobj:
+        patch_series.write_mbox(fobj, _patches("conflicting", npatches=2), 2)
+    with api.test_tree(SHAPE) as tree:
+        _commit_tree(tree)
+        assert _git(tree, "am", "-q", str(mbox)).returncode != 0
+        # the first patch was applied and the second stopped at
+        assert _git(tree, "rev-list", "--count", "HEAD", check=True).stdout.strip() == b"2"
+        assert _git(tree, "am", "--abort").returncode == 0
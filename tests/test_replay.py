@@ -0,0 +1,70 @@
+'''Tests of workload replay (see scm_test_tree_pkg.replay)'''
+
+import re
+import json
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import replay
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=3)
+STEPS = [
+    {"op": "modify", "select": {"count": 2}},
+    {"op": "mutate", "select": {"pattern": "dir1/*"}, "nops": 2},
+    {"op": "rename", "select": {"count": 1}},
+]
+
+def _snapshot(tree):
+    snapshot = {}
+    for filepath in tree.files():
+        with open(tree.path(filepath), "rb") as fobj:
+            # (without the times of the modifications)
+            snapshot[filepath] = re.sub(rb" at: [-0-9: .]+", b"", fobj.read())
+    return snapshot
+
+def _run(tree, tmp_path, steps):
+    workload_path = tmp_path / "workload.json"
+    output_path = tmp_path / "records.json"
+    workload_path.write_text(json.dumps({"seed": 4, "steps": steps}))
+    status = replay.replay_cmd(str(workload_path), base_dir=tree.base_dir, output=str(output_path))
+    return status, json.loads(output_path.read_text())["steps"] if output_path.exists() else None
+
+def test_replay_is_repeatable(tmp_path, capsys):
+    snapshots = []
+    for _tree_no in range(2):
+        with api.test_tree(SHAPE) as tree:
+            status, records = _run(tree, tmp_path, STEPS)
+            assert status == 0
+            assert [(record["step"], record["op"]) for record in records] == [(1, "modify"), (2, "mutate"), (3, "rename")]
+            snapshots.append(_snapshot(tree))
+    assert snapshots[0] == snapshots[1]
+
+@pytest.mark.parametrize("bad_step", [
+    {"op": "frobnicate"},
+    {"op": "modify", "nops": 2},
+    {"op": "mutate", "operations": ["shuffle"]},
+    {"op": "grow", "size": "big"},
+    {"op": "grow"},
+    {"op": "modify", "select": {"count": "some"}},
+    {"op": "create", "shape": {"breadth": 3}},
+])
+def test_invalid_steps_stop_the_workload_before_it_starts(bad_step, tmp_path, capsys):
+    with api.test_tree(SHAPE) as tree:
+        before = _snapshot(tree)
+        status, records = _run(tree, tmp_path, STEPS + [bad_step])
+        assert isinstance(status, str) and "step 4" in status
+        assert records == []
+        assert _snapshot(tree) == before
+
+def test_records_are_written_when_a_step_fails(tmp_path, capsys, monkeypatch):
+    run_step = replay._run_step
+    def failing_run_step(step, *args):
+        if step["op"] == "rename":
+            raise ValueError("rename failed")
+        return run_step(step, *args)
+    monkeypatch.setattr(replay, "_run_step", failing_run_step)
+    with api.test_tree(SHAPE) as tree:
+        status, records = _run(tree, tmp_path, STEPS)
+        assert isinstance(status, str) and "rename failed" in status
+        assert [record["op"] for record in records] == ["modify", "mutate"]
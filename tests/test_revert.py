@@ -0,0 +1,47 @@
+'''Tests of the truncation journal and revert'''
+
+from scm_test_tree_pkg import api
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=3)
+
+def _snapshot(tree):
+    snapshot = {}
+    for filepath in tree.files():
+        with open(tree.path(filepath), "rb") as fobj:
+            snapshot[filepath] = fobj.read()
+    return snapshot
+
+def test_modify_revert_round_trip():
+    with api.test_tree(SHAPE) as tree:
+        pristine = _snapshot(tree)
+        result = tree.modify()
+        assert result.ok and result.count == len(pristine) and result.modno == 1
+        after_first = _snapshot(tree)
+        assert after_first != pristine
+        result = tree.modify(["file1", "dir1/file2"])
+        assert result.ok and result.modno == 2
+        result = tree.revert(1)
+        assert result.ok and result.modno == 1 and result.count == 2
+        assert _snapshot(tree) == after_first
+        result = tree.revert(0)
+        assert result.ok and result.modno == 0
+        assert _snapshot(tree) == pristine
+        # the numbers of reverted rounds are used again
+        assert tree.modify(["file1"]).modno == 1
+
+def test_revert_refuses_irreversible_rounds():
+    with api.test_tree(SHAPE) as tree:
+        assert tree.modify().ok
+        assert tree.mutate(["file1"]).ok
+        result = tree.revert(0)
+        assert not result.ok and result.count == 0
+        assert tree.revert(1).errors
+
+def test_revert_in_parallel():
+    with api.test_tree(api.TreeShape(depth=2, fanout=(3, ), files=4)) as tree:
+        pristine = _snapshot(tree)
+        for _round in range(3):
+            assert tree.modify().ok
+        result = tree.revert(0, jobs=4)
+        assert result.ok and result.count == len(pristine)
+        assert _snapshot(tree) == pristine
@@ -0,0 +1,28 @@
+'''Tests of the SCM command latency harness (see scm_test_tree_pkg.scm_harness)'''
+
+import shutil
+
+import pytest
+
+from scm_test_tree_pkg import scm_harness
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_git_commands_see_each_round(tmp_path, capsys):
+    report = scm_harness.scm_bench(["git"], [(1, 2, 2)], [3], rounds=2, work_dir=str(tmp_path))
+    results = report["results"]
+    assert [result["command"] for result in results] == scm_harness.PRESETS["git"].commands
+    for result in results:
+        assert result["files"] == 3 * 2 * 3 and result["failed_rounds"] == []
+        assert len(result["latencies"]) == 2
+    # "git status --porcelain" lists the (up to 6) files modified so far
+    assert 0 < results[0]["output_bytes"][0] <= results[0]["output_bytes"][1]
+    # the work trees are removed
+    assert list(tmp_path.iterdir()) == []
+
+def test_failing_commands_are_recorded(tmp_path, capsys):
+    report = scm_harness.scm_bench(["none"], [(0, 1, 2)], [1], rounds=3, commands=["false"], setup=[], work_dir=str(tmp_path))
+    assert report["results"][0]["failed_rounds"] == [1, 2, 3]
+
+def test_failing_setup_is_reported(tmp_path, capsys):
+    emsg = scm_harness.scm_bench_cmd(["none"], [(0, 1, 2)], [1], rounds=1, commands=["true"], setup=["false"], work_dir=str(tmp_path))
+    assert isinstance(emsg, str) and "false" in emsg
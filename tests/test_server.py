@@ -0,0 +1,32 @@
+'''Tests of the request server (see scm_test_tree_pkg.server)'''
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import client
+from scm_test_tree_pkg import server
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=3)
+
+def test_churn_errors_are_returned(capsys):
+    with api.test_tree(SHAPE) as tree:
+        reply = server.handle_request({"op": "churn", "cwd": tree.base_dir, "args": {"operation": "delete", "filepaths": ["no_such_file", "file1"]}})
+        assert "no_such_file" in reply["stderr"]
+        assert "delete: modification #1: 1 file(s)" in reply["stdout"]
+    assert capsys.readouterr() == ("", "")
+
+def test_verify_report_is_returned(capsys):
+    with api.test_tree(SHAPE) as tree:
+        assert server.handle_request({"op": "manifest", "cwd": tree.base_dir})["status"] == 0
+        assert tree.modify(["file1"]).ok
+        reply = server.handle_request({"op": "verify", "cwd": tree.base_dir})
+        assert reply["status"] != 0
+        assert "file1" in reply["stdout"] + reply["stderr"]
+    assert capsys.readouterr() == ("", "")
+
+def test_unknown_operation():
+    reply = server.handle_request({"op": "frobnicate"})
+    assert reply["status"] == 2 and "frobnicate" in reply["stderr"]
+
+def test_client_rejects_bad_arguments(capsys):
+    for json_args in ("[1]", "{", "3"):
+        assert client.main(["modify", json_args]) == 2
+        assert capsys.readouterr().err.endswith(client.USAGE)
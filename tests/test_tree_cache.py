@@ -0,0 +1,55 @@
+'''Tests of the generated tree cache (see scm_test_tree_pkg.tree_cache)'''
+
+import os
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import cmd_ifce
+from scm_test_tree_pkg import tree_cache
+
+SHAPE = api.TreeShape(depth=2, fanout=(3, ), files=2, sizes="uniform:10:5K", seed=4)
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tree_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    os.mkdir(tree_cache.CACHE_DIR)
+
+def _contents(base_dir):
+    with api.in_dir(base_dir):
+        filepaths = list(cmd_ifce.iter_test_tree_files())
+    contents = {}
+    for filepath in filepaths:
+        with open(os.path.join(base_dir, filepath), "rb") as fobj:
+            contents[filepath] = fobj.read()
+    return contents
+
+@pytest.mark.parametrize("method", ["hardlink", "copy", "auto"])
+def test_cached_create_matches_create(method, tmp_path, capsys):
+    with api.test_tree(SHAPE) as tree:
+        expected = _contents(tree.base_dir)
+    for attempt in ("miss", "hit"):
+        base_dir = str(tmp_path / "{0}-{1}".format(method, attempt))
+        assert tree_cache.create_cached(base_dir, SHAPE, method=method, jobs=3) == 0
+        assert _contents(base_dir) == expected
+    assert len(os.listdir(tree_cache.CACHE_DIR)) == 1
+
+def test_reset_restores_the_pristine_tree(tmp_path, capsys):
+    base_dir = str(tmp_path / "tree")
+    assert tree_cache.create_cached(base_dir, SHAPE, method="hardlink") == 0
+    pristine = _contents(base_dir)
+    tree = api.TestTree(base_dir)
+    assert tree.modify().ok and tree.mutate(["file1"]).ok
+    assert tree.churn("delete", count=3).ok
+    with open(tree.path("extra"), "w") as fobj:
+        fobj.write("extra\n")
+    # hard linked files were unshared before being changed
+    assert _contents(tree_cache.ensure_cached(SHAPE)[1]) == pristine
+    assert tree_cache.reset_cmd(base_dir, method="hardlink") == 0
+    assert _contents(base_dir) == pristine
+    assert tree.modify(["file1"]).modno == 1
+
+def test_create_cached_refuses_a_non_empty_directory(tmp_path, capsys):
+    (tmp_path / "tree").mkdir()
+    (tmp_path / "tree" / "file").write_text("data\n")
+    assert isinstance(tree_cache.create_cached(str(tmp_path / "tree"), SHAPE), str)
@@ -0,0 +1,56 @@
+'''Tests of tree profiles and profile driven synthesis (see scm_test_tree_pkg.tree_profile)'''
+
+import os
+import json
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import tree_profile
+
+SHAPE = api.TreeShape(depth=2, fanout=(4, 2), files=2, sizes="uniform:1K:30K", seed=1)
+NFILES = 13 * 2 * 3
+
+def _profile_of(shape, tmp_path):
+    with api.test_tree(shape) as tree:
+        # (the test tree's own files aren't part of its shape)
+        for filepath in (".gitignore", ".hgignore"):
+            os.unlink(tree.path(filepath))
+        return tree_profile.scan_profile(tree.base_dir)
+
+def test_profile_of_a_test_tree(tmp_path):
+    profile = _profile_of(SHAPE, tmp_path)
+    assert profile["dirs"] == 1 + 4 + 8
+    # 2 files of each of 3 kinds per directory
+    assert profile["files"] == NFILES
+    assert profile["fanout"] == {"0": {"4": 1}, "1": {"2": 4}, "2": {"0": 8}}
+    assert profile["files_per_dir"] == {"0": {"6": 1}, "1": {"6": 4}, "2": {"6": 8}}
+    assert profile["binary_fraction"] == pytest.approx(1 / 3)
+    assert profile["hidden_fraction"] == pytest.approx(1 / 3)
+    assert all(10 <= int(bucket) <= 14 for kind in ("text", "binary") for bucket in profile["sizes"][kind])
+
+def test_synthesised_tree_has_the_profiled_shape(tmp_path):
+    profile = _profile_of(SHAPE, tmp_path)
+    synthesised = _profile_of(tree_profile.ProfileShape(profile, seed=3), tmp_path)
+    for key in ("dirs", "files", "fanout", "files_per_dir"):
+        assert synthesised[key] == profile[key]
+    # (each file's kind is drawn at random)
+    for key in ("binary_fraction", "hidden_fraction"):
+        assert synthesised[key] == pytest.approx(profile[key], abs=0.2)
+    assert synthesised["sizes"].keys() == profile["sizes"].keys()
+    for kind in profile["sizes"]:
+        assert set(synthesised["sizes"][kind]) <= set(profile["sizes"][kind])
+
+def test_scaled_synthesis(tmp_path):
+    profile = _profile_of(SHAPE, tmp_path)
+    synthesised = _profile_of(tree_profile.ProfileShape(profile, scale=4.0, seed=3), tmp_path)
+    assert 3 * profile["files"] <= synthesised["files"] <= 5 * profile["files"]
+    assert synthesised["files_per_dir"] == {"0": {"6": 1}, "1": {"6": synthesised["dirs_per_level"]["1"]}, "2": {"6": synthesised["dirs_per_level"]["2"]}}
+
+def test_read_profile(tmp_path):
+    profile_path = tmp_path / "profile.json"
+    profile_path.write_text(json.dumps(_profile_of(SHAPE, tmp_path)))
+    assert tree_profile.read_profile(str(profile_path))["files"] == NFILES
+    profile_path.write_text("{}")
+    with pytest.raises(ValueError):
+        tree_profile.read_profile(str(profile_path))
@@ -0,0 +1,52 @@
+'''Tests of parametric tree shapes (see scm_test_tree_pkg.tree_shape)'''
+
+import os
+
+import pytest
+
+from scm_test_tree_pkg import api
+from scm_test_tree_pkg import tree_shape
+
+def _disk_layout(tree):
+    dirs, sizes = set(), {}
+    for filepath in tree.files():
+        dirs.add(os.path.dirname(filepath))
+        sizes[filepath] = os.path.getsize(tree.path(filepath))
+    return dirs, sizes
+
+def test_layout_follows_the_parameters():
+    shape = api.TreeShape(depth=2, fanout=(3, 2), files=2)
+    with api.test_tree(shape) as tree:
+        dirs, sizes = _disk_layout(tree)
+    # the base directory, 3 directories and 3 x 2 sub directories
+    assert len(dirs) == 1 + 3 + 6
+    assert len(sizes) == len(dirs) * 2 * len(tree_shape.DEFAULT_KINDS)
+    assert "dir3/subdir2/binary2" in sizes and "dir3/subdir3/file1" not in sizes
+
+def test_kinds_are_selectable():
+    with api.test_tree(api.TreeShape(depth=1, fanout=(2, ), files=3, kinds=("text", ))) as tree:
+        assert all(os.path.basename(filepath).startswith("file") for filepath in tree.files())
+
+def test_fixed_sizes():
+    with api.test_tree(api.TreeShape(depth=1, fanout=(2, ), files=2, sizes="fixed:10K")) as tree:
+        _dirs, sizes = _disk_layout(tree)
+    assert set(sizes.values()) == {10 * 1024}
+
+def test_sizes_are_repeatable_for_a_seed():
+    shape = api.TreeShape(depth=1, fanout=(3, ), files=3, sizes="uniform:1K:64K", seed=5)
+    layouts = []
+    for _tree_no in range(2):
+        with api.test_tree(shape) as tree:
+            layouts.append(_disk_layout(tree)[1])
+    assert layouts[0] == layouts[1]
+    assert all(1024 <= size <= 64 * 1024 for size in layouts[0].values())
+    assert len(set(layouts[0].values())) > 1
+
+@pytest.mark.parametrize("text, size", [("512", 512), ("4K", 4096), ("10M", 10 << 20), ("1.5KiB", 1536), ("2g", 2 << 30)])
+def test_parse_size(text, size):
+    assert tree_shape.parse_size(text) == size
+
+@pytest.mark.parametrize("kwargs", [dict(depth=-1), dict(files=-1), dict(fanout=()), dict(kinds=("text", "odd")), dict(sizes="fixed"), dict(sizes="uniform:2K:1K")])
+def test_bad_shapes_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        api.TreeShape(**kwargs)
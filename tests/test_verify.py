@@ -0,0 +1,44 @@
+'''Tests of verifying a tree against its manifest'''
+
+import os
+
+from scm_test_tree_pkg import api
+
+SHAPE = api.TreeShape(depth=1, fanout=(2, ), files=3)
+
+def test_verify_reports_mismatches():
+    with api.test_tree(SHAPE) as tree:
+        result = tree.manifest()
+        assert result.ok and result.count == len(tree.files())
+        assert tree.verify().mismatches == []
+        assert tree.modify(["file1"]).ok
+        os.unlink(tree.path("dir1", "file2"))
+        with open(tree.path("dir2", "extra"), "w") as fobj:
+            fobj.write("extra\n")
+        result = tree.verify()
+        assert not result.ok
+        assert sorted(result.mismatches) == [("changed", "file1"), ("extra", os.path.join("dir2", "extra")), ("missing", os.path.join("dir1", "file2"))]
+        assert len(tree.verify(fail_fast=True).mismatches) == 1
+
+def _overwrite_same_size(tree, filepath):
+    with open(tree.path(filepath), "r+b") as fobj:
+        data = fobj.read()
+        fobj.seek(0)
+        fobj.write(bytes(reversed(data)))
+
+def test_parallel_verify_agrees():
+    with api.test_tree(api.TreeShape(depth=2, fanout=(3, ), files=4)) as tree:
+        assert tree.manifest().ok
+        changed = sorted(tree.files())[::7]
+        for filepath in changed:
+            _overwrite_same_size(tree, filepath)
+        expected = [("changed", filepath) for filepath in changed]
+        assert sorted(tree.verify().mismatches) == expected
+        assert sorted(tree.verify(jobs=4).mismatches) == expected
+
+def test_fast_verify_only_compares_sizes():
+    with api.test_tree(SHAPE) as tree:
+        assert tree.manifest().ok
+        _overwrite_same_size(tree, "file1")
+        assert tree.verify(fast=True).ok
+        assert tree.verify().mismatches == [("changed", "file1")]